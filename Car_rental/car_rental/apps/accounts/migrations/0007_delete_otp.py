@@ -0,0 +1,16 @@
+# Generated by Django 5.2.10 on 2026-10-19 09:09
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0006_customuser_created_at_customuser_driving_license_and_more'),
+    ]
+
+    operations = [
+        migrations.DeleteModel(
+            name='OTP',
+        ),
+    ]
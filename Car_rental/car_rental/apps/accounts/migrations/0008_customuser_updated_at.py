@@ -0,0 +1,28 @@
+# Generated by Django 5.2.10 on 2026-10-19 10:05
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import F
+
+
+def copy_date_joined(apps, schema_editor):
+    # Existing users count as last changed when they joined
+    CustomUser = apps.get_model('accounts', 'CustomUser')
+    CustomUser.objects.update(updated_at=F('date_joined'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0007_delete_otp'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.RunPython(copy_date_joined, migrations.RunPython.noop),
+    ]
@@ -18,19 +18,13 @@ class CustomUser(AbstractUser):
     insurance_document = models.FileField(upload_to='documents/', blank=True, null=True)
     
     created_at = models.DateTimeField(auto_now_add=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True)
     
     def __str__(self):
         return self.username
 
-        
-class OTP(models.Model):
-    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
-    code = models.CharField(max_length=6)
-    created_at = models.DateTimeField(auto_now_add=True)
 
-    def __str__(self):
-        return f"{self.user.username} - {self.code}"
-    
+
 class OwnerRequest(models.Model):
 
     STATUS_CHOICES = (
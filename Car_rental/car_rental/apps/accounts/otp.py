@@ -0,0 +1,174 @@
+"""
+One-time codes for OTP login and registration.
+
+Codes live in a short-lived store, not the database.  ``OtpService.issue``
+saves a hash of a new code with a TTL of OTP_EXPIRY_MINUTES, replacing any
+earlier code for the same purpose and identifier.  ``verify`` checks and
+deletes it in one step, so each code works once.  After OTP_MAX_ATTEMPTS
+wrong guesses the code is discarded.
+
+Sending is rate limited per email (OTP_EMAIL_RATE) and per client IP
+(OTP_IP_RATE) with fixed-window counters kept in the same store.
+
+The store is pluggable (OTP_BACKEND):
+
+- ``CacheBackend`` uses a Django cache (OTP_CACHE_ALIAS): Redis when
+  CACHE_REDIS_URL is set, otherwise a file cache every process on the host
+  shares.  Never point it at an in-memory cache with more than one process:
+  a code issued by one would be unknown to the others.
+- ``RedisBackend`` talks to Redis directly (OTP_REDIS_URL) and does
+  check-and-delete in a Lua script.
+"""
+import secrets
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.crypto import constant_time_compare, salted_hmac
+from django.utils.module_loading import import_string
+
+KEY_PREFIX = 'otp'
+
+
+class OtpRateLimited(Exception):
+    """Too many codes were sent to this email or from this IP."""
+
+    def __init__(self, retry_after):
+        super().__init__(f'Too many codes requested. Please wait {retry_after}s and try again')
+        self.retry_after = retry_after
+
+
+# ──────────────────────────────────────────────
+# Backends
+# ──────────────────────────────────────────────
+
+class CacheBackend:
+    """Stores codes and counters in a Django cache."""
+
+    def __init__(self):
+        self.cache = caches[getattr(settings, 'OTP_CACHE_ALIAS', 'default')]
+
+    def set(self, key, value, ttl):
+        self.cache.set(key, value, ttl)
+
+    def delete(self, key):
+        self.cache.delete(key)
+
+    def pop_if_equal(self, key, value):
+        """Delete key if it holds value.  True for exactly one caller per stored value."""
+        stored = self.cache.get(key)
+        if stored is None or not constant_time_compare(stored, value):
+            return False
+        # delete() reports whether the key was still there, so of two
+        # concurrent verifications of the same code only one succeeds
+        return self.cache.delete(key)
+
+    def hit(self, key, ttl):
+        """Increment the counter at key, created with ttl; returns the new value."""
+        self.cache.add(key, 0, ttl)
+        try:
+            return self.cache.incr(key)
+        except ValueError:
+            # Expired between add() and incr()
+            self.cache.set(key, 1, ttl)
+            return 1
+
+
+class RedisBackend:
+    """Redis, with atomic check-and-delete and counters in Lua."""
+
+    POP_IF_EQUAL = "if redis.call('GET', KEYS[1]) == ARGV[1] then return redis.call('DEL', KEYS[1]) end return 0"
+    HIT = "local n = redis.call('INCR', KEYS[1]) if n == 1 then redis.call('EXPIRE', KEYS[1], ARGV[1]) end return n"
+
+    def __init__(self):
+        try:
+            import redis
+        except ImportError:
+            raise ImproperlyConfigured('RedisBackend needs the redis package (pip install redis)')
+        url = getattr(settings, 'OTP_REDIS_URL', None)
+        if not url:
+            raise ImproperlyConfigured('Set OTP_REDIS_URL to use RedisBackend')
+        self.client = redis.Redis.from_url(url)
+        self._pop_if_equal = self.client.register_script(self.POP_IF_EQUAL)
+        self._hit = self.client.register_script(self.HIT)
+
+    def set(self, key, value, ttl):
+        self.client.set(key, value, ex=ttl)
+
+    def delete(self, key):
+        self.client.delete(key)
+
+    def pop_if_equal(self, key, value):
+        return bool(self._pop_if_equal(keys=[key], args=[value]))
+
+    def hit(self, key, ttl):
+        return int(self._hit(keys=[key], args=[ttl]))
+
+
+# ──────────────────────────────────────────────
+# Service
+# ──────────────────────────────────────────────
+
+class OtpService:
+    """
+    ``purpose`` separates independent codes ('login', 'register'); the
+    identifier is whatever the code is for, e.g. a user id or an email.
+    """
+
+    def __init__(self, backend=None):
+        self.backend = backend or import_string(
+            getattr(settings, 'OTP_BACKEND', 'apps.accounts.otp.CacheBackend')
+        )()
+
+    @property
+    def ttl(self):
+        return getattr(settings, 'OTP_EXPIRY_MINUTES', 10) * 60
+
+    def _key(self, *parts):
+        return ':'.join(str(part) for part in (KEY_PREFIX, *parts))
+
+    def _hash(self, key, code):
+        return salted_hmac(KEY_PREFIX, f'{key}:{code}').hexdigest()
+
+    def issue(self, purpose, identifier):
+        """Store and return a new 6-digit code for (purpose, identifier)."""
+        code = str(secrets.randbelow(900000) + 100000)
+        key = self._key(purpose, identifier)
+        self.backend.delete(self._key('attempts', purpose, identifier))
+        self.backend.set(key, self._hash(key, code), self.ttl)
+        return code
+
+    def verify(self, purpose, identifier, code):
+        """True, once, if code is the current unexpired code for (purpose, identifier)."""
+        key = self._key(purpose, identifier)
+        if code and self.backend.pop_if_equal(key, self._hash(key, code.strip())):
+            self.backend.delete(self._key('attempts', purpose, identifier))
+            return True
+        attempts = self.backend.hit(self._key('attempts', purpose, identifier), self.ttl)
+        if attempts >= getattr(settings, 'OTP_MAX_ATTEMPTS', 5):
+            self.backend.delete(key)
+        return False
+
+    def check_send_rate(self, email, ip=None):
+        """Count one send for email and ip; raises OtpRateLimited over either limit."""
+        checks = [('email', email.strip().lower(), getattr(settings, 'OTP_EMAIL_RATE', (5, 15 * 60)))]
+        if ip:
+            checks.append(('ip', ip, getattr(settings, 'OTP_IP_RATE', (20, 60 * 60))))
+
+        now = int(time.time())
+        for scope, value, (limit, window) in checks:
+            window_start = now - now % window
+            count = self.backend.hit(self._key('sends', scope, value, window_start), window)
+            if count > limit:
+                raise OtpRateLimited(window_start + window - now)
+
+
+_service = None
+
+
+def get_otp_service():
+    global _service
+    if _service is None:
+        _service = OtpService()
+    return _service
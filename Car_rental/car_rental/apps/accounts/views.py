@@ -1,16 +1,23 @@
-import random
-
 from django.contrib import messages
 from django.contrib.auth import login, logout, update_session_auth_hash
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.forms import AuthenticationForm
+from django.contrib.auth.hashers import make_password
 from django.shortcuts import render, redirect
 from django.views.decorators.cache import never_cache
 from django.views.decorators.csrf import ensure_csrf_cookie
 
 from apps.bookings.tasks import send_otp_email
 from .forms import OwnerPasswordChangeForm, OwnerProfileForm, UserProfileForm, RegisterForm
-from .models import CustomUser, OTP, OwnerRequest
+from .models import CustomUser, OwnerRequest
+from .otp import OtpRateLimited, get_otp_service
+
+
+def _send_registration_otp(request, email):
+    """Issue and email a registration code.  Raises OtpRateLimited."""
+    otp_service = get_otp_service()
+    otp_service.check_send_rate(email, request.META.get('REMOTE_ADDR'))
+    send_otp_email(email, otp_service.issue('register', email.lower()))
 
 
 # ================= REGISTER WITH OTP =================
@@ -20,22 +27,22 @@ def register_view(request):
         form = RegisterForm(request.POST)
         if form.is_valid():
 
-            # Store user data temporarily in session
+            # Store user data temporarily in session — the password only
+            # hashed, since with signed-cookie sessions the client can read it
             user_data = {
                 'username': form.cleaned_data['username'],
                 'email': form.cleaned_data['email'],
-                'password': form.cleaned_data['password1'],
+                'password_hash': make_password(form.cleaned_data['password1']),
                 'phone': form.cleaned_data.get('phone', ''),
             }
 
-            # Generate OTP
-            otp = str(random.randint(100000, 999999))
+            try:
+                _send_registration_otp(request, user_data['email'])
+            except OtpRateLimited as e:
+                messages.error(request, str(e))
+                return render(request, 'accounts/register.html', {'form': form})
 
             request.session['pending_registration'] = user_data
-            request.session['registration_otp'] = otp
-
-            # Send OTP asynchronously
-            send_otp_email(user_data['email'], otp)
 
             messages.success(request, 'Check your email for the OTP.')
             return redirect('verify_otp')
@@ -89,7 +96,15 @@ def logout_view(request):
 
 def send_otp(request):
     if request.method == 'POST':
-        email = request.POST.get('email')
+        email = request.POST.get('email', '')
+        otp_service = get_otp_service()
+
+        # Counted before the lookup so unknown emails are limited too
+        try:
+            otp_service.check_send_rate(email, request.META.get('REMOTE_ADDR'))
+        except OtpRateLimited as e:
+            messages.error(request, str(e))
+            return redirect('otp_login')
 
         try:
             user = CustomUser.objects.get(email=email)
@@ -97,11 +112,8 @@ def send_otp(request):
             messages.error(request, 'No account found with this email.')
             return redirect('otp_login')
 
-        otp = str(random.randint(100000, 999999))
-        OTP.objects.create(user=user, code=otp)
-
         # Send OTP asynchronously
-        send_otp_email(user.email, otp)
+        send_otp_email(user.email, otp_service.issue('login', user.id))
 
         request.session['otp_user'] = user.id
         messages.success(request, 'OTP sent to your email!')
@@ -120,16 +132,15 @@ def verify_otp(request):
         # ---------- Registration OTP ----------
         if 'pending_registration' in request.session:
 
-            stored_otp = request.session.get('registration_otp')
-
-            if otp_entered == stored_otp:
+            user_data = request.session['pending_registration']
 
-                user_data = request.session['pending_registration']
+            if get_otp_service().verify('register', user_data['email'].lower(), otp_entered):
 
-                user = CustomUser.objects.create_user(
+                user = CustomUser.objects.create(
                     username=user_data['username'],
-                    email=user_data['email'],
-                    password=user_data['password'],
+                    email=CustomUser.objects.normalize_email(user_data['email']),
+                    # Registrations started before the password was hashed
+                    password=user_data.get('password_hash') or make_password(user_data['password']),
                     phone=user_data.get('phone', ''),
                     role='user',  # DEFAULT ROLE
                     is_active=True,
@@ -138,14 +149,13 @@ def verify_otp(request):
 
                 # Clean session
                 del request.session['pending_registration']
-                del request.session['registration_otp']
 
                 login(request, user)
                 messages.success(request, 'Account created successfully!')
                 return redirect('dashboard_redirect')
 
             else:
-                messages.error(request, 'Invalid OTP.')
+                messages.error(request, 'Invalid or expired OTP.')
 
         # ---------- Login OTP ----------
         else:
@@ -156,12 +166,11 @@ def verify_otp(request):
 
             user = CustomUser.objects.get(id=user_id)
 
-            if OTP.objects.filter(user=user, code=otp_entered).exists():
-                OTP.objects.filter(user=user, code=otp_entered).delete()
+            if get_otp_service().verify('login', user.id, otp_entered):
                 login(request, user)
                 return redirect('dashboard_redirect')
             else:
-                messages.error(request, 'Invalid OTP.')
+                messages.error(request, 'Invalid or expired OTP.')
 
     return render(request, 'accounts/verify_otp.html')
 
@@ -174,12 +183,12 @@ def resend_registration_otp(request):
 
         user_data = request.session['pending_registration']
 
-        otp = str(random.randint(100000, 999999))
-        request.session['registration_otp'] = otp
-
-        send_otp_email(user_data['email'], otp)
-
-        messages.success(request, 'New OTP sent!')
+        try:
+            _send_registration_otp(request, user_data['email'])
+        except OtpRateLimited as e:
+            messages.error(request, str(e))
+        else:
+            messages.success(request, 'New OTP sent!')
         return redirect('verify_otp')
 
     return redirect('register')
@@ -1,6 +1,7 @@
 from django.db import transaction
 from django.utils import timezone
 from .models import Booking, BookingHold
+from apps.payments.ledger import post_captures
 from apps.payments.models import Payment
 from apps.notifications.services import create_notification
 
@@ -17,7 +18,7 @@ def auto_transition_bookings_for_cars(cars_queryset):
         status='confirmed',
         start_date__lte=today,
         end_date__gte=today,
-    ).update(status='ongoing')
+    ).update(status='ongoing', updated_at=timezone.now())
 
     # Move confirmed/ongoing bookings to completed when the rental has ended
     ended = Booking.objects.filter(
@@ -30,7 +31,8 @@ def auto_transition_bookings_for_cars(cars_queryset):
         booking.save(update_fields=['status', 'updated_at'])
         if hasattr(booking, 'payment') and booking.payment.status != 'completed':
             booking.payment.status = 'completed'
-            booking.payment.save(update_fields=['status'])
+            booking.payment.save(update_fields=['status', 'updated_at'])
+            post_captures([booking.payment.id])
 
 
 def get_owner_bookings(owner, status=None):
@@ -107,20 +109,19 @@ def reject_booking(booking):
         try:
             from apps.payments.services import RazorpayPaymentService
             payment_service = RazorpayPaymentService()
+            # Only queues the refund — the Razorpay call happens after this
+            # transaction commits, and marks the booking 'refunded' when it succeeds.
             payment_service.create_refund(
                 booking.payment.id,
                 reason='Booking rejected by owner',
             )
-            # create_refund already sets booking.status and booking.payment_status = 'refunded'
             refund_initiated = True
         except Exception as e:
             import logging
             logging.getLogger(__name__).error(f'Refund failed for booking {booking.id}: {e}')
-            booking.status = 'rejected'
-            booking.save()
-    else:
-        booking.status = 'rejected'
-        booking.save()
+
+    booking.status = 'rejected'
+    booking.save()
 
     create_notification(
         booking.user,
@@ -184,7 +185,7 @@ def auto_transition_bookings_for_user(user):
         status='confirmed',
         start_date__lte=today,
         end_date__gte=today,
-    ).update(status='ongoing')
+    ).update(status='ongoing', updated_at=timezone.now())
 
     # Move confirmed/ongoing bookings to completed when the rental has ended
     ended = Booking.objects.filter(
@@ -197,19 +198,21 @@ def auto_transition_bookings_for_user(user):
         booking.save(update_fields=['status', 'updated_at'])
         if hasattr(booking, 'payment') and booking.payment.status != 'completed':
             booking.payment.status = 'completed'
-            booking.payment.save(update_fields=['status'])
+            booking.payment.save(update_fields=['status', 'updated_at'])
+            post_captures([booking.payment.id])
 
 
 def clear_stale_bookings():
     """Delete bookings where Razorpay payment was never captured."""
     from django.conf import settings
     hold_minutes = getattr(settings, 'BOOKING_HOLD_MINUTES', 10)
-    # A booking is stale if it's still pending payment and older than the hold window
+    # A booking is stale if it's still unpaid (pending, or failed and awaiting a
+    # retry) and has not been touched for longer than the hold window
     cutoff = timezone.now() - timezone.timedelta(minutes=hold_minutes + 5)
     stale = Booking.objects.filter(
-        payment_status='pending',
+        payment_status__in=('pending', 'failed'),
         status='pending',
-        created_at__lt=cutoff,
+        updated_at__lt=cutoff,
     )
     count = stale.count()
     if count:
@@ -1,36 +1,37 @@
-# Email helper tasks for the bookings app
-from django.core.mail import send_mail
+# Email helper tasks for the bookings app.
+# Messages are written to the email outbox and delivered by the
+# `send_queued_emails` worker, so requests never wait on SMTP.
+from datetime import timedelta
+
 from django.conf import settings
 
+from apps.notifications.outbox import queue_email
+
 
 def send_otp_email(email, otp):
-    """Send OTP verification email."""
-    send_mail(
+    """Queue OTP verification email; the code itself stays out of the database."""
+    queue_email(
+        email,
         'Your OTP Code - CarRent',
-        f'Your OTP verification code is: {otp}\n\nThis code will expire shortly.',
-        settings.EMAIL_HOST_USER,
-        [email],
-        fail_silently=True,
+        'Your OTP verification code is: {otp}\n\nThis code will expire shortly.',
+        secrets={'otp': otp},
+        expires_in=timedelta(minutes=getattr(settings, 'OTP_EXPIRY_MINUTES', 10)),
     )
 
 
 def send_booking_confirmation_email(booking):
-    """Send booking confirmation email to the user."""
-    send_mail(
+    """Queue booking confirmation email to the user."""
+    queue_email(
+        booking.user.email,
         'Booking Confirmed - CarRent',
         f'Your booking for {booking.car.name} from {booking.start_date} to {booking.end_date} has been confirmed.',
-        settings.EMAIL_HOST_USER,
-        [booking.user.email],
-        fail_silently=True,
     )
 
 
 def send_payment_confirmation_email(payment):
-    """Send payment confirmation email to the user."""
-    send_mail(
+    """Queue payment confirmation email to the user."""
+    queue_email(
+        payment.user.email,
         'Payment Received - CarRent',
         f'Your payment of ₹{payment.amount} has been received.',
-        settings.EMAIL_HOST_USER,
-        [payment.user.email],
-        fail_silently=True,
     )
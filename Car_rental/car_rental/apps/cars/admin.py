@@ -1,17 +1,22 @@
 from django.contrib import admin
+from django.utils import timezone
 from .models import Car
 
 class CarAdmin(admin.ModelAdmin):
-    list_display = ('name', 'owner', 'status', 'created_at')
-    list_filter = ('status',)
-    actions = ['approve_cars', 'reject_cars']
+    list_display = ('name', 'owner', 'status', 'thumbnail_status', 'created_at')
+    list_filter = ('status', 'thumbnail_status')
+    actions = ['approve_cars', 'reject_cars', 'requeue_thumbnails']
 
     def approve_cars(self, request, queryset):
-        queryset.update(status='approved')
+        queryset.update(status='approved', updated_at=timezone.now())
     approve_cars.short_description = "Approve selected cars"
 
     def reject_cars(self, request, queryset):
-        queryset.update(status='rejected')
+        queryset.update(status='rejected', updated_at=timezone.now())
     reject_cars.short_description = "Reject selected cars"
 
+    def requeue_thumbnails(self, request, queryset):
+        queryset.exclude(image='').exclude(image__isnull=True).update(thumbnail_status='pending', thumbnail_error='')
+    requeue_thumbnails.short_description = "Regenerate thumbnails for selected cars"
+
 admin.site.register(Car, CarAdmin)
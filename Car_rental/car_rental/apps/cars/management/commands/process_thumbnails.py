@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.cars.thumbnails import drain_thumbnails
+
+
+class Command(BaseCommand):
+    help = (
+        'Generate thumbnails for cars with a new image on a pool of worker threads. '
+        'Runs forever, polling every --interval seconds, unless --once is given.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Drain the queue once and exit.')
+        parser.add_argument('--interval', type=float, default=1.0, help='Seconds between polls (default 1).')
+        parser.add_argument('--batch-size', type=int, default=None, help='Cars claimed per batch.')
+        parser.add_argument('--workers', type=int, default=None, help='Resize threads (default THUMBNAIL_WORKERS).')
+
+    def handle(self, *args, **options):
+        while True:
+            ready, failed = drain_thumbnails(batch_size=options['batch_size'], workers=options['workers'])
+            if ready or failed:
+                self.stdout.write(f'Generated {ready}, failed {failed}')
+            if options['once']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from apps.cars.thumbnails import regenerate_thumbnails
+
+
+class Command(BaseCommand):
+    help = (
+        'Re-render the thumbnails and image variants of every car whose images are older '
+        'than the current size and format settings or its uploaded image, on a pool of '
+        'worker processes. Up-to-date cars are skipped, so an interrupted run can simply be '
+        'started again.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=None, help='Resize processes (default THUMBNAIL_WORKERS).')
+        parser.add_argument('--batch-size', type=int, default=None, help='Cars saved per bulk update.')
+        parser.add_argument('--force', action='store_true', help='Re-render up-to-date cars too.')
+        parser.add_argument('--dry-run', action='store_true', help='Only count the cars that would be re-rendered.')
+
+    def handle(self, *args, **options):
+        def progress(regenerated, skipped, failed):
+            self.stdout.write(f'Regenerated {regenerated}, skipped {skipped}, failed {failed}')
+
+        regenerated, skipped, failed = regenerate_thumbnails(
+            workers=options['workers'],
+            batch_size=options['batch_size'],
+            force=options['force'],
+            dry_run=options['dry_run'],
+            progress=None if options['dry_run'] else progress,
+        )
+        verb = 'Would regenerate' if options['dry_run'] else 'Regenerated'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {regenerated}, skipped {skipped} up to date, failed {failed}'))
@@ -0,0 +1,84 @@
+import io
+import multiprocessing
+import resource
+import time
+
+from django.core.management.base import BaseCommand
+from PIL import Image as PilImage
+
+from apps.cars.thumbnails import THUMBNAIL_SIZE, open_image, render_images
+
+
+def full_decode(data):
+    """What Car.save used to do: decode every pixel, then shrink to a 400×300 thumbnail."""
+    img = PilImage.open(io.BytesIO(data)).convert('RGB')
+    img.thumbnail((400, 300), PilImage.LANCZOS)
+    output = io.BytesIO()
+    img.save(output, format='JPEG', quality=85)
+
+
+def draft_decode(data):
+    img = open_image(io.BytesIO(data), THUMBNAIL_SIZE[0])
+    img.thumbnail(THUMBNAIL_SIZE, PilImage.LANCZOS)
+    output = io.BytesIO()
+    img.save(output, format='JPEG', quality=85)
+
+
+def worker_pipeline(data):
+    render_images(io.BytesIO(data))
+
+
+METHODS = {
+    'full decode, thumbnail': full_decode,
+    'draft decode, thumbnail': draft_decode,
+    'draft decode, thumbnail + variants': worker_pipeline,
+}
+
+
+def _run(method, data, repeat, results):
+    # In a fresh child process so that peak RSS belongs to this method alone
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started = time.perf_counter()
+    for _ in range(repeat):
+        METHODS[method](data)
+    elapsed = (time.perf_counter() - started) / repeat
+    # ru_maxrss is in kilobytes on Linux
+    results.put((elapsed, (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline) / 1024))
+
+
+def make_photo(megapixels):
+    """A noisy 4:3 JPEG of about the given size, roughly as hard to compress as a photo."""
+    width = int((megapixels * 1_000_000 * 4 / 3) ** 0.5)
+    height = width * 3 // 4
+    noise = PilImage.effect_noise((width, height), 40)
+    gradient = PilImage.linear_gradient('L').resize((width, height))
+    img = PilImage.merge('RGB', (noise, gradient, gradient.transpose(PilImage.Transpose.FLIP_TOP_BOTTOM)))
+    output = io.BytesIO()
+    img.save(output, format='JPEG', quality=90)
+    return output.getvalue(), (width, height)
+
+
+class Command(BaseCommand):
+    help = (
+        'Time and peak memory of thumbnail rendering for synthetic 12 MP and 48 MP JPEGs: '
+        'full decoding as Car.save used to do, against the draft-mode pipeline in '
+        'apps/cars/thumbnails.py. Each measurement runs in its own child process.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--megapixels', type=int, nargs='+', default=[12, 48])
+        parser.add_argument('--repeat', type=int, default=3, help='Runs per measurement (default 3).')
+
+    def handle(self, *args, **options):
+        context = multiprocessing.get_context('fork')
+        self.stdout.write(f'{"input":<22}{"method":<36}{"ms":>8}{"peak MB":>10}')
+        for megapixels in options['megapixels']:
+            data, (width, height) = make_photo(megapixels)
+            label = f'{megapixels} MP {width}×{height}'
+            for method in METHODS:
+                results = context.Queue()
+                child = context.Process(target=_run, args=(method, data, options['repeat'], results))
+                child.start()
+                elapsed, peak = results.get()
+                child.join()
+                self.stdout.write(f'{label:<22}{method:<36}{elapsed * 1000:>8.0f}{peak:>10.0f}')
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.10 on 2026-10-19 09:13
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def set_thumbnail_status(apps, schema_editor):
+    # Cars whose image never got a thumbnail are queued for the worker
+    Car = apps.get_model('cars', 'Car')
+    cars_with_image = Car.objects.exclude(image='').exclude(image__isnull=True)
+    cars_with_image.exclude(thumbnail='').exclude(thumbnail__isnull=True).update(thumbnail_status='ready')
+    cars_with_image.filter(thumbnail_status='none').update(thumbnail_status='pending')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cars', '0003_add_is_featured'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='car',
+            name='thumbnail_claimed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='car',
+            name='thumbnail_error',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='car',
+            name='thumbnail_status',
+            field=models.CharField(choices=[('none', 'No image'), ('pending', 'Pending'), ('processing', 'Processing'), ('ready', 'Ready'), ('failed', 'Failed')], default='none', max_length=10),
+        ),
+        migrations.AddIndex(
+            model_name='car',
+            index=models.Index(fields=['thumbnail_status'], name='car_thumbnail_status_idx'),
+        ),
+        migrations.RunPython(set_thumbnail_status, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.10 on 2026-10-19 09:15
+
+from django.db import migrations, models
+
+
+def queue_variants(apps, schema_editor):
+    # Existing thumbnails stay in use until the worker has rendered the variants
+    Car = apps.get_model('cars', 'Car')
+    Car.objects.filter(thumbnail_status='ready').update(thumbnail_status='pending')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cars', '0004_thumbnail_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='car',
+            name='image_variants',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.RunPython(queue_variants, migrations.RunPython.noop),
+    ]
@@ -1,10 +1,9 @@
 from django.db import models
 from django.conf import settings
 from django.utils import timezone
-from django.core.files.base import ContentFile
-from PIL import Image as PilImage
-import io
-import os
+
+# Car._loaded_image when the image column was deferred in the query
+_NOT_LOADED = object()
 
 class Car(models.Model):
 
@@ -14,6 +13,14 @@ class Car(models.Model):
         ('rejected', 'Rejected'),
     )
 
+    THUMBNAIL_STATUS_CHOICES = (
+        ('none', 'No image'),
+        ('pending', 'Pending'),         # Waiting for the process_thumbnails worker
+        ('processing', 'Processing'),   # Claimed by a worker
+        ('ready', 'Ready'),
+        ('failed', 'Failed'),           # See thumbnail_error
+    )
+
     owner = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
@@ -29,12 +36,27 @@ class Car(models.Model):
     seats = models.IntegerField()
     image = models.ImageField(upload_to='car_images/', null=True, blank=True)
     thumbnail = models.ImageField(upload_to='car_thumbnails/', null=True, blank=True)
+    thumbnail_status = models.CharField(max_length=10, choices=THUMBNAIL_STATUS_CHOICES, default='none')
+    thumbnail_error = models.TextField(blank=True)
+    thumbnail_claimed_at = models.DateTimeField(null=True, blank=True)
+    # Responsive sizes of the image, see thumbnails.py
+    image_variants = models.JSONField(default=dict, blank=True)
 
     is_available = models.BooleanField(default=True)
     is_featured = models.BooleanField(default=False)
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
 
     created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    # Image name as loaded from the database
+    _loaded_image = None
+
+    class Meta:
+        indexes = [
+            # The thumbnail worker polls for pending cars
+            models.Index(fields=['thumbnail_status'], name='car_thumbnail_status_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -51,38 +73,33 @@ class Car(models.Model):
         from apps.bookings.models import Booking
         return not Booking.has_conflict(self, start_date, end_date)
 
-    def save(self, *args, **kwargs):
-        """Auto-generate a 400x300 JPEG thumbnail when image changes."""
-        # Detect if image has changed
-        generate_thumb = False
-        if self.pk:
-            try:
-                old = Car.objects.get(pk=self.pk)
-                if old.image != self.image:
-                    generate_thumb = True
-            except Car.DoesNotExist:
-                generate_thumb = bool(self.image)
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        car = super().from_db(db, field_names, values)
+        # Lets save() spot a new image without re-reading the row
+        if 'image' in field_names:
+            car._loaded_image = values[field_names.index('image')] or None
         else:
-            generate_thumb = bool(self.image)
+            car._loaded_image = _NOT_LOADED
+        return car
 
-        super().save(*args, **kwargs)
-
-        if generate_thumb and self.image:
-            try:
-                img = PilImage.open(self.image.path)
-                img = img.convert('RGB')
-                img.thumbnail((400, 300), PilImage.LANCZOS)
-
-                thumb_io = io.BytesIO()
-                img.save(thumb_io, format='JPEG', quality=85)
-                thumb_io.seek(0)
+    def _stored_image(self):
+        if self._loaded_image is _NOT_LOADED:
+            # Deferred when the row was read, then loaded lazily or assigned
+            return Car.objects.filter(pk=self.pk).values_list('image', flat=True).first() or None
+        return self._loaded_image
 
-                base_name = os.path.splitext(os.path.basename(self.image.name))[0]
-                thumb_name = f"{base_name}_thumb.jpg"
-
-                self.thumbnail.save(thumb_name, ContentFile(thumb_io.read()), save=False)
-                # Save only the thumbnail field to avoid recursion
-                Car.objects.filter(pk=self.pk).update(thumbnail=self.thumbnail)
-            except Exception:
-                pass  # Silently skip if thumbnail generation fails
+    def save(self, *args, **kwargs):
+        """Queue a new thumbnail when the image changes (see thumbnails.py)."""
+        if 'image' not in self.get_deferred_fields() and (self.image.name or None) != self._stored_image():
+            self.thumbnail = None
+            self.image_variants = {}
+            self.thumbnail_status = 'pending' if self.image else 'none'
+            self.thumbnail_error = ''
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {
+                    *kwargs['update_fields'], 'thumbnail', 'image_variants', 'thumbnail_status', 'thumbnail_error',
+                }
 
+        super().save(*args, **kwargs)
+        self._loaded_image = self.image.name or None
@@ -0,0 +1,43 @@
+from django import template
+from django.utils.html import format_html
+
+register = template.Library()
+
+# Width of the JPEG used as src by browsers that ignore srcset
+FALLBACK_WIDTH = 640
+
+
+@register.simple_tag
+def car_picture(car, sizes='100vw', css_class='', alt=None, loading='lazy'):
+    """
+    A <picture> with WebP and JPEG srcsets of car's image variants, so the
+    browser downloads only the width ``sizes`` says it will display.  Falls
+    back to the plain thumbnail for cars without variants, and to nothing
+    when there is no thumbnail either.
+
+        {% car_picture car sizes="(min-width: 1024px) 33vw, 100vw" css_class="h-56 w-full object-cover" %}
+    """
+    alt = car.name if alt is None else alt
+    variants = car.image_variants or {}
+    if not variants.get('jpeg'):
+        if not car.thumbnail:
+            return ''
+        return format_html(
+            '<img src="{}" alt="{}" class="{}" loading="{}" decoding="async">',
+            car.thumbnail.url, alt, css_class, loading,
+        )
+
+    storage = car.thumbnail.storage
+
+    def srcset(fmt):
+        return ', '.join(f'{storage.url(name)} {width}w' for width, name in variants.get(fmt, []))
+
+    fallback = min(variants['jpeg'], key=lambda variant: abs(variant[0] - FALLBACK_WIDTH))[1]
+    webp = format_html('<source type="image/webp" srcset="{}" sizes="{}">', srcset('webp'), sizes) if variants.get('webp') else ''
+    # display: contents keeps the <img> sized and positioned as if <picture> were not there
+    return format_html(
+        '<picture class="contents">{}<img src="{}" srcset="{}" sizes="{}" width="{}" height="{}" '
+        'alt="{}" class="{}" loading="{}" decoding="async"></picture>',
+        webp, storage.url(fallback), srcset('jpeg'), sizes, variants['width'], variants['height'],
+        alt, css_class, loading,
+    )
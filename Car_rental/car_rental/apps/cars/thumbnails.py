@@ -0,0 +1,439 @@
+"""
+Car thumbnails and responsive image variants, generated off the request path.
+
+Saving a car with a new image only marks it ``thumbnail_status='pending'``;
+templates show a placeholder until the thumbnail is ready.  The
+``process_thumbnails`` worker claims pending cars in batches and resizes
+their images on a thread pool (Pillow releases the GIL while decoding and
+resampling).  Failures are recorded on the car (``thumbnail_error``) instead
+of being swallowed.
+
+Each image is decoded once into the 400×300 ``thumbnail`` plus one variant
+per CAR_IMAGE_WIDTHS width up to the original's in each
+CAR_IMAGE_FORMATS format, stored next to it in car_thumbnails/.  They are
+listed in ``Car.image_variants`` for the ``car_picture`` template tag::
+
+    {"width": 1920, "height": 1280,
+     "webp": [[320, "car_thumbnails/x_320w.webp"], ...],
+     "jpeg": [[320, "car_thumbnails/x_320w.jpg"], ...]}
+
+Memory stays bounded by the outputs, not the upload: images over
+CAR_IMAGE_MAX_PIXELS are refused before decoding, and JPEGs are decoded at
+1/2, 1/4 or 1/8 scale (libjpeg "draft" mode) whenever that still covers the
+widest output.  Outputs are upright (EXIF orientation applied), sRGB, and
+carry no metadata.
+
+``image_variants`` also records the rendering settings' ``signature`` and
+the source file's ``source_mtime``; ``regenerate_thumbnails`` re-renders only
+the cars where either no longer matches, in a process pool.
+
+Media storage is content-addressed (apps/core/storage.py), so cars with the
+same photo share one image file.  Such cars reuse each other's thumbnail and
+variants instead of rendering them again, and a file is deleted only once no
+car refers to it.
+"""
+import hashlib
+import io
+import json
+import logging
+import math
+import os
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from datetime import timedelta
+
+import django
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+from PIL import ExifTags, Image as PilImage, ImageCms, ImageOps, features
+
+from .models import Car
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_SIZE = (400, 300)
+
+# format: (Pillow format, file extension, save options)
+IMAGE_FORMATS = {
+    'webp': ('WEBP', 'webp', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', 'jpg', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+# Cars stuck in 'processing' longer than this are assumed to belong to a dead worker
+STALE_CLAIM_MINUTES = 10
+
+
+def image_formats():
+    """Configured variant formats this Pillow can write; JPEG always, as the <img> fallback."""
+    formats = [
+        fmt for fmt in getattr(settings, 'CAR_IMAGE_FORMATS', ('webp', 'jpeg'))
+        if fmt in IMAGE_FORMATS and (fmt != 'webp' or features.check('webp'))
+    ]
+    return formats if 'jpeg' in formats else formats + ['jpeg']
+
+
+def _encode(img, pil_format, **options):
+    output = io.BytesIO()
+    img.save(output, format=pil_format, **options)
+    return output.getvalue()
+
+
+def _fit(img, size):
+    """img scaled down to fit within size, or img itself if it already does."""
+    ratio = min(size[0] / img.width, size[1] / img.height)
+    if ratio >= 1:
+        return img
+    # reducing_gap shrinks by whole factors with a cheap box filter before the Lanczos pass
+    return img.resize(
+        (max(round(img.width * ratio), 1), max(round(img.height * ratio), 1)),
+        PilImage.LANCZOS, reducing_gap=3.0,
+    )
+
+
+def _to_srgb(img):
+    """img in RGB, converted from its embedded colour profile (e.g. Display P3) when it has one."""
+    icc_profile = img.info.get('icc_profile')
+    if icc_profile:
+        try:
+            return ImageCms.profileToProfile(
+                img, ImageCms.ImageCmsProfile(io.BytesIO(icc_profile)), ImageCms.createProfile('sRGB'),
+                outputMode='RGB',
+            )
+        except ImageCms.PyCMSError:
+            logger.warning('Ignoring an unreadable colour profile')
+    return img if img.mode == 'RGB' else img.convert('RGB')
+
+
+def open_image(file, width):
+    """
+    Decode the image in file upright and in sRGB, at no less than ``width``
+    pixels wide if it is that wide.  Raises ValueError above CAR_IMAGE_MAX_PIXELS.
+    """
+    img = PilImage.open(file)
+    max_pixels = getattr(settings, 'CAR_IMAGE_MAX_PIXELS', 60_000_000)
+    if img.width * img.height > max_pixels:
+        raise ValueError(f'Image is {img.width}×{img.height}; the limit is {max_pixels / 1e6:.0f} megapixels')
+
+    # Orientations 5–8 are stored sideways: the displayed width is the stored height
+    sideways = img.getexif().get(ExifTags.Base.Orientation, 1) in (5, 6, 7, 8)
+    shown_width, shown_height = (img.height, img.width) if sideways else img.size
+    if shown_width > width:
+        size = (width, math.ceil(shown_height * width / shown_width))
+        # JPEG only (a no-op for other formats): picks the smallest scale still >= size
+        img.draft('RGB', size[::-1] if sideways else size)
+
+    ImageOps.exif_transpose(img, in_place=True)
+    img = _to_srgb(img)
+    # Nothing from the upload (EXIF, GPS, profiles) is written to the outputs
+    img.info = {}
+    return img
+
+
+def render_images(file):
+    """
+    Decode the image in file once and return (thumbnail JPEG bytes,
+    {(format, width): bytes}, (width, height)).
+    """
+    configured = getattr(settings, 'CAR_IMAGE_WIDTHS', (320, 640, 960, 1280, 1920))
+    img = open_image(file, max(*configured, THUMBNAIL_SIZE[0]))
+
+    thumbnail = _encode(_fit(img, THUMBNAIL_SIZE), 'JPEG', quality=85)
+
+    variants = {}
+    # Never upscaled; an image narrower than every width gets one variant at its own size
+    widths = [width for width in sorted(configured) if width <= img.width] or [img.width]
+    # Largest first, each resized from the previous one rather than the original
+    scaled = img
+    for width in reversed(widths):
+        scaled = _fit(scaled, (width, scaled.height))
+        for fmt in image_formats():
+            pil_format, _, options = IMAGE_FORMATS[fmt]
+            variants[(fmt, width)] = _encode(scaled, pil_format, **options)
+    return thumbnail, variants, img.size
+
+
+def render_signature():
+    """Short hash of every setting that changes what render_images produces."""
+    config = [
+        THUMBNAIL_SIZE, IMAGE_FORMATS, image_formats(),
+        sorted(getattr(settings, 'CAR_IMAGE_WIDTHS', (320, 640, 960, 1280, 1920))),
+    ]
+    return hashlib.sha1(json.dumps(config, sort_keys=True).encode()).hexdigest()[:12]
+
+
+def source_mtime(car):
+    """Modification time of car's image file as a timestamp, or None if unknown."""
+    try:
+        return car.image.storage.get_modified_time(car.image.name).timestamp()
+    except (NotImplementedError, OSError):
+        return None
+
+
+def is_up_to_date(car, signature=None):
+    """True if car's thumbnail and variants were rendered from its current image with the current settings."""
+    rendered = car.image_variants or {}
+    mtime = source_mtime(car)
+    return (
+        bool(car.thumbnail)
+        and rendered.get('signature') == (signature or render_signature())
+        and mtime is not None and rendered.get('source_mtime') == mtime
+    )
+
+
+def _base_name(image_name):
+    return os.path.splitext(os.path.basename(image_name))[0]
+
+
+def thumbnail_name(image_name):
+    return f'{_base_name(image_name)}_thumb.jpg'
+
+
+def variant_name(image_name, fmt, width):
+    return f'{_base_name(image_name)}_{width}w.{IMAGE_FORMATS[fmt][1]}'
+
+
+def variant_files(image_variants):
+    """Every stored file name listed in an image_variants value."""
+    return [name for fmt in IMAGE_FORMATS for _, name in image_variants.get(fmt, [])]
+
+
+def release_stale_claims():
+    """Put cars claimed by a crashed worker back in the queue."""
+    cutoff = timezone.now() - timedelta(minutes=STALE_CLAIM_MINUTES)
+    return Car.objects.filter(thumbnail_status='processing', thumbnail_claimed_at__lt=cutoff).update(
+        thumbnail_status='pending', thumbnail_claimed_at=None,
+    )
+
+
+def claim_batch(batch_size):
+    """Atomically mark up to batch_size pending cars as 'processing' and return them."""
+    now = timezone.now()
+    with transaction.atomic():
+        pending = list(
+            Car.objects.select_for_update(skip_locked=True)
+            .filter(thumbnail_status='pending')
+            .only('id', 'image', 'thumbnail')
+            .order_by('id')[:batch_size]
+        )
+        if pending:
+            Car.objects.filter(id__in=[car.id for car in pending]).update(
+                thumbnail_status='processing', thumbnail_claimed_at=now,
+            )
+    return pending
+
+
+def _generate(car):
+    """Runs on a pool thread or process: stores the files, returns the fields to update.  No database access."""
+    mtime = source_mtime(car)
+    with car.image.open('rb') as image:
+        thumbnail, variants, (width, height) = render_images(image)
+
+    car.thumbnail.save(thumbnail_name(car.image.name), ContentFile(thumbnail), save=False)
+    storage = car.thumbnail.storage
+    image_variants = {'width': width, 'height': height, 'signature': render_signature(), 'source_mtime': mtime}
+    for (fmt, variant_width), data in sorted(variants.items()):
+        name = car.thumbnail.field.generate_filename(car, variant_name(car.image.name, fmt, variant_width))
+        image_variants.setdefault(fmt, []).append([variant_width, storage.save(name, ContentFile(data))])
+    return {'thumbnail': car.thumbnail.name, 'image_variants': image_variants}
+
+
+def _rendered_copy(car, signature):
+    """The fields of another car already rendered from the same image file with the same settings, or None."""
+    others = (
+        Car.objects.filter(image=car.image.name, thumbnail_status='ready')
+        .exclude(pk=car.pk).exclude(thumbnail='')
+        .only('thumbnail', 'image_variants')
+    )
+    mtime = source_mtime(car)
+    for other in others:
+        rendered = other.image_variants
+        if mtime is not None and rendered.get('signature') == signature and rendered.get('source_mtime') == mtime:
+            return {'thumbnail': other.thumbnail.name, 'image_variants': rendered}
+    return None
+
+
+def _completed(result):
+    future = Future()
+    future.set_result(result)
+    return future
+
+
+def _finish(car, **fields):
+    # Only if the image is still the one that was rendered — the owner may
+    # have uploaded another meanwhile, which queued a new thumbnail
+    return Car.objects.filter(pk=car.pk, image=car.image.name, thumbnail_status='processing').update(
+        thumbnail_claimed_at=None, **fields,
+    )
+
+
+def process_batch(cars, executor):
+    """Generate thumbnails for claimed cars on executor.  Returns (ready, failed)."""
+    ready = failed = 0
+    signature = render_signature()
+    # One render per image file, shared by every car using it
+    futures = {}
+    for car in cars:
+        if car.image.name not in futures:
+            copied = _rendered_copy(car, signature)
+            futures[car.image.name] = _completed(copied) if copied else executor.submit(_generate, car)
+
+    unused = []
+    for car in cars:
+        try:
+            fields = futures[car.image.name].result()
+        except Exception as e:
+            logger.warning(f'Thumbnail for car {car.pk} failed: {e}')
+            _finish(car, thumbnail_status='failed', thumbnail_error=f'{type(e).__name__}: {e}'[:1000])
+            failed += 1
+            continue
+        if _finish(car, thumbnail_status='ready', thumbnail_error='', **fields):
+            ready += 1
+        else:
+            unused += [fields['thumbnail'], *variant_files(fields['image_variants'])]
+    # Only now, when every car that could share them has been updated
+    _delete_unreferenced(unused)
+    return ready, failed
+
+
+def _delete_unreferenced(names):
+    """Delete the thumbnail and variant files among names that no car refers to."""
+    storage = Car._meta.get_field('thumbnail').storage
+    for name in set(filter(None, names)):
+        if not Car.objects.filter(Q(thumbnail=name) | Q(image_variants__icontains=name)).exists():
+            storage.delete(name)
+
+
+def drain_thumbnails(batch_size=None, workers=None):
+    """Generate every pending thumbnail, batch by batch.  Returns (ready, failed) totals."""
+    batch_size = batch_size or getattr(settings, 'THUMBNAIL_BATCH_SIZE', 20)
+    workers = workers or getattr(settings, 'THUMBNAIL_WORKERS', 4)
+    release_stale_claims()
+    total_ready = total_failed = 0
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='thumbnail') as executor:
+        while True:
+            batch = claim_batch(batch_size)
+            if not batch:
+                return total_ready, total_failed
+            ready, failed = process_batch(batch, executor)
+            total_ready += ready
+            total_failed += failed
+
+
+# ──────────────────────────────────────────────
+# Regeneration
+# ──────────────────────────────────────────────
+
+def _save_regenerated(results):
+    """
+    bulk_update the cars in results ({car: fields}) whose image is unchanged
+    since they were read, then delete the files nothing uses any more.
+    """
+    with transaction.atomic():
+        current = dict(
+            Car.objects.select_for_update()
+            .filter(pk__in=[car.pk for car in results])
+            .values_list('pk', 'image')
+        )
+        saved, stale = [], []
+        for car, fields in results.items():
+            (saved if current.get(car.pk) == car.image.name else stale).append(car)
+        replaced = [name for car in saved for name in [car.thumbnail.name, *variant_files(car.image_variants)]]
+        for car in saved:
+            for field, value in results[car].items():
+                setattr(car, field, value)
+        Car.objects.bulk_update(saved, ['thumbnail', 'image_variants', 'thumbnail_status', 'thumbnail_error'])
+
+    # Cars re-uploaded meanwhile are queued for the worker, so what was rendered for them is unused
+    unused = [
+        name for car in stale
+        for name in [results[car]['thumbnail'], *variant_files(results[car]['image_variants'])]
+    ]
+    _delete_unreferenced(replaced + unused)
+    return len(saved)
+
+
+def regenerate_thumbnails(workers=None, batch_size=None, force=False, dry_run=False, progress=None):
+    """
+    Re-render the thumbnail and variants of every car with an image that is
+    not up to date (all of them with ``force``) in a pool of processes, and
+    save them with one bulk_update per batch_size results.  Cars the worker is
+    about to render anyway are left to it.  Up-to-date cars are skipped, so
+    an interrupted run resumes where it stopped.
+
+    Returns (regenerated, skipped, failed); ``progress`` is called with the
+    running totals after each batch.
+    """
+    workers = workers or getattr(settings, 'THUMBNAIL_WORKERS', 4)
+    batch_size = batch_size or getattr(settings, 'THUMBNAIL_BATCH_SIZE', 20)
+    signature = render_signature()
+    cars = (
+        Car.objects.exclude(image='').exclude(image__isnull=True)
+        .exclude(thumbnail_status__in=['pending', 'processing'])
+        .only('id', 'image', 'thumbnail', 'image_variants')
+        .order_by('pk')
+    )
+    totals = {'regenerated': 0, 'skipped': 0, 'failed': 0}
+    results = {}
+    # future -> the cars waiting for it; image name -> its future, so that
+    # cars sharing an image file render it once
+    in_flight, rendering = {}, {}
+
+    def flush():
+        if results:
+            totals['regenerated'] += _save_regenerated(results)
+            results.clear()
+            if progress:
+                progress(**totals)
+
+    def collect(done):
+        for future in done:
+            waiting = in_flight.pop(future)
+            del rendering[waiting[0].image.name]
+            try:
+                fields = future.result()
+            except Exception as e:
+                for car in waiting:
+                    logger.warning(f'Regenerating thumbnail for car {car.pk} failed: {e}')
+                    # Keeps the old thumbnail and variants, which are still valid files
+                    Car.objects.filter(pk=car.pk, image=car.image.name).update(
+                        thumbnail_status='failed', thumbnail_error=f'{type(e).__name__}: {e}'[:1000],
+                    )
+                totals['failed'] += len(waiting)
+                continue
+            for car in waiting:
+                results[car] = {**fields, 'thumbnail_status': 'ready', 'thumbnail_error': ''}
+        if len(results) >= batch_size:
+            flush()
+
+    # Forked children must not share the parent's database connections
+    connections.close_all()
+    with ProcessPoolExecutor(max_workers=workers, initializer=django.setup) as executor:
+        for car in cars.iterator(chunk_size=batch_size):
+            if not force and is_up_to_date(car, signature):
+                totals['skipped'] += 1
+                continue
+            if dry_run:
+                totals['regenerated'] += 1
+                continue
+            if car.image.name in rendering:
+                in_flight[rendering[car.image.name]].append(car)
+                continue
+            copied = None if force else _rendered_copy(car, signature)
+            if copied:
+                results[car] = {**copied, 'thumbnail_status': 'ready', 'thumbnail_error': ''}
+                if len(results) >= batch_size:
+                    flush()
+                continue
+            # Send only what rendering needs, not the loaded row
+            future = executor.submit(_generate, Car(pk=car.pk, image=car.image.name))
+            in_flight[future] = [car]
+            rendering[car.image.name] = future
+            # Keep the pool busy without reading every car into memory first
+            if len(in_flight) >= workers * 2:
+                collect(wait(in_flight, return_when=FIRST_COMPLETED).done)
+        while in_flight:
+            collect(wait(in_flight, return_when=FIRST_COMPLETED).done)
+        flush()
+    return totals['regenerated'], totals['skipped'], totals['failed']
@@ -0,0 +1,116 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import FileField
+
+from apps.cars.models import Car
+from apps.cars.thumbnails import IMAGE_FORMATS
+from apps.core.storage import HashedFileSystemStorage
+
+
+class Command(BaseCommand):
+    help = (
+        'Move media files saved before content-addressed storage to their SHA-256 names, '
+        'point every file field and Car.image_variants at them, and delete the old files. '
+        'Byte-identical copies end up as one file.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Report what would change without touching anything.')
+        parser.add_argument('--batch-size', type=int, default=500, help='Rows per bulk update (default 500).')
+
+    def handle(self, *args, **options):
+        self.dry_run = options['dry_run']
+        self.batch_size = options['batch_size']
+        # old name -> hashed name, and what the move saves
+        self.renamed = {}
+        self.created = set()
+        self.freed = 0
+
+        fields = [
+            (model, field)
+            for model in apps.get_models() if not model._meta.proxy
+            for field in model._meta.concrete_fields
+            if isinstance(field, FileField) and isinstance(field.storage, HashedFileSystemStorage)
+        ]
+        if not fields:
+            raise CommandError('No file field uses HashedFileSystemStorage; check STORAGES["default"].')
+
+        for model, field in fields:
+            updated = self.rename_field(model, field)
+            self.stdout.write(f'  {model._meta.label}.{field.name}: {updated} rows')
+        self.stdout.write(f'  cars.Car.image_variants: {self.rename_variants()} rows')
+
+        moved = {old: new for old, new in self.renamed.items() if new != old}
+        if not self.dry_run:
+            # Every row points at the new names by now
+            storage = Car._meta.get_field('image').storage
+            for old in moved:
+                storage.delete(old)
+
+        verb = 'would be' if self.dry_run else 'were'
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(moved)} files {verb} moved into {len(self.created)} new hashed files, '
+            f'{self.freed / 1024 / 1024:.1f} MB freed'
+        ))
+
+    def rehash(self, storage, name):
+        """Hashed name of the stored file name, copied there unless this is a dry run."""
+        if name not in self.renamed:
+            new = name
+            if storage.exists(name):
+                with storage.open(name) as file:
+                    new = storage.hashed_name(name, file)
+                    if new != name:
+                        self.freed += storage.size(name)
+                        if new not in self.created and not storage.exists(new):
+                            self.created.add(new)
+                            self.freed -= storage.size(name)
+                            if not self.dry_run:
+                                storage.save(name, file)
+            self.renamed[name] = new
+        return self.renamed[name]
+
+    def rename_field(self, model, field):
+        rows = (
+            model._default_manager.exclude(**{field.name: ''}).exclude(**{f'{field.name}__isnull': True})
+            .only('pk', field.name).order_by('pk')
+        )
+        changed = []
+        updated = 0
+        for row in rows.iterator(chunk_size=self.batch_size):
+            name = getattr(row, field.attname).name
+            new = self.rehash(field.storage, name)
+            if new != name:
+                setattr(row, field.attname, new)
+                changed.append(row)
+            if len(changed) >= self.batch_size:
+                updated += self.save(model, changed, [field.name])
+        return updated + self.save(model, changed, [field.name])
+
+    def rename_variants(self):
+        storage = Car._meta.get_field('thumbnail').storage
+        changed = []
+        updated = 0
+        for car in Car.objects.exclude(image_variants={}).only('pk', 'image_variants').order_by('pk').iterator():
+            variants = {
+                **car.image_variants,
+                **{
+                    fmt: [[width, self.rehash(storage, name)] for width, name in car.image_variants[fmt]]
+                    for fmt in IMAGE_FORMATS if fmt in car.image_variants
+                },
+            }
+            if variants != car.image_variants:
+                car.image_variants = variants
+                changed.append(car)
+            if len(changed) >= self.batch_size:
+                updated += self.save(Car, changed, ['image_variants'])
+        return updated + self.save(Car, changed, ['image_variants'])
+
+    def save(self, model, rows, fields):
+        count = len(rows)
+        if not self.dry_run and rows:
+            with transaction.atomic():
+                model._default_manager.bulk_update(rows, fields)
+        rows.clear()
+        return count
@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.core.retention import POLICIES, purge_expired
+
+
+class Command(BaseCommand):
+    help = (
+        'Delete expired notifications, sessions, booking holds, idempotency keys and '
+        'sent emails in small primary-key-ordered chunks, pausing between chunks.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--only', nargs='+', metavar='POLICY', help='Run only these policies.')
+        parser.add_argument('--chunk-size', type=int, default=None, help='Rows per DELETE (default RETENTION_CHUNK_SIZE).')
+        parser.add_argument('--pause', type=float, default=None, help='Minimum seconds between chunks (default RETENTION_PAUSE_SECONDS).')
+        parser.add_argument('--dry-run', action='store_true', help='Count expired rows without deleting them.')
+        parser.add_argument('--list', action='store_true', help='List the policies and exit.')
+
+    def handle(self, *args, **options):
+        if options['list']:
+            for policy in POLICIES:
+                self.stdout.write(f'{policy.name:<20} {policy.model:<30} {policy.description}')
+            return
+
+        known = {policy.name for policy in POLICIES}
+        unknown = set(options['only'] or ()) - known
+        if unknown:
+            raise CommandError(f'Unknown policies: {", ".join(sorted(unknown))}. Known: {", ".join(sorted(known))}')
+
+        results = purge_expired(
+            options['only'],
+            chunk_size=options['chunk_size'],
+            pause=options['pause'],
+            dry_run=options['dry_run'],
+        )
+        for result in results:
+            if result.skipped:
+                self.stdout.write(f'  {result.policy.name}: skipped ({result.policy.model} not installed)')
+            elif options['dry_run']:
+                self.stdout.write(f'  {result.policy.name}: {result.deleted} expired rows')
+            else:
+                self.stdout.write(
+                    f'  {result.policy.name}: deleted {result.deleted} rows'
+                    f' in {result.chunks} chunks, {result.seconds:.2f}s'
+                )
+        total = sum(result.deleted for result in results)
+        seconds = sum(result.seconds for result in results)
+        if options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(f'{total} rows would be deleted'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'{total} rows deleted in {seconds:.2f}s'))
@@ -0,0 +1,93 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from apps.accounts.models import CustomUser
+from apps.cars.models import Car
+
+ENGINES = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'signed_cookies': 'apps.core.sessions',
+}
+
+BENCH_USERNAME = 'session_bench_{role}'
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare session engines: request car_list, car_detail and the dashboards through '
+        'the test client under each engine and report database queries per request, how '
+        'many of them touch django_session, and the time per request. Creates (and removes) '
+        'one temporary user per role.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=50, help='Requests per page and engine.')
+        parser.add_argument('--engines', nargs='+', choices=list(ENGINES), default=list(ENGINES))
+
+    def handle(self, *args, **options):
+        car = Car.objects.filter(status='approved').order_by('pk').first()
+        if car is None:
+            raise CommandError('car_detail needs at least one approved car.')
+
+        users = {
+            role: CustomUser.objects.create_user(BENCH_USERNAME.format(role=role), password=None, role=role)
+            for role in ('user', 'owner', 'admin')
+        }
+        pages = [
+            ('car_list (anonymous)', reverse('car_list'), None),
+            ('car_detail (anonymous)', reverse('car_detail', args=[car.pk]), None),
+            ('car_list', reverse('car_list'), users['user']),
+            ('car_detail', reverse('car_detail', args=[car.pk]), users['user']),
+            ('user_dashboard', reverse('user_dashboard'), users['user']),
+            ('owner_dashboard', reverse('owner_dashboard'), users['owner']),
+            ('admin_dashboard', reverse('admin_dashboard'), users['admin']),
+        ]
+
+        try:
+            results = {engine: self.measure(engine, pages, options['requests']) for engine in options['engines']}
+        finally:
+            CustomUser.objects.filter(pk__in=[user.pk for user in users.values()]).delete()
+
+        self.stdout.write(f'{"page":<24}{"engine":<16}{"queries":>9}{"session":>9}{"ms":>8}')
+        for label, _, _ in pages:
+            for engine, measured in results.items():
+                queries, session_queries, ms = measured[label]
+                self.stdout.write(f'{label:<24}{engine:<16}{queries:>9.1f}{session_queries:>9.1f}{ms:>8.1f}')
+
+        if 'db' in results:
+            baseline = sum(queries for queries, _, _ in results['db'].values())
+            for engine, measured in results.items():
+                if engine != 'db':
+                    saved = baseline - sum(queries for queries, _, _ in measured.values())
+                    self.stdout.write(self.style.SUCCESS(
+                        f'{engine}: {saved / len(pages):.1f} queries saved per request on average'
+                    ))
+
+    def measure(self, engine, pages, count):
+        """{label: (queries, django_session queries, ms) per request} for one engine."""
+        measured = {}
+        with override_settings(SESSION_ENGINE=ENGINES[engine], ALLOWED_HOSTS=['testserver']):
+            for label, path, user in pages:
+                client = Client()
+                if user is not None:
+                    client.force_login(user)
+                # Warm-up: fills the session cache, replaces a database key with a cookie…
+                client.get(path)
+
+                with CaptureQueriesContext(connection) as captured:
+                    started = time.perf_counter()
+                    for _ in range(count):
+                        response = client.get(path)
+                        if response.status_code != 200:
+                            raise CommandError(f'{label} returned {response.status_code} under {engine}')
+                    elapsed = time.perf_counter() - started
+
+                session_queries = sum('django_session' in query['sql'] for query in captured.captured_queries)
+                measured[label] = (len(captured) / count, session_queries / count, elapsed * 1000 / count)
+        return measured
@@ -0,0 +1,122 @@
+"""
+Read-replica routing for reporting and dashboard traffic.
+
+Views opt in with ``@use_replica(max_staleness=...)``.  While such a view
+runs, ORM reads go to the ``replica`` database alias; writes always go to
+``default``.  ``max_staleness`` is how many seconds behind the primary the
+view can tolerate being — if the current user wrote something more recently
+than that, the view reads from the primary instead so they see their own
+change (read-your-writes).
+
+When no ``replica`` alias is configured everything falls back to ``default``.
+"""
+import time
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+
+REPLICA_ALIAS = 'replica'
+PRIMARY_ALIAS = 'default'
+
+# Session key holding the unix time of the user's last write request
+LAST_WRITE_SESSION_KEY = '_last_db_write_at'
+
+# True while a @use_replica view is allowed to read from the replica
+_replica_reads = ContextVar('replica_reads', default=False)
+
+# True once the current request has written to the primary
+_wrote_to_primary = ContextVar('wrote_to_primary', default=False)
+
+
+def replica_configured():
+    return REPLICA_ALIAS in settings.DATABASES
+
+
+class PrimaryReplicaRouter:
+    """Send reads to the replica only inside @use_replica views; writes always hit the primary."""
+
+    def db_for_read(self, model, **hints):
+        if _replica_reads.get() and not _wrote_to_primary.get() and replica_configured():
+            return REPLICA_ALIAS
+        return PRIMARY_ALIAS
+
+    def db_for_write(self, model, **hints):
+        _wrote_to_primary.set(True)
+        return PRIMARY_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data, so cross-alias relations are fine
+        return True
+
+
+def use_replica(max_staleness=60):
+    """
+    Let a read-only view read from the replica.
+
+    ``max_staleness`` — seconds of replication lag the view tolerates.  Users
+    who wrote within that window are served from the primary instead.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            session = getattr(request, 'session', None)
+            last_write = session.get(LAST_WRITE_SESSION_KEY) if session is not None else None
+            recently_wrote = last_write is not None and time.time() - last_write < max_staleness
+
+            allow_replica = not recently_wrote
+            token = _replica_reads.set(allow_replica)
+            try:
+                response = view_func(request, *args, **kwargs)
+                # TemplateResponses query while rendering — do that on the same alias
+                if hasattr(response, 'render') and not response.is_rendered:
+                    response.render()
+            finally:
+                _replica_reads.reset(token)
+
+            # Streaming bodies (exports) are consumed after the view returns
+            if getattr(response, 'streaming', False):
+                response.streaming_content = _routed_stream(response.streaming_content, allow_replica)
+            return response
+        wrapper.replica_max_staleness = max_staleness
+        return wrapper
+    return decorator
+
+
+def _routed_stream(iterable, allow_replica):
+    """Re-apply the replica routing decision around each chunk of a streaming body."""
+    iterator = iter(iterable)
+    while True:
+        # The body is read outside the request/response cycle, so pin both flags
+        read_token = _replica_reads.set(allow_replica)
+        write_token = _wrote_to_primary.set(False)
+        try:
+            chunk = next(iterator)
+        except StopIteration:
+            return
+        finally:
+            _wrote_to_primary.reset(write_token)
+            _replica_reads.reset(read_token)
+        yield chunk
+
+
+class ReadYourWritesMiddleware:
+    """
+    Remember when a user last wrote to the primary so that later
+    @use_replica views can fall back to the primary until the replica catches up.
+    Must come after SessionMiddleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = _wrote_to_primary.set(False)
+        try:
+            response = self.get_response(request)
+            session = getattr(request, 'session', None)
+            if _wrote_to_primary.get() and session is not None and replica_configured():
+                session[LAST_WRITE_SESSION_KEY] = time.time()
+            return response
+        finally:
+            _wrote_to_primary.reset(token)
@@ -0,0 +1,149 @@
+"""
+Retention policies for tables that only ever grow.
+
+Each RetentionPolicy names a model, the datetime field that ages its rows
+and how long rows are kept.  ``purge(policy)`` deletes the expired rows in
+primary-key order, ``chunk_size`` at a time, each chunk its own short
+DELETE.  It pauses between chunks for at least as long as the last chunk
+took, so the purge never uses more than about half of the primary's time
+however slow it gets.  Run them all with ``manage.py purge_expired``.
+
+Policies for models that are not installed (e.g. sessions once they no
+longer live in the database) are skipped.
+"""
+import logging
+import time
+from dataclasses import dataclass, field
+from datetime import timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+def _setting(name, default, unit='days'):
+    return lambda: timedelta(**{unit: getattr(settings, name, default)})
+
+
+def _forget_unread_counts(notifications):
+    from apps.notifications.services import invalidate_unread_counts
+    invalidate_unread_counts(notifications.filter(is_read=False).values_list('user_id', flat=True))
+
+
+@dataclass(frozen=True)
+class RetentionPolicy:
+    name: str
+    model: str                   # 'app_label.ModelName'
+    field: str                   # rows whose field is older than now - keep() expire
+    keep: object                 # callable returning a timedelta
+    filters: dict = field(default_factory=dict)
+    description: str = ''
+    # Called with each chunk's queryset just before it is deleted
+    before_delete: object = None
+
+    def get_model(self):
+        try:
+            return apps.get_model(self.model)
+        except LookupError:
+            return None
+
+    def expired(self, now=None):
+        """Queryset of this policy's expired rows, or None if the model is not installed."""
+        model = self.get_model()
+        if model is None:
+            return None
+        cutoff = (now or timezone.now()) - self.keep()
+        return model._default_manager.filter(**{f'{self.field}__lt': cutoff}, **self.filters)
+
+
+POLICIES = [
+    RetentionPolicy(
+        'read_notifications', 'notifications.Notification', 'created_at',
+        _setting('NOTIFICATION_READ_RETENTION_DAYS', 90), {'is_read': True},
+        'Read notifications',
+    ),
+    RetentionPolicy(
+        'old_notifications', 'notifications.Notification', 'created_at',
+        _setting('NOTIFICATION_RETENTION_DAYS', 365),
+        description='Any notification, read or not',
+        before_delete=_forget_unread_counts,
+    ),
+    RetentionPolicy(
+        'sessions', 'sessions.Session', 'expire_date', lambda: timedelta(0),
+        description='Expired database sessions',
+    ),
+    RetentionPolicy(
+        'booking_holds', 'bookings.BookingHold', 'expires_at', lambda: timedelta(0),
+        description='Expired checkout holds',
+    ),
+    RetentionPolicy(
+        'idempotency_keys', 'payments.IdempotencyKey', 'expires_at', lambda: timedelta(0),
+        description='Expired stored payment responses',
+    ),
+    RetentionPolicy(
+        'sent_emails', 'notifications.EmailOutbox', 'created_at',
+        _setting('EMAIL_OUTBOX_RETENTION_DAYS', 30), {'status': 'sent'},
+        description='Delivered outbox emails',
+    ),
+    RetentionPolicy(
+        'failed_emails', 'notifications.EmailOutbox', 'created_at',
+        _setting('EMAIL_OUTBOX_RETENTION_DAYS', 30), {'status': 'failed'},
+        description='Outbox emails given up on',
+    ),
+]
+
+
+@dataclass
+class PurgeResult:
+    policy: RetentionPolicy
+    deleted: int = 0
+    chunks: int = 0
+    seconds: float = 0.0
+    skipped: bool = False
+
+
+def purge(policy, chunk_size=None, pause=None, dry_run=False, now=None):
+    """Delete policy's expired rows in pk-ordered chunks.  Returns a PurgeResult."""
+    chunk_size = chunk_size or getattr(settings, 'RETENTION_CHUNK_SIZE', 1000)
+    pause = getattr(settings, 'RETENTION_PAUSE_SECONDS', 0.1) if pause is None else pause
+    result = PurgeResult(policy)
+    started = time.perf_counter()
+
+    expired = policy.expired(now or timezone.now())
+    if expired is None:
+        result.skipped = True
+        return result
+    if dry_run:
+        result.deleted = expired.count()
+        result.seconds = time.perf_counter() - started
+        return result
+
+    model = expired.model
+    last_pk = None
+    while True:
+        chunk_started = time.perf_counter()
+        # Seek past the last chunk so kept rows are never rescanned
+        page = expired if last_pk is None else expired.filter(pk__gt=last_pk)
+        pks = list(page.order_by('pk').values_list('pk', flat=True)[:chunk_size])
+        if not pks:
+            break
+        chunk = model._default_manager.filter(pk__in=pks)
+        if policy.before_delete:
+            policy.before_delete(chunk)
+        result.deleted += chunk.delete()[1].get(model._meta.label, 0)
+        result.chunks += 1
+        last_pk = pks[-1]
+        if len(pks) < chunk_size:
+            break
+        time.sleep(max(pause, time.perf_counter() - chunk_started))
+
+    result.seconds = time.perf_counter() - started
+    logger.info(f'Purged {result.deleted} {policy.name} in {result.chunks} chunks, {result.seconds:.1f}s')
+    return result
+
+
+def purge_expired(names=None, **options):
+    """Run every policy (or only those named).  Returns a list of PurgeResult."""
+    return [purge(policy, **options) for policy in POLICIES if not names or policy.name in names]
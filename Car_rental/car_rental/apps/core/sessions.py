@@ -0,0 +1,24 @@
+"""
+Signed-cookie session engine (SESSION_STORE = 'signed_cookies').
+
+The same as Django's signed_cookies engine, except that a cookie still
+holding a database session key is loaded from django_session once and sent
+back as a signed cookie.  Users who were logged in before the switch stay
+logged in.  The old rows are left for ``purge_expired`` in case the switch
+is rolled back.
+"""
+from django.contrib.sessions.backends import db, signed_cookies
+
+
+class SessionStore(signed_cookies.SessionStore):
+
+    def load(self):
+        # Signed values always contain ':'; database keys never do
+        if self.session_key and ':' not in self.session_key:
+            legacy = db.SessionStore(self.session_key)
+            data = legacy.load()
+            if legacy.session_key:
+                # Re-issued as a signed cookie on this response
+                self.modified = True
+                return data
+        return super().load()
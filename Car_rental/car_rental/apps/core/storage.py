@@ -0,0 +1,51 @@
+"""
+Content-addressed media storage (STORAGES['default']).
+
+Every file is saved as ``<upload_to>/<sha256 of its bytes><ext>``.  A second
+upload of the same bytes returns the existing name without writing anything,
+so identical car photos, thumbnails and documents are stored once however
+many rows point at them.  Files are written under a temporary name and
+renamed into place, so a reader never sees half a file and two concurrent
+uploads of the same bytes cannot clash.
+
+Because a name may be shared, delete a file only when no row refers to it
+any more (see ``apps.cars.thumbnails._delete_unreferenced``).
+``manage.py dedupe_media`` moves files saved before this storage to their
+hashed names.
+"""
+import hashlib
+import os
+import secrets
+
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.core.files.utils import validate_file_name
+
+
+class HashedFileSystemStorage(FileSystemStorage):
+
+    def hashed_name(self, name, content):
+        """The name content is stored under: name's directory, content's SHA-256, name's extension."""
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk.encode() if isinstance(chunk, str) else chunk)
+        directory, file_name = os.path.split(str(name).replace('\\', '/'))
+        extension = os.path.splitext(file_name)[1].lower()
+        return '/'.join(filter(None, [directory, f'{digest.hexdigest()}{extension}']))
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        validate_file_name(name, allow_relative_path=True)
+
+        name = self.hashed_name(name, content)
+        if max_length is not None and len(name) > max_length:
+            raise SuspiciousFileOperation(f'Storage can not find an available filename for "{name}".')
+        # Same name, same bytes: nothing to write
+        if not self.exists(name):
+            temporary = self._save(f'{name}.{secrets.token_hex(8)}.part', content)
+            os.replace(self.path(temporary), self.path(name))
+        return name
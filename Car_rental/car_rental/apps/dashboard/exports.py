@@ -0,0 +1,141 @@
+"""
+Streaming CSV / JSON Lines exports for the admin tables.
+
+Rows are read as ``values_list`` tuples in primary-key ordered pages and
+written straight into a ``StreamingHttpResponse``, so memory stays flat no
+matter how many rows match the current search and filters.
+"""
+import csv
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+# Rows fetched per database round-trip
+EXPORT_CHUNK_SIZE = 2000
+
+EXPORT_FORMATS = {
+    'csv':   'text/csv',
+    'jsonl': 'application/x-ndjson',
+}
+
+# (column header, ORM lookup) pairs — the first column must be the primary key
+BOOKING_EXPORT_COLUMNS = (
+    ('id',             'id'),
+    ('user',           'user__username'),
+    ('email',          'user__email'),
+    ('car',            'car__name'),
+    ('owner',          'car__owner__username'),
+    ('start_date',     'start_date'),
+    ('end_date',       'end_date'),
+    ('status',         'status'),
+    ('payment_status', 'payment_status'),
+    ('total_price',    'total_price'),
+    ('created_at',     'created_at'),
+)
+
+PAYMENT_EXPORT_COLUMNS = (
+    ('id',                  'id'),
+    ('booking_id',          'booking_id'),
+    ('user',                'user__username'),
+    ('email',               'user__email'),
+    ('car',                 'booking__car__name'),
+    ('amount',              'amount'),
+    ('status',              'status'),
+    ('payment_method',      'payment_method'),
+    ('transaction_id',      'transaction_id'),
+    ('razorpay_order_id',   'razorpay_order_id'),
+    ('razorpay_payment_id', 'razorpay_payment_id'),
+    ('created_at',          'created_at'),
+)
+
+USER_EXPORT_COLUMNS = (
+    ('id',                'id'),
+    ('username',          'username'),
+    ('email',             'email'),
+    ('first_name',        'first_name'),
+    ('last_name',         'last_name'),
+    ('phone',             'phone'),
+    ('role',              'role'),
+    ('is_active',         'is_active'),
+    ('is_email_verified', 'is_email_verified'),
+    ('created_at',        'created_at'),
+)
+
+
+class _Echo:
+    """File-like object whose write() hands the line back to csv.writer's caller."""
+
+    def write(self, value):
+        return value
+
+
+def _iter_rows(queryset, lookups):
+    """Yield value tuples page by page, newest first, using keyset pagination on pk."""
+    queryset = queryset.order_by('-pk').values_list(*lookups)
+    last_pk = None
+    while True:
+        page = queryset if last_pk is None else queryset.filter(pk__lt=last_pk)
+        rows = 0
+        for row in page[:EXPORT_CHUNK_SIZE].iterator(chunk_size=EXPORT_CHUNK_SIZE):
+            rows += 1
+            last_pk = row[0]
+            yield row
+        if rows < EXPORT_CHUNK_SIZE:
+            return
+
+
+def _csv_lines(headers, rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(headers)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def _jsonl_lines(headers, rows):
+    for row in rows:
+        yield json.dumps(dict(zip(headers, row)), cls=DjangoJSONEncoder) + '\n'
+
+
+def _buffered(lines, size=EXPORT_CHUNK_SIZE):
+    """Group lines so the response writes a few large chunks instead of one per row."""
+    buffer = []
+    for line in lines:
+        buffer.append(line)
+        if len(buffer) >= size:
+            yield ''.join(buffer)
+            buffer = []
+    if buffer:
+        yield ''.join(buffer)
+
+
+def stream_export(queryset, columns, name, export_format='csv'):
+    """Return a StreamingHttpResponse exporting queryset as CSV or JSON Lines."""
+    if export_format not in EXPORT_FORMATS:
+        export_format = 'csv'
+
+    headers = [header for header, _ in columns]
+    rows = _iter_rows(queryset, [lookup for _, lookup in columns])
+
+    if export_format == 'jsonl':
+        lines = _jsonl_lines(headers, rows)
+    else:
+        lines = _csv_lines(headers, rows)
+
+    filename = f'{name}_{timezone.now().strftime("%Y%m%d_%H%M")}.{export_format}'
+    response = StreamingHttpResponse(_buffered(lines), content_type=EXPORT_FORMATS[export_format])
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+def export_bookings(queryset, export_format='csv'):
+    return stream_export(queryset, BOOKING_EXPORT_COLUMNS, 'bookings', export_format)
+
+
+def export_payments(queryset, export_format='csv'):
+    return stream_export(queryset, PAYMENT_EXPORT_COLUMNS, 'transactions', export_format)
+
+
+def export_users(queryset, export_format='csv'):
+    return stream_export(queryset, USER_EXPORT_COLUMNS, 'users', export_format)
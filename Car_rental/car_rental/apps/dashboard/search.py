@@ -0,0 +1,105 @@
+"""
+Search and keyset pagination for the admin tables.
+
+Every searched column is OR-ed into one ``Q`` object so the database answers
+a search with a single query, and result pages are fetched by keyset
+(``created_at``, ``pk``) so each request reads at most one page of rows no
+matter how broad the search term is.
+"""
+import base64
+from dataclasses import dataclass
+from datetime import datetime
+
+from django.db.models import Q
+
+ADMIN_PAGE_SIZE = 50
+
+# Longer search terms are truncated — nobody types a 100+ character name
+MAX_SEARCH_LENGTH = 100
+
+BOOKING_SEARCH_FIELDS = ('user__username', 'user__email', 'car__name', 'car__owner__username')
+CAR_SEARCH_FIELDS     = ('name', 'brand', 'location', 'owner__username')
+PAYMENT_SEARCH_FIELDS = ('transaction_id', 'user__username', 'user__email', 'booking__car__name')
+USER_SEARCH_FIELDS    = ('username', 'email', 'first_name')
+
+
+def search_queryset(queryset, search_query, fields):
+    """Filter queryset to rows where any of fields contains search_query."""
+    search_query = (search_query or '').strip()[:MAX_SEARCH_LENGTH]
+    if not search_query:
+        return queryset
+
+    condition = Q()
+    for field_name in fields:
+        condition |= Q(**{f'{field_name}__icontains': search_query})
+    return queryset.filter(condition)
+
+
+# ──────────────────────────────────────────────
+# Keyset pagination
+# ──────────────────────────────────────────────
+
+@dataclass
+class KeysetPage:
+    """One page of rows plus the query strings for the surrounding pages."""
+    items: list
+    has_next: bool
+    is_first: bool
+    next_querystring: str = ''
+    first_querystring: str = ''
+    page_size: int = ADMIN_PAGE_SIZE
+
+
+def encode_cursor(value, pk):
+    raw = f'{value.isoformat()}|{pk}'
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """Return (datetime, pk) for a cursor, or None if it is missing or malformed."""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        value, pk = raw.rsplit('|', 1)
+        return datetime.fromisoformat(value), int(pk)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def keyset_paginate(queryset, params, order_field='created_at', page_size=ADMIN_PAGE_SIZE):
+    """
+    Return a KeysetPage of queryset ordered newest first.
+
+    ``params`` is the request's QueryDict; its ``cursor`` value selects the
+    page and the remaining parameters (search, filters) are carried over
+    into the next/first page links.  ``order_field`` must be non-nullable.
+    """
+    position = decode_cursor(params.get('cursor'))
+    if position:
+        value, pk = position
+        queryset = queryset.filter(
+            Q(**{f'{order_field}__lt': value}) | Q(**{order_field: value, 'pk__lt': pk})
+        )
+
+    rows = list(queryset.order_by(f'-{order_field}', '-pk')[:page_size + 1])
+    has_next = len(rows) > page_size
+    rows = rows[:page_size]
+
+    first_params = params.copy()
+    first_params.pop('cursor', None)
+    next_querystring = ''
+    if has_next:
+        last = rows[-1]
+        next_params = first_params.copy()
+        next_params['cursor'] = encode_cursor(getattr(last, order_field), last.pk)
+        next_querystring = next_params.urlencode()
+
+    return KeysetPage(
+        items=rows,
+        has_next=has_next,
+        is_first=position is None,
+        next_querystring=next_querystring,
+        first_querystring=first_params.urlencode(),
+        page_size=page_size,
+    )
@@ -1,8 +1,14 @@
 from django.db import models
+from apps.accounts.models import CustomUser
 from apps.cars.models import Car
 from apps.bookings.models import Booking
+from apps.payments.models import Payment
 from apps.bookings.services import get_owner_bookings
 from apps.reports.services import get_total_earnings
+from .search import (
+    search_queryset, BOOKING_SEARCH_FIELDS, CAR_SEARCH_FIELDS, PAYMENT_SEARCH_FIELDS,
+    USER_SEARCH_FIELDS,
+)
 
 
 def get_owner_dashboard_data(owner):
@@ -29,3 +35,56 @@ def get_owner_dashboard_data(owner):
 
         'recent_bookings': get_owner_bookings(owner)[:5],
     }
+
+
+# ============ ADMIN TABLE FILTERS ============
+# Shared by the admin HTML tables and their streaming exports so both
+# always return the same rows for the same search/status parameters.
+
+def filter_admin_bookings(search_query='', status_filter=''):
+    """Return bookings matching the admin search box and status filter."""
+    bookings = search_queryset(Booking.objects.all(), search_query, BOOKING_SEARCH_FIELDS)
+
+    if status_filter:
+        bookings = bookings.filter(status=status_filter)
+
+    return bookings.order_by('-created_at')
+
+
+def filter_admin_cars(search_query='', status_filter='', availability_filter=''):
+    """Return cars matching the admin all-cars search, status and availability filters."""
+    cars = search_queryset(Car.objects.all(), search_query, CAR_SEARCH_FIELDS)
+
+    if status_filter:
+        cars = cars.filter(status=status_filter)
+
+    if availability_filter == 'available':
+        cars = cars.filter(is_available=True)
+    elif availability_filter == 'unavailable':
+        cars = cars.filter(is_available=False)
+
+    return cars.order_by('-created_at')
+
+
+def filter_admin_payments(search_query='', status_filter='', method_filter=''):
+    """Return payments matching the admin transactions search and filters."""
+    payments = search_queryset(Payment.objects.all(), search_query, PAYMENT_SEARCH_FIELDS)
+
+    if status_filter:
+        payments = payments.filter(status=status_filter)
+
+    # Payment method is matched case-insensitively
+    if method_filter:
+        payments = payments.filter(payment_method__iexact=method_filter)
+
+    return payments.order_by('-created_at')
+
+
+def filter_admin_users(search_query='', role_filter=''):
+    """Return users matching the admin user-management search and role filter."""
+    users = search_queryset(CustomUser.objects.all(), search_query, USER_SEARCH_FIELDS)
+
+    if role_filter:
+        users = users.filter(role=role_filter)
+
+    return users.order_by('-date_joined')
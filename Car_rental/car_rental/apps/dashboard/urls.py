@@ -17,6 +17,7 @@ urlpatterns = [
     
     # User Management Section
     path('admin/users/', views.admin_users_management, name='admin_users_management'),
+    path('admin/users/export/', views.admin_export_users, name='admin_export_users'),
     path('admin/users/<int:user_id>/block/', views.block_user, name='block_user'),
     path('admin/users/<int:user_id>/unblock/', views.unblock_user, name='unblock_user'),
     path('admin/users/<int:user_id>/delete/', views.delete_user, name='delete_user'),
@@ -28,6 +29,7 @@ urlpatterns = [
 
     # Transactions Section
     path('admin/transactions/', views.admin_transactions, name='admin_transactions'),
+    path('admin/transactions/export/', views.admin_export_transactions, name='admin_export_transactions'),
 
     # All Cars Section
     path('admin/all-cars/', views.admin_all_cars, name='admin_all_cars'),
@@ -36,4 +38,5 @@ urlpatterns = [
 
     # All Bookings Section
     path('admin/bookings/', views.admin_all_bookings, name='admin_all_bookings'),
+    path('admin/bookings/export/', views.admin_export_bookings, name='admin_export_bookings'),
 ]
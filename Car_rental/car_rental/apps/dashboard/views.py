@@ -1,5 +1,4 @@
 from datetime import datetime as dt, timedelta
-from decimal import Decimal
 from io import BytesIO
 
 from reportlab.lib import colors
@@ -13,17 +12,24 @@ from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.http import HttpResponse
 from django.db.models import Count, Sum
-from django.db.models.functions import TruncMonth
 from django.utils import timezone
 from apps.accounts.decorators import role_required
 from apps.accounts.models import CustomUser, OwnerRequest
+from apps.core.replica import use_replica
 from apps.cars.models import Car
 from apps.bookings.models import Booking
-from apps.payments.models import Payment
-from .services import get_owner_dashboard_data
+from apps.payments.ledger import commission_rate, monthly_totals, platform_totals
+from apps.payments.models import LedgerEntry, Payment
+from .exports import export_bookings, export_payments, export_users
+from .search import keyset_paginate
+from .services import (
+    get_owner_dashboard_data, filter_admin_bookings, filter_admin_cars,
+    filter_admin_payments, filter_admin_users,
+)
 
 @login_required
 @role_required('admin')
+@use_replica(max_staleness=60)
 def admin_dashboard(request):
     """Admin dashboard – shows platform-wide summary counts."""
 
@@ -69,7 +75,7 @@ def admin_car_approval(request):
 def approve_car(request, pk):
     car = get_object_or_404(Car, pk=pk)
     car.status = 'approved'
-    car.save(update_fields=['status'])
+    car.save(update_fields=['status', 'updated_at'])
     return redirect('admin_car_approval')
 
 @login_required
@@ -77,7 +83,7 @@ def approve_car(request, pk):
 def reject_car(request, pk):
     car = get_object_or_404(Car, pk=pk)
     car.status = 'rejected'
-    car.save(update_fields=['status'])
+    car.save(update_fields=['status', 'updated_at'])
     return redirect('admin_car_approval')
 
 @login_required
@@ -134,39 +140,17 @@ def admin_all_cars(request):
     status_filter       = request.GET.get('status', '')
     availability_filter = request.GET.get('availability', '')
 
-    # Start with all cars, joining owner info in one DB query
-    cars = Car.objects.select_related('owner').all()
-
-    # --- Search: collect matching IDs from each field, then filter by union ---
-    if search_query:
-        # Each filter returns IDs matching that specific field
-        name_ids     = cars.filter(name__icontains=search_query).values_list('id', flat=True)
-        brand_ids    = cars.filter(brand__icontains=search_query).values_list('id', flat=True)
-        location_ids = cars.filter(location__icontains=search_query).values_list('id', flat=True)
-        owner_ids    = cars.filter(owner__username__icontains=search_query).values_list('id', flat=True)
-
-        # Combine all matched IDs into a single set (no duplicates)
-        matched_ids = set(name_ids) | set(brand_ids) | set(location_ids) | set(owner_ids)
-        cars = cars.filter(id__in=matched_ids)
-
-    # Filter by car approval status if provided
-    if status_filter:
-        cars = cars.filter(status=status_filter)
-
-    # Filter by availability if provided
-    if availability_filter == 'available':
-        cars = cars.filter(is_available=True)
-    elif availability_filter == 'unavailable':
-        cars = cars.filter(is_available=False)
-
-    cars = cars.order_by('-created_at')
+    # Matching cars with owner info joined, one page at a time
+    cars = filter_admin_cars(search_query, status_filter, availability_filter).select_related('owner')
+    page = keyset_paginate(cars, request.GET)
 
     # Reuse a single base queryset for all the sidebar counts
     all_cars      = Car.objects.all()
     approved_cars = all_cars.filter(status='approved')
 
     context = {
-        'cars':               cars,
+        'cars':               page.items,
+        'page':               page,
         'total_cars':         all_cars.count(),
         'approved_count':     approved_cars.count(),
         'pending_count':      all_cars.filter(status='pending').count(),
@@ -187,7 +171,7 @@ def admin_toggle_car_availability(request, pk):
     """Toggle a car's availability"""
     car = get_object_or_404(Car, pk=pk)
     car.is_available = not car.is_available
-    car.save(update_fields=['is_available'])
+    car.save(update_fields=['is_available', 'updated_at'])
     state = 'available' if car.is_available else 'unavailable'
     messages.success(request, f'"{car.name}" marked as {state}.')
     return redirect(request.META.get('HTTP_REFERER', 'admin_all_cars'))
@@ -213,31 +197,18 @@ def admin_all_bookings(request):
     search_query  = request.GET.get('search', '')
     status_filter = request.GET.get('status', '')
 
-    # Fetch all bookings with related user and car data in one DB hit
-    bookings = Booking.objects.select_related('user', 'car', 'car__owner').all()
-
-    # --- Search: collect matching IDs from each field, then filter by union ---
-    if search_query:
-        user_ids      = bookings.filter(user__username__icontains=search_query).values_list('id', flat=True)
-        email_ids     = bookings.filter(user__email__icontains=search_query).values_list('id', flat=True)
-        car_ids       = bookings.filter(car__name__icontains=search_query).values_list('id', flat=True)
-        car_owner_ids = bookings.filter(car__owner__username__icontains=search_query).values_list('id', flat=True)
-
-        # Merge all matches into one set and filter
-        matched_ids = set(user_ids) | set(email_ids) | set(car_ids) | set(car_owner_ids)
-        bookings = bookings.filter(id__in=matched_ids)
-
-    # Narrow down by booking status if a filter was selected
-    if status_filter:
-        bookings = bookings.filter(status=status_filter)
-
-    bookings = bookings.order_by('-created_at')
+    # Fetch matching bookings with related user and car data in one DB hit
+    bookings = filter_admin_bookings(search_query, status_filter).select_related(
+        'user', 'car', 'car__owner'
+    )
+    page = keyset_paginate(bookings, request.GET)
 
     # Reuse one base queryset for all sidebar counts
     all_bookings = Booking.objects.all()
 
     context = {
-        'bookings':       bookings,
+        'bookings':       page.items,
+        'page':           page,
         'total_bookings': all_bookings.count(),
         'pending_count':  all_bookings.filter(status='pending').count(),
         'confirmed_count': all_bookings.filter(status='confirmed').count(),
@@ -250,6 +221,18 @@ def admin_all_bookings(request):
     return render(request, 'dashboard/admin_all_bookings.html', context)
 
 
+@login_required
+@role_required('admin')
+@use_replica(max_staleness=60)
+def admin_export_bookings(request):
+    """Stream the filtered admin bookings table as CSV or JSON Lines."""
+    bookings = filter_admin_bookings(
+        request.GET.get('search', ''),
+        request.GET.get('status', ''),
+    )
+    return export_bookings(bookings, request.GET.get('format', 'csv'))
+
+
 @login_required
 @role_required('owner')
 def owner_dashboard(request):
@@ -292,29 +275,15 @@ def admin_users_management(request):
     search_query = request.GET.get('search', '')
     role_filter  = request.GET.get('role', '')
 
-    # Start with all users
-    users = CustomUser.objects.all()
-
-    # --- Search: gather matching IDs field by field, then combine ---
-    if search_query:
-        username_ids   = users.filter(username__icontains=search_query).values_list('id', flat=True)
-        email_ids      = users.filter(email__icontains=search_query).values_list('id', flat=True)
-        first_name_ids = users.filter(first_name__icontains=search_query).values_list('id', flat=True)
-
-        matched_ids = set(username_ids) | set(email_ids) | set(first_name_ids)
-        users = users.filter(id__in=matched_ids)
-
-    # Optionally narrow down to a specific role
-    if role_filter:
-        users = users.filter(role=role_filter)
-
-    users = users.order_by('-created_at')
+    users = filter_admin_users(search_query, role_filter)
+    page = keyset_paginate(users, request.GET, order_field='date_joined')
 
     # Reuse a base queryset for sidebar counts so we avoid extra queries
     all_users = CustomUser.objects.all()
 
     context = {
-        'users':        users,
+        'users':        page.items,
+        'page':         page,
         'total_users':  all_users.count(),
         'users_count':  all_users.filter(role='user').count(),
         'owners_count': all_users.filter(role='owner').count(),
@@ -328,14 +297,24 @@ def admin_users_management(request):
 
 @login_required
 @role_required('admin')
+@use_replica(max_staleness=60)
+def admin_export_users(request):
+    """Stream the filtered admin users table as CSV or JSON Lines."""
+    users = filter_admin_users(
+        request.GET.get('search', ''),
+        request.GET.get('role', ''),
+    )
+    return export_users(users, request.GET.get('format', 'csv'))
+
+
+@login_required
+@role_required('admin')
+@use_replica(max_staleness=300)
 def admin_reports(request):
     """Admin reports – platform-wide analytics and revenue summary."""
 
     # ----- Date helpers -----
     thirty_days_ago = timezone.now() - timedelta(days=30)
-    six_months_ago  = timezone.now() - timedelta(days=180)
-
-    COMMISSION_RATE = Decimal('0.10')  # Platform takes 10% of net revenue
 
     # ----- Booking counts -----
     # Reuse one base queryset so we hit the DB once per .count() call
@@ -346,24 +325,19 @@ def admin_reports(request):
     confirmed_bookings = all_bookings.filter(status='confirmed').count()
 
     # ----- Revenue calculations -----
-    # Completed payments = gross money collected
-    completed_payments = Payment.objects.filter(status='completed')
-    refunded_payments  = Payment.objects.filter(status='refunded')
+    # Sums over the payment ledger; commission was fixed when each payment was captured
+    totals    = platform_totals()
+    totals_30 = platform_totals(since=thirty_days_ago)
 
-    gross_revenue  = completed_payments.aggregate(total=Sum('amount'))['total'] or Decimal('0')
-    total_refunded = refunded_payments.aggregate(total=Sum('amount'))['total']  or Decimal('0')
-    refund_count   = refunded_payments.count()
+    gross_revenue  = totals['gross']
+    total_refunded = totals['refunded']
+    refund_count   = totals['refund_count']
     # Net revenue = what was collected minus what was returned
-    total_revenue  = gross_revenue - total_refunded
+    total_revenue  = totals['net']
+    revenue_last_30_days = totals_30['net']
 
-    # Same calculation scoped to the last 30 days
-    gross_last_30     = completed_payments.filter(created_at__gte=thirty_days_ago).aggregate(total=Sum('amount'))['total'] or Decimal('0')
-    refunded_last_30  = refunded_payments.filter(created_at__gte=thirty_days_ago).aggregate(total=Sum('amount'))['total']  or Decimal('0')
-    revenue_last_30_days = gross_last_30 - refunded_last_30
-
-    # Platform commission = 10% of net revenue
-    commission_earned  = total_revenue * COMMISSION_RATE
-    commission_30_days = revenue_last_30_days * COMMISSION_RATE
+    commission_earned  = totals['commission']
+    commission_30_days = totals_30['commission']
 
     # ----- User and owner stats -----
     all_users         = CustomUser.objects.all()
@@ -378,41 +352,20 @@ def admin_reports(request):
     rejected_cars = all_cars.filter(status='rejected').count()
 
     # ----- Monthly net revenue chart (last 6 months) -----
-    # Group completed payments by calendar month and sum them
-    monthly_completed_qs = (
-        Payment.objects.filter(status='completed', created_at__gte=six_months_ago)
-        .annotate(month=TruncMonth('created_at'))
-        .values('month')
-        .annotate(total=Sum('amount'))
-        .order_by('month')
-    )
-    # Group refunded payments by month so we can subtract them
-    monthly_refunded_qs = (
-        Payment.objects.filter(status='refunded', created_at__gte=six_months_ago)
-        .annotate(month=TruncMonth('created_at'))
-        .values('month')
-        .annotate(total=Sum('amount'))
-    )
-
-    # Build a dict {month: refunded_amount} for quick lookup
-    refunded_by_month = {entry['month']: float(entry['total']) for entry in monthly_refunded_qs}
-
-    revenue_months = [entry['month'].strftime('%b %Y') for entry in monthly_completed_qs]
-    revenue_values = [
-        round(float(entry['total']) - refunded_by_month.get(entry['month'], 0), 2)
-        for entry in monthly_completed_qs
-    ]
-    commission_values = [round(v * 0.10, 2) for v in revenue_values]
+    monthly = monthly_totals(6)
+    revenue_months    = [month.strftime('%b %Y') for month in monthly]
+    revenue_values    = [round(float(month['net']), 2) for month in monthly.values()]
+    commission_values = [round(float(month['commission']), 2) for month in monthly.values()]
 
     # ----- Booking status breakdown for chart -----
     # Returns a list like [{'status': 'completed', 'count': 42}, ...]
     booking_stats = all_bookings.values('status').annotate(count=Count('id'))
 
     # ----- Top 5 earning owners -----
-    # Sum completed payment amounts grouped by the car's owner
+    # Net money collected for each owner's cars (captures minus refunds)
     top_owners_qs = (
-        Payment.objects.filter(status='completed')
-        .values('booking__car__owner')
+        LedgerEntry.objects.filter(account='gateway', kind__in=('capture', 'refund'), owner__isnull=False)
+        .values('owner')
         .annotate(total_earnings=Sum('amount'))
         .order_by('-total_earnings')[:5]
     )
@@ -420,7 +373,7 @@ def admin_reports(request):
     # Attach the actual owner object to each result for template display
     top_owners_list = []
     for row in top_owners_qs:
-        owner_id = row['booking__car__owner']
+        owner_id = row['owner']
         if owner_id:
             try:
                 owner = CustomUser.objects.get(id=owner_id, role='owner')
@@ -461,6 +414,7 @@ def admin_reports(request):
 
 @login_required
 @role_required('admin')
+@use_replica(max_staleness=300)
 def download_report(request):
     """Generate and download the admin analytics report as a PDF file."""
     buffer = BytesIO()
@@ -469,7 +423,6 @@ def download_report(request):
     styles = getSampleStyleSheet()
     story = []
 
-    COMMISSION_RATE = Decimal('0.10')
     thirty_days_ago = timezone.now() - timedelta(days=30)
 
     # ----- PDF title and generation date -----
@@ -479,21 +432,17 @@ def download_report(request):
     story.append(Spacer(1, 0.5*cm))
 
     # ----- Revenue section -----
-    # Fetch completed and refunded payment querysets once, reuse for both all-time and 30-day calcs
-    completed_payments = Payment.objects.filter(status='completed')
-    refunded_payments  = Payment.objects.filter(status='refunded')
-
-    gross_revenue  = completed_payments.aggregate(total=Sum('amount'))['total'] or Decimal('0')
-    total_refunded = refunded_payments.aggregate(total=Sum('amount'))['total']  or Decimal('0')
-    refund_count   = refunded_payments.count()
-    total_revenue  = gross_revenue - total_refunded
-
-    # Narrow the same querysets to the last 30 days
-    gross_30     = completed_payments.filter(created_at__gte=thirty_days_ago).aggregate(total=Sum('amount'))['total'] or Decimal('0')
-    refunded_30  = refunded_payments.filter(created_at__gte=thirty_days_ago).aggregate(total=Sum('amount'))['total']  or Decimal('0')
-    revenue_30   = gross_30 - refunded_30
-    commission   = total_revenue * COMMISSION_RATE
-    commission_30 = revenue_30 * COMMISSION_RATE
+    # Ledger sums, all-time and for the last 30 days
+    totals    = platform_totals()
+    totals_30 = platform_totals(since=thirty_days_ago)
+
+    gross_revenue  = totals['gross']
+    total_refunded = totals['refunded']
+    refund_count   = totals['refund_count']
+    total_revenue  = totals['net']
+    revenue_30     = totals_30['net']
+    commission     = totals['commission']
+    commission_30  = totals_30['commission']
 
     story.append(Paragraph('Revenue Summary', styles['Heading2']))
     rev_data = [
@@ -502,7 +451,7 @@ def download_report(request):
         ['Total Refunded', f'- Rs. {total_refunded:.0f}  ({refund_count} refunds)'],
         ['Net Revenue', f'Rs. {total_revenue:.0f}'],
         ['Net Revenue (Last 30 Days)', f'Rs. {revenue_30:.0f}'],
-        ['Commission Earned (10%)', f'Rs. {commission:.0f}'],
+        [f'Commission Earned ({commission_rate():.0%})', f'Rs. {commission:.0f}'],
         ['Commission (Last 30 Days)', f'Rs. {commission_30:.0f}'],
     ]
     t = Table(rev_data, colWidths=[10*cm, 7*cm])
@@ -588,30 +537,11 @@ def admin_transactions(request):
     status_filter = request.GET.get('status', '')
     method_filter = request.GET.get('method', '')
 
-    # Fetch all payments, joining user and car info in one DB query
-    payments = Payment.objects.select_related('user', 'booking__car').all()
-
-    # --- Search: gather matching IDs field by field, then combine ---
-    if search_query:
-        txn_ids  = payments.filter(transaction_id__icontains=search_query).values_list('id', flat=True)
-        user_ids = payments.filter(user__username__icontains=search_query).values_list('id', flat=True)
-        email_ids = payments.filter(user__email__icontains=search_query).values_list('id', flat=True)
-        car_ids  = payments.filter(booking__car__name__icontains=search_query).values_list('id', flat=True)
-
-        matched_ids = set(txn_ids) | set(user_ids) | set(email_ids) | set(car_ids)
-        payments = payments.filter(id__in=matched_ids)
-
-    # Filter by payment status if selected
-    if status_filter:
-        payments = payments.filter(status=status_filter)
-
-    # Filter by payment method if selected (case-insensitive)
-    if method_filter:
-        payments = payments.filter(payment_method__iexact=method_filter)
-
-    payments = payments.order_by('-created_at')
-
-    COMMISSION_RATE = Decimal('0.10')
+    # Fetch matching payments, joining user and car info in one DB query
+    payments = filter_admin_payments(search_query, status_filter, method_filter).select_related(
+        'user', 'booking__car'
+    )
+    page = keyset_paginate(payments, request.GET)
 
     # Reuse base queryset for revenue totals to avoid extra round-trips
     all_payments       = Payment.objects.all()
@@ -621,11 +551,12 @@ def admin_transactions(request):
     total_revenue     = all_payments.aggregate(total=Sum('amount'))['total'] or 0
     completed_revenue = completed_payments.aggregate(total=Sum('amount'))['total'] or 0
     refunded_revenue  = refunded_payments.aggregate(total=Sum('amount'))['total'] or 0
-    # Commission is calculated only on successfully completed payments
-    commission_earned = (Decimal(str(completed_revenue))) * COMMISSION_RATE
+    # Commission kept on captured payments, net of refunds, from the ledger
+    commission_earned = platform_totals()['commission']
 
     context = {
-        'payments':           payments,
+        'payments':           page.items,
+        'page':               page,
         'total_transactions': all_payments.count(),
         'completed_count':    completed_payments.count(),
         'pending_count':      all_payments.filter(status='pending').count(),
@@ -643,6 +574,19 @@ def admin_transactions(request):
     return render(request, 'dashboard/admin_transactions.html', context)
 
 
+@login_required
+@role_required('admin')
+@use_replica(max_staleness=60)
+def admin_export_transactions(request):
+    """Stream the filtered admin transactions table as CSV or JSON Lines."""
+    payments = filter_admin_payments(
+        request.GET.get('search', ''),
+        request.GET.get('status', ''),
+        request.GET.get('method', ''),
+    )
+    return export_payments(payments, request.GET.get('format', 'csv'))
+
+
 @login_required
 @role_required('admin')
 def block_user(request, user_id):
@@ -0,0 +1,100 @@
+"""
+ASGI entry point for the notification stream.
+
+Django's ASGI handler gives every request its own thread for sync code
+(sessions, the ORM and sync-only middleware), and a streaming response
+keeps it for as long as the connection is open.  For thousands of idle SSE
+connections, ``with_notification_stream`` serves /notifications/stream/
+directly: the session is checked once on a pooled thread, and after that
+the connection is only a coroutine waiting on the hub (see realtime.py).
+
+The Django view of the same URL stays in place for runserver and WSGI.
+"""
+import asyncio
+import json
+from importlib import import_module
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user
+from django.db import close_old_connections
+from django.http import HttpRequest
+from django.http.cookie import parse_cookie
+from django.urls import reverse
+
+from .realtime import event_stream
+
+
+def _header(scope, name):
+    for key, value in scope.get('headers', ()):
+        if key == name:
+            return value.decode('latin-1')
+    return None
+
+
+def _authenticate(scope):
+    """The logged-in user for the request's session cookie, or None."""
+    close_old_connections()
+    session_key = parse_cookie(_header(scope, b'cookie') or '').get(settings.SESSION_COOKIE_NAME)
+    if not session_key:
+        return None
+    request = HttpRequest()
+    request.session = import_module(settings.SESSION_ENGINE).SessionStore(session_key)
+    user = get_user(request)
+    return user if user.is_authenticated else None
+
+
+async def _respond(send, status, body, content_type=b'application/json'):
+    await send({'type': 'http.response.start', 'status': status, 'headers': [(b'content-type', content_type)]})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def _wait_for_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+async def stream_application(scope, receive, send):
+    user = await sync_to_async(_authenticate, thread_sensitive=False)(scope)
+    if user is None:
+        return await _respond(send, 401, json.dumps({'error': 'Login required'}).encode())
+    if user.role == 'admin':
+        return await _respond(send, 403, json.dumps({'error': 'Admins have no notification inbox'}).encode())
+
+    async def pump():
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [
+                (b'content-type', b'text/event-stream'),
+                (b'cache-control', b'no-cache'),
+                (b'x-accel-buffering', b'no'),
+            ],
+        })
+        async for chunk in event_stream(user, _header(scope, b'last-event-id')):
+            await send({'type': 'http.response.body', 'body': chunk.encode(), 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b''})
+
+    # Whichever finishes first — the stream's lifetime or the client — ends both
+    tasks = {asyncio.ensure_future(pump()), asyncio.ensure_future(_wait_for_disconnect(receive))}
+    try:
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in tasks:
+            task.cancel()
+        # Let the stream unsubscribe from the hub before returning
+        await asyncio.gather(*tasks, return_exceptions=True)
+    for task in done:
+        task.result()
+
+
+def with_notification_stream(application):
+    """Wrap the Django ASGI application so the notification stream bypasses it."""
+    stream_path = reverse('notification_stream')
+
+    async def router(scope, receive, send):
+        if scope['type'] == 'http' and scope['path'] == stream_path:
+            return await stream_application(scope, receive, send)
+        return await application(scope, receive, send)
+
+    return router
@@ -0,0 +1,11 @@
+from django.utils.functional import SimpleLazyObject
+
+from .services import unread_count
+
+
+def unread_notifications(request):
+	"""Header badge count; evaluated only when a template uses it."""
+	user = getattr(request, 'user', None)
+	if user is None or not user.is_authenticated or user.role == 'admin':
+		return {}
+	return {'unread_notification_count': SimpleLazyObject(lambda: unread_count(user))}
@@ -0,0 +1,76 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import get_connection
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from apps.notifications.models import EmailOutbox
+from apps.notifications.outbox import send_batch
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure outbox throughput against a local aiosmtpd stand-in server. '
+        'Queues --count emails, delivers them in batches over one connection and '
+        'reports messages per second. Only the benchmark\'s own rows are sent, and '
+        'never to the real SMTP host.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=500)
+        parser.add_argument('--batch-size', type=int, default=50)
+        parser.add_argument('--port', type=int, default=8025)
+
+    def handle(self, *args, **options):
+        try:
+            from aiosmtpd.controller import Controller
+            from aiosmtpd.handlers import Sink
+        except ImportError:
+            raise CommandError('aiosmtpd is not installed. Run: pip install aiosmtpd')
+
+        controller = Controller(Sink(), hostname='127.0.0.1', port=options['port'])
+        controller.start()
+        queued = []
+        try:
+            # Inserted already claimed and not due for a day, so a running
+            # send_queued_emails never picks them up and sends them for real
+            now = timezone.now()
+            queued = EmailOutbox.objects.bulk_create([
+                EmailOutbox(
+                    to_email=f'bench{i}@example.com',
+                    subject='Outbox benchmark',
+                    body='Benchmark message body.',
+                    from_email=settings.EMAIL_HOST_USER or '',
+                    status='sending',
+                    claimed_at=now,
+                    next_attempt_at=now + timedelta(days=1),
+                )
+                for i in range(options['count'])
+            ])
+            if any(email.id is None for email in queued):
+                # Backends that don't return ids from bulk_create (MySQL)
+                queued = list(EmailOutbox.objects.filter(status='sending', claimed_at=now, subject='Outbox benchmark'))
+            connection = get_connection(
+                'django.core.mail.backends.smtp.EmailBackend',
+                host='127.0.0.1', port=options['port'],
+                username='', password='', use_tls=False, use_ssl=False,
+                fail_silently=False,
+            )
+
+            sent = failed = 0
+            batch_size = options['batch_size']
+            started = time.monotonic()
+            for start in range(0, len(queued), batch_size):
+                batch_sent, batch_failed = send_batch(queued[start:start + batch_size], connection)
+                sent += batch_sent
+                failed += batch_failed
+            connection.close()
+            elapsed = time.monotonic() - started
+        finally:
+            controller.stop()
+            EmailOutbox.objects.filter(id__in=[email.id for email in queued]).delete()
+
+        rate = sent / elapsed if elapsed else 0
+        self.stdout.write(f'Sent {sent}, failed {failed} in {elapsed:.2f}s ({rate:.0f} emails/s)')
@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.notifications.outbox import drain_outbox
+
+
+class Command(BaseCommand):
+    help = (
+        'Deliver queued emails from the outbox in batches over one SMTP connection. '
+        'Runs forever, polling every --interval seconds, unless --once is given.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Drain the queue once and exit.')
+        parser.add_argument('--interval', type=float, default=1.0, help='Seconds between polls (default 1).')
+        parser.add_argument('--batch-size', type=int, default=None, help='Emails claimed per batch.')
+
+    def handle(self, *args, **options):
+        while True:
+            sent, failed = drain_outbox(batch_size=options['batch_size'])
+            if sent or failed:
+                self.stdout.write(f'Sent {sent}, failed {failed}')
+            if options['once']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.10 on 2026-10-19 09:47
+
+from django.db import migrations, models
+
+
+def blank_sent_otp_codes(apps, schema_editor):
+    # Codes used to be written into the body; drop them from delivered and abandoned mail
+    EmailOutbox = apps.get_model('notifications', 'EmailOutbox')
+    EmailOutbox.objects.filter(subject='Your OTP Code - CarRent', status__in=('sent', 'failed')).update(body='')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0005_notification_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='emailoutbox',
+            name='expires_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(blank_sent_otp_codes, migrations.RunPython.noop),
+    ]
@@ -9,11 +9,59 @@ class Notification(models.Model):
 	user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='notifications')
 	title = models.CharField(max_length=200)
 	message = models.TextField()
+	# NotificationTemplate.kind; digests coalesce unread rows of the same kind
+	kind = models.CharField(max_length=50, blank=True)
+	# Notifications folded into this row by digest mode
+	count = models.PositiveIntegerField(default=1)
 	is_read = models.BooleanField(default=False)
 	created_at = models.DateTimeField(default=timezone.now)
+	# Last fold into this digest; created_at stays put so inbox cursors hold
+	updated_at = models.DateTimeField(default=timezone.now)
 
 	class Meta:
 		ordering = ['-created_at']
+		indexes = [
+			# Inbox pages, unread filters and unread counts per user
+			models.Index(fields=['user', 'is_read', 'created_at'], name='notification_inbox_idx'),
+		]
 
 	def __str__(self):
 		return f"Notification - {self.user.username} - {self.title}"
+
+
+class EmailOutbox(models.Model):
+	"""Outbound email queued by the request and delivered by the send_queued_emails worker."""
+
+	STATUS_CHOICES = (
+		('pending', 'Pending'),   # Waiting for its next delivery attempt
+		('sending', 'Sending'),   # Claimed by a worker
+		('sent',    'Sent'),
+		('failed',  'Failed'),    # Gave up after EMAIL_OUTBOX_MAX_ATTEMPTS
+	)
+
+	to_email = models.EmailField()
+	subject = models.CharField(max_length=255)
+	body = models.TextField()
+	from_email = models.CharField(max_length=254, blank=True)
+
+	status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+	attempts = models.PositiveIntegerField(default=0)
+	last_error = models.TextField(blank=True)
+
+	next_attempt_at = models.DateTimeField(default=timezone.now)
+	claimed_at = models.DateTimeField(null=True, blank=True)
+	sent_at = models.DateTimeField(null=True, blank=True)
+	# Set on mail carrying a secret (OTP codes): the body only holds placeholders
+	# and the values wait in the cache until then, see outbox.queue_email
+	expires_at = models.DateTimeField(null=True, blank=True)
+	created_at = models.DateTimeField(default=timezone.now)
+
+	class Meta:
+		ordering = ['created_at']
+		indexes = [
+			# The worker polls for due pending rows
+			models.Index(fields=['status', 'next_attempt_at'], name='email_outbox_due_idx'),
+		]
+
+	def __str__(self):
+		return f"Email to {self.to_email} - {self.subject} [{self.status}]"
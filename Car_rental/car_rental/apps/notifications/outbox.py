@@ -0,0 +1,184 @@
+"""
+Database-backed outbound email queue.
+
+Requests only INSERT into EmailOutbox; the ``send_queued_emails`` worker
+claims due rows in batches and delivers them over a single SMTP connection,
+retrying failures with exponential backoff.
+
+Secrets such as OTP codes never reach the table: the body holds
+``{placeholders}`` and the values are kept in the EMAIL_OUTBOX_SECRET_CACHE_ALIAS
+cache until the mail expires, filled in at send time and then dropped.
+"""
+import logging
+import smtplib
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils import timezone
+
+from .models import EmailOutbox
+
+logger = logging.getLogger(__name__)
+
+# Rows stuck in 'sending' longer than this are assumed to belong to a dead worker
+STALE_CLAIM_MINUTES = 10
+
+
+def queue_email(to_email, subject, body, from_email=None, secrets=None, expires_in=None):
+    """
+    Queue a plain-text email for background delivery.  ``secrets`` fill the
+    body's placeholders at send time; such mail is dropped unsent once
+    ``expires_in`` (a timedelta, required with secrets) has passed.
+    """
+    email = EmailOutbox.objects.create(
+        to_email=to_email,
+        subject=subject,
+        body=body,
+        from_email=from_email or settings.EMAIL_HOST_USER or '',
+        expires_at=timezone.now() + expires_in if secrets else None,
+    )
+    if secrets:
+        _secret_cache().set(_secret_key(email), secrets, int(expires_in.total_seconds()))
+    return email
+
+
+def _secret_cache():
+    return caches[getattr(settings, 'EMAIL_OUTBOX_SECRET_CACHE_ALIAS', 'default')]
+
+
+def _secret_key(email):
+    return f'email-outbox:{email.id}'
+
+
+def _render_body(email):
+    """The body to send, or None once a secret-carrying email has expired."""
+    if email.expires_at is None:
+        return email.body
+    secrets = _secret_cache().get(_secret_key(email))
+    if secrets is None or email.expires_at <= timezone.now():
+        return None
+    return email.body.format(**secrets)
+
+
+def retry_delay(attempts):
+    """Exponential backoff: base, 2×base, 4×base … capped at one hour."""
+    base = getattr(settings, 'EMAIL_OUTBOX_RETRY_BASE_SECONDS', 30)
+    return timedelta(seconds=min(base * 2 ** (attempts - 1), 3600))
+
+
+def release_stale_claims():
+    """Put rows claimed by a crashed worker back in the queue."""
+    cutoff = timezone.now() - timedelta(minutes=STALE_CLAIM_MINUTES)
+    return EmailOutbox.objects.filter(status='sending', claimed_at__lt=cutoff).update(
+        status='pending', claimed_at=None,
+    )
+
+
+def claim_batch(batch_size):
+    """Atomically mark up to batch_size due rows as 'sending' and return them."""
+    now = timezone.now()
+    with transaction.atomic():
+        due = list(
+            EmailOutbox.objects.select_for_update(skip_locked=True)
+            .filter(status='pending', next_attempt_at__lte=now)
+            .order_by('next_attempt_at', 'id')[:batch_size]
+        )
+        if due:
+            EmailOutbox.objects.filter(id__in=[email.id for email in due]).update(
+                status='sending', claimed_at=now,
+            )
+    return due
+
+
+def _record_failure(email, error, max_attempts):
+    email.attempts += 1
+    email.last_error = str(error)[:1000]
+    email.claimed_at = None
+    if email.attempts >= max_attempts:
+        email.status = 'failed'
+        logger.error(f'Giving up on email {email.id} to {email.to_email}: {error}')
+        if email.expires_at is not None:
+            _secret_cache().delete(_secret_key(email))
+    else:
+        email.status = 'pending'
+        email.next_attempt_at = timezone.now() + retry_delay(email.attempts)
+    email.save(update_fields=['attempts', 'last_error', 'claimed_at', 'status', 'next_attempt_at'])
+
+
+def send_batch(emails, connection):
+    """
+    Deliver claimed emails over an SMTP connection, opening it if needed.
+    The connection is left open for the next batch.  Returns (sent, failed).
+    """
+    max_attempts = getattr(settings, 'EMAIL_OUTBOX_MAX_ATTEMPTS', 5)
+    sent = failed = 0
+
+    try:
+        connection.open()  # no-op when already open
+    except Exception as e:
+        # The server is unreachable — every message in the batch is retried later
+        for email in emails:
+            _record_failure(email, e, max_attempts)
+        return 0, len(emails)
+
+    for email in emails:
+        body = _render_body(email)
+        if body is None:
+            # An OTP that arrives after it expired is of no use to anyone
+            email.status = 'failed'
+            email.last_error = 'Expired before it could be sent'
+            email.claimed_at = None
+            email.save(update_fields=['status', 'last_error', 'claimed_at'])
+            failed += 1
+            continue
+        message = EmailMessage(
+            email.subject, body, email.from_email or None, [email.to_email],
+            connection=connection,
+        )
+        try:
+            try:
+                message.send()
+            except smtplib.SMTPServerDisconnected:
+                # Server closed an idle connection — reconnect once and retry
+                connection.close()
+                connection.open()
+                message.send()
+        except Exception as e:
+            _record_failure(email, e, max_attempts)
+            failed += 1
+            continue
+
+        email.attempts += 1
+        email.status = 'sent'
+        email.sent_at = timezone.now()
+        email.claimed_at = None
+        email.save(update_fields=['attempts', 'status', 'sent_at', 'claimed_at'])
+        if email.expires_at is not None:
+            _secret_cache().delete(_secret_key(email))
+        sent += 1
+
+    return sent, failed
+
+
+def drain_outbox(batch_size=None, connection=None):
+    """
+    Deliver every currently due email over one SMTP connection, batch by batch.
+    Returns (sent, failed) totals.
+    """
+    batch_size = batch_size or getattr(settings, 'EMAIL_OUTBOX_BATCH_SIZE', 50)
+    connection = connection or get_connection(fail_silently=False)
+    release_stale_claims()
+    total_sent = total_failed = 0
+    try:
+        while True:
+            batch = claim_batch(batch_size)
+            if not batch:
+                return total_sent, total_failed
+            sent, failed = send_batch(batch, connection)
+            total_sent += sent
+            total_failed += failed
+    finally:
+        connection.close()
@@ -0,0 +1,335 @@
+"""
+Live notification delivery over Server-Sent Events.
+
+Each open ``/notifications/stream/`` connection is a coroutine waiting on an
+asyncio.Queue registered with the in-process ``hub``.  ``create_notification``
+publishes every committed notification through the configured backend
+(NOTIFICATION_BACKEND), which gets it to the hub of whichever process holds
+the user's connection:
+
+- ``LocalBackend`` delivers straight to this process's hub.  Enough for
+  runserver and single-process deployments.
+- ``DatabaseBackend`` is the local stand-in for a message broker.  Each
+  process polls the Notification table once every NOTIFICATION_POLL_SECONDS
+  for its connected users only, so notifications created by other web
+  processes or by the background workers reach the stream too.
+- ``RedisBackend`` publishes to Redis pub/sub; each process runs one
+  listener.  Needs the redis package and NOTIFICATION_REDIS_URL.
+
+Idle connections cost a queue and a sleeping task, not a thread, when the
+project is served through ``car_rental.asgi`` by an ASGI server (see asgi.py
+in this app).  A WSGI server (runserver, gunicorn) cannot stream an async
+iterator, so there ``polling_event_stream`` polls the database instead and
+holds a thread for as long as the connection is open.
+"""
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import close_old_connections
+from django.utils.module_loading import import_string
+
+from .models import Notification
+
+logger = logging.getLogger(__name__)
+
+# Events buffered per connection before new ones are dropped (the client
+# catches up from the database when it reconnects with Last-Event-ID)
+QUEUE_SIZE = 100
+
+
+def notification_event(notification):
+    return {
+        'id': notification.id,
+        'title': notification.title,
+        'message': notification.message,
+        # Above 1 for a digest that was already unread
+        'count': notification.count,
+        'created_at': notification.created_at.isoformat(),
+    }
+
+
+class Subscription:
+    def __init__(self, user_id, loop):
+        self.user_id = user_id
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+
+    def put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            logger.warning(f'Notification stream for user {self.user_id} is full; dropped event {event["id"]}')
+
+
+class Hub:
+    """In-process fan-out from user id to that user's open streams.  Thread-safe."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions = defaultdict(set)
+
+    def subscribe(self, user_id):
+        subscription = Subscription(user_id, asyncio.get_running_loop())
+        with self._lock:
+            self._subscriptions[user_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.user_id)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.user_id]
+
+    def user_ids(self):
+        with self._lock:
+            return list(self._subscriptions)
+
+    def connection_count(self):
+        with self._lock:
+            return sum(len(subscriptions) for subscriptions in self._subscriptions.values())
+
+    def deliver(self, user_id, event):
+        """Queue event for every stream of user_id.  May be called from any thread."""
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(user_id, ()))
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.put, event)
+            except RuntimeError:
+                # The connection's event loop has already shut down
+                self.unsubscribe(subscription)
+
+
+hub = Hub()
+
+
+# ──────────────────────────────────────────────
+# Backends
+# ──────────────────────────────────────────────
+
+class LocalBackend:
+    """Delivers to streams held by this process only."""
+
+    def __init__(self, hub):
+        self.hub = hub
+        self._task = None
+
+    def publish(self, user_id, event):
+        self.hub.deliver(user_id, event)
+
+    async def listen(self):
+        """Feed the hub with events published by other processes.  Runs until cancelled."""
+
+    def ensure_listening(self):
+        """Start this process's listener on the running loop, once."""
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._task.get_loop() is not loop:
+            self._task = loop.create_task(self._listen_forever())
+
+    async def _listen_forever(self):
+        while True:
+            try:
+                await self.listen()
+                return
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception(f'{type(self).__name__} listener failed; restarting')
+                await asyncio.sleep(5)
+
+
+class DatabaseBackend(LocalBackend):
+    """
+    Polls the Notification table for connected users; the notification row is
+    the message.  Digest updates to existing rows are not seen until reload.
+    """
+
+    def publish(self, user_id, event):
+        # Picked up by the poller of whichever process holds the connection
+        pass
+
+    def _latest_id(self):
+        close_old_connections()
+        return Notification.objects.order_by('-id').values_list('id', flat=True).first() or 0
+
+    def _fetch(self, after_id, user_ids):
+        close_old_connections()
+        return list(
+            Notification.objects.filter(id__gt=after_id, user_id__in=user_ids).order_by('id')
+        )
+
+    async def listen(self):
+        interval = getattr(settings, 'NOTIFICATION_POLL_SECONDS', 2)
+        last_id = await sync_to_async(self._latest_id, thread_sensitive=False)()
+        while True:
+            await asyncio.sleep(interval)
+            user_ids = self.hub.user_ids()
+            if not user_ids:
+                # Nobody is listening; newcomers replay from Last-Event-ID themselves
+                last_id = await sync_to_async(self._latest_id, thread_sensitive=False)()
+                continue
+            for notification in await sync_to_async(self._fetch, thread_sensitive=False)(last_id, user_ids):
+                self.hub.deliver(notification.user_id, notification_event(notification))
+                last_id = notification.id
+
+
+class RedisBackend(LocalBackend):
+    """Redis pub/sub, one channel per user and one pattern subscription per process."""
+
+    CHANNEL_PREFIX = 'notifications:user:'
+
+    def __init__(self, hub):
+        super().__init__(hub)
+        try:
+            import redis
+        except ImportError:
+            raise ImproperlyConfigured('RedisBackend needs the redis package (pip install redis)')
+        self.url = getattr(settings, 'NOTIFICATION_REDIS_URL', None)
+        if not self.url:
+            raise ImproperlyConfigured('Set NOTIFICATION_REDIS_URL to use RedisBackend')
+        self._client = redis.Redis.from_url(self.url)
+
+    def publish(self, user_id, event):
+        self._client.publish(f'{self.CHANNEL_PREFIX}{user_id}', json.dumps(event))
+
+    async def listen(self):
+        import redis.asyncio
+
+        client = redis.asyncio.Redis.from_url(self.url)
+        pubsub = client.pubsub()
+        try:
+            await pubsub.psubscribe(f'{self.CHANNEL_PREFIX}*')
+            async for message in pubsub.listen():
+                if message['type'] != 'pmessage':
+                    continue
+                user_id = int(message['channel'].decode().rsplit(':', 1)[1])
+                self.hub.deliver(user_id, json.loads(message['data']))
+        finally:
+            await pubsub.aclose()
+            await client.aclose()
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            path = getattr(settings, 'NOTIFICATION_BACKEND', 'apps.notifications.realtime.LocalBackend')
+            _backend = import_string(path)(hub)
+        return _backend
+
+
+def publish_notification(notification):
+    """Send a committed notification to the user's open streams, wherever they are."""
+    try:
+        get_backend().publish(notification.user_id, notification_event(notification))
+    except Exception:
+        # Live delivery is best effort; the notification is already saved
+        logger.exception(f'Could not publish notification {notification.id}')
+
+
+# ──────────────────────────────────────────────
+# Stream
+# ──────────────────────────────────────────────
+
+def _sse(event, data, event_id=None):
+    lines = [f'id: {event_id}'] if event_id is not None else []
+    lines += [f'event: {event}', f'data: {json.dumps(data)}']
+    return '\n'.join(lines) + '\n\n'
+
+
+def _missed(user_id, after_id):
+    close_old_connections()
+    return [
+        notification_event(notification)
+        for notification in Notification.objects.filter(user_id=user_id, id__gt=after_id).order_by('id')[:QUEUE_SIZE]
+    ]
+
+
+async def event_stream(user, last_event_id=None):
+    """
+    SSE body for one connection: notifications missed since Last-Event-ID,
+    the unread count, then live notifications with periodic keepalives.  It
+    ends after NOTIFICATION_STREAM_MAX_SECONDS; the browser reconnects.
+    """
+    from .services import unread_count
+
+    heartbeat = getattr(settings, 'NOTIFICATION_STREAM_HEARTBEAT_SECONDS', 20)
+    lifetime = getattr(settings, 'NOTIFICATION_STREAM_MAX_SECONDS', 300)
+    loop = asyncio.get_running_loop()
+
+    # Subscribe before reading the database so nothing falls in between
+    subscription = hub.subscribe(user.id)
+    get_backend().ensure_listening()
+    try:
+        yield f'retry: {getattr(settings, "NOTIFICATION_STREAM_RETRY_MS", 3000)}\n\n'
+        replayed = set()
+        if last_event_id and last_event_id.isdigit():
+            for event in await sync_to_async(_missed, thread_sensitive=False)(user.id, int(last_event_id)):
+                yield _sse('notification', event, event['id'])
+                replayed.add(event['id'])
+        yield _sse('unread', {'unread_count': await sync_to_async(unread_count, thread_sensitive=False)(user)})
+
+        deadline = loop.time() + lifetime
+        while (remaining := deadline - loop.time()) > 0:
+            try:
+                event = await asyncio.wait_for(subscription.queue.get(), timeout=min(heartbeat, remaining))
+            except asyncio.TimeoutError:
+                yield ': keepalive\n\n'
+                continue
+            if event['id'] in replayed:
+                continue
+            yield _sse('notification', event, event['id'])
+    finally:
+        hub.unsubscribe(subscription)
+
+
+def _latest_id(user_id):
+    return Notification.objects.filter(user_id=user_id).order_by('-id').values_list('id', flat=True).first() or 0
+
+
+def polling_event_stream(user, last_event_id=None):
+    """
+    Synchronous event_stream for WSGI servers: the same events, read from the
+    database every NOTIFICATION_POLL_SECONDS.  Each open stream holds a server
+    thread, so it ends after NOTIFICATION_WSGI_STREAM_SECONDS.
+    """
+    from .services import unread_count
+
+    interval = getattr(settings, 'NOTIFICATION_POLL_SECONDS', 2)
+    heartbeat = getattr(settings, 'NOTIFICATION_STREAM_HEARTBEAT_SECONDS', 20)
+    lifetime = getattr(settings, 'NOTIFICATION_WSGI_STREAM_SECONDS', 60)
+
+    yield f'retry: {getattr(settings, "NOTIFICATION_STREAM_RETRY_MS", 3000)}\n\n'
+    if last_event_id and last_event_id.isdigit():
+        last_id = int(last_event_id)
+    else:
+        last_id = _latest_id(user.id)
+    for event in _missed(user.id, last_id):
+        yield _sse('notification', event, event['id'])
+        last_id = event['id']
+    yield _sse('unread', {'unread_count': unread_count(user)})
+
+    deadline = time.monotonic() + lifetime
+    last_write = time.monotonic()
+    while (remaining := deadline - time.monotonic()) > 0:
+        time.sleep(min(interval, remaining))
+        for event in _missed(user.id, last_id):
+            yield _sse('notification', event, event['id'])
+            last_id = event['id']
+            last_write = time.monotonic()
+        if time.monotonic() - last_write >= heartbeat:
+            yield ': keepalive\n\n'
+            last_write = time.monotonic()
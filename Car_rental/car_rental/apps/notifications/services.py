@@ -1,9 +1,249 @@
+"""
+Notification creation and the per-user unread counter.
+
+The unread count shown in the header is kept in the cache so rendering the
+badge costs no query.  A missing counter is recounted once from the
+(user, is_read, created_at) index; afterwards ``create_notification``
+increments it when its transaction commits and ``mark_read`` decrements it
+by the rows it actually changed.  Code that bulk-creates notifications
+calls ``invalidate_unread_counts`` instead.  Counters only help when every
+process shares the cache; with NOTIFICATION_UNREAD_CACHE_SECONDS = 0 (the
+default without CACHE_REDIS_URL) each read counts from the index.
+
+Committed notifications are also pushed to the user's open
+``/notifications/stream/`` connections — see realtime.py.
+
+``create_notifications_bulk`` sends one NotificationTemplate to many users
+with a bulk INSERT per batch.  In digest mode, a burst of notifications of
+the same kind for one user folds into a single unread row with a count.
+"""
+from dataclasses import dataclass
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import QuerySet
+from django.utils import timezone
+
 from .models import Notification
+from .realtime import publish_notification
+
+
+def unread_cache_key(user_id):
+    return f'notifications:unread:{user_id}'
+
+
+def _cache_timeout():
+    return getattr(settings, 'NOTIFICATION_UNREAD_CACHE_SECONDS', 24 * 60 * 60)
+
+
+def unread_count(user):
+    """Unread notifications for user, from the cache when possible."""
+    if not _cache_timeout():
+        return Notification.objects.filter(user=user, is_read=False).count()
+    key = unread_cache_key(user.id)
+    count = cache.get(key)
+    if count is None:
+        count = Notification.objects.filter(user=user, is_read=False).count()
+        cache.set(key, count, _cache_timeout())
+    return count
+
+
+def _adjust_unread(user_id, delta):
+    if not _cache_timeout():
+        return
+    # A missing key is simply recounted on the next read
+    try:
+        if delta > 0:
+            cache.incr(unread_cache_key(user_id), delta)
+        elif delta < 0:
+            cache.decr(unread_cache_key(user_id), -delta)
+    except ValueError:
+        pass
+
+
+def invalidate_unread_counts(user_ids):
+    """Drop cached counters so they are recounted, e.g. after a bulk_create."""
+    if not _cache_timeout():
+        return
+    cache.delete_many([unread_cache_key(user_id) for user_id in set(user_ids)])
 
 
 def create_notification(user, title, message):
-    return Notification.objects.create(
+    notification = Notification.objects.create(
         user=user,
         title=title,
         message=message
     )
+    transaction.on_commit(lambda: _notification_committed(notification))
+    return notification
+
+
+def _notification_committed(notification):
+    # Only counted and pushed once it is visible to other connections
+    _adjust_unread(notification.user_id, 1)
+    publish_notification(notification)
+
+
+# ──────────────────────────────────────────────
+# Bulk fan-out and digests
+# ──────────────────────────────────────────────
+
+@dataclass(frozen=True)
+class NotificationTemplate:
+    """
+    Title and message format strings for one kind of notification.
+    ``digest_title``/``digest_message`` replace them once digest mode has
+    folded several into one row; they may also use ``{count}``.
+    """
+    kind: str
+    title: str
+    message: str
+    digest_title: str = ''
+    digest_message: str = ''
+
+    def render(self, context, count=1):
+        if count > 1 and self.digest_title:
+            return (
+                self.digest_title.format(count=count, **context),
+                self.digest_message.format(count=count, **context),
+            )
+        return self.title.format(**context), self.message.format(**context)
+
+
+NEW_BOOKING_REQUEST = NotificationTemplate(
+    kind='new_booking_request',
+    title='📋 New Booking Request',
+    message='New booking request for {car} from {customer}. Please confirm or reject.',
+    digest_title='📋 {count} New Booking Requests',
+    digest_message=(
+        'You have {count} new booking requests, the latest for {car} from {customer}. '
+        'Please confirm or reject them.'
+    ),
+)
+
+ANNOUNCEMENT = NotificationTemplate(kind='announcement', title='📢 {title}', message='{message}')
+
+
+def digest_window():
+    return timedelta(minutes=getattr(settings, 'NOTIFICATION_DIGEST_MINUTES', 10))
+
+
+def insert_notifications(notifications, batch_size=None):
+    """bulk_create notifications; once committed, refresh their users' unread counters and push them live."""
+    created = Notification.objects.bulk_create(notifications, batch_size=batch_size)
+    if created and created[0].pk is None:
+        _read_back_ids(created)
+    if created:
+        transaction.on_commit(lambda: _bulk_committed(created))
+    return created
+
+
+def _read_back_ids(notifications):
+    """
+    Set the ids of bulk-created notifications on backends whose bulk INSERT
+    does not return them (MySQL), matching on user, created_at and title.
+    A row that still cannot be told apart is pushed without an id: the
+    stream shows it but a reconnect cannot resume after it.
+    """
+    stored = Notification.objects.filter(
+        user_id__in={notification.user_id for notification in notifications},
+        created_at__range=(
+            min(notification.created_at for notification in notifications),
+            max(notification.created_at for notification in notifications),
+        ),
+    ).values_list('user_id', 'created_at', 'title', 'id')
+    ids = {}
+    for user_id, created_at, title, pk in stored:
+        key = (user_id, created_at, title)
+        ids[key] = None if key in ids else pk
+    for notification in notifications:
+        notification.id = ids.get((notification.user_id, notification.created_at, notification.title))
+
+
+def _bulk_committed(notifications):
+    invalidate_unread_counts(notification.user_id for notification in notifications)
+    for notification in notifications:
+        publish_notification(notification)
+
+
+def _user_ids(users, batch_size):
+    if isinstance(users, QuerySet):
+        return users.order_by().values_list('id', flat=True).iterator(chunk_size=batch_size)
+    return (getattr(user, 'pk', user) for user in users)
+
+
+def _chunks(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _fold_into_digests(user_ids, template, context, window):
+    """Fold into each user's recent unread row of template.kind.  Returns the ids of users folded."""
+    now = timezone.now()
+    with transaction.atomic():
+        rows = (
+            Notification.objects.select_for_update()
+            .filter(user_id__in=user_ids, kind=template.kind, is_read=False, updated_at__gte=now - window)
+            .order_by('user_id', '-updated_at')
+        )
+        latest = {}
+        for row in rows:
+            latest.setdefault(row.user_id, row)
+        for row in latest.values():
+            row.count += 1
+            row.title, row.message = template.render(context, row.count)
+            # Keeps the burst window open; created_at stays, or rows would
+            # move under the inbox's (created_at, id) keyset cursor
+            row.updated_at = now
+        Notification.objects.bulk_update(list(latest.values()), ['count', 'title', 'message', 'updated_at'])
+
+    folded = list(latest.values())
+    # Unread counts are unchanged — the rows were already unread
+    transaction.on_commit(lambda: [publish_notification(row) for row in folded])
+    return set(latest)
+
+
+def create_notifications_bulk(users, template, context=None, digest=False, batch_size=None):
+    """
+    Send template, rendered with context, to every user in ``users`` (users,
+    user ids or a user queryset) with one INSERT per batch.
+
+    With ``digest`` a user who already has an unread notification of the
+    same kind from the last NOTIFICATION_DIGEST_MINUTES gets that row
+    updated (count + 1, digest wording) instead of a new one.
+    Returns the number of users notified.
+    """
+    context = context or {}
+    batch_size = batch_size or getattr(settings, 'NOTIFICATION_BULK_BATCH_SIZE', 1000)
+    title, message = template.render(context)
+
+    notified = 0
+    for chunk in _chunks(_user_ids(users, batch_size), batch_size):
+        folded = _fold_into_digests(chunk, template, context, digest_window()) if digest and template.kind else set()
+        insert_notifications([
+            Notification(user_id=user_id, title=title, message=message, kind=template.kind)
+            for user_id in chunk if user_id not in folded
+        ])
+        notified += len(chunk)
+    return notified
+
+
+def mark_read(user, ids=None):
+    """
+    Mark user's unread notifications read — all of them, or only ``ids``.
+    Returns how many changed.
+    """
+    unread = Notification.objects.filter(user=user, is_read=False)
+    if ids is not None:
+        unread = unread.filter(id__in=ids)
+    updated = unread.update(is_read=True)
+    _adjust_unread(user.id, -updated)
+    return updated
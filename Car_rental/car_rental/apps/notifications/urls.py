@@ -3,4 +3,8 @@ from . import views
 
 urlpatterns = [
     path('', views.notification_list, name='notification_list'),
+    path('mark-read/', views.notification_mark_read, name='notification_mark_read'),
+    path('api/', views.notification_api, name='notification_api'),
+    path('api/mark-read/', views.notification_api_mark_read, name='notification_api_mark_read'),
+    path('stream/', views.notification_stream, name='notification_stream'),
 ]
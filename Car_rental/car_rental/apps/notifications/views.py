@@ -1,8 +1,30 @@
+import json
+
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
 from django.shortcuts import render, redirect
+from django.views.decorators.http import require_http_methods
 
+from apps.dashboard.search import keyset_paginate
 from .models import Notification
+from .realtime import event_stream, polling_event_stream
+from .services import mark_read, unread_count
+
+
+def _inbox_page(request):
+	"""One keyset page of the user's notifications, optionally only unread ones (?unread=1)."""
+	notifications = Notification.objects.filter(user=request.user)
+	if request.GET.get('unread') == '1':
+		notifications = notifications.filter(is_read=False)
+	page_size = getattr(settings, 'NOTIFICATION_PAGE_SIZE', 20)
+	return keyset_paginate(notifications, request.GET, page_size=page_size)
+
+
+def _parse_ids(values):
+	return [int(value) for value in values if str(value).isdigit()]
 
 
 @login_required
@@ -11,8 +33,87 @@ def notification_list(request):
 		messages.error(request, 'Admins can only access admin features.')
 		return redirect('admin_dashboard')
 
-	notifications = Notification.objects.filter(user=request.user)
+	page = _inbox_page(request)
 
 	return render(request, 'notifications/list.html', {
-		'notifications': notifications
+		'notifications': page.items,
+		'page': page,
+		'unread_only': request.GET.get('unread') == '1',
 	})
+
+
+@login_required
+@require_http_methods(["POST"])
+def notification_mark_read(request):
+	"""Mark the posted notification ids read, or all of them when none are posted."""
+	ids = _parse_ids(request.POST.getlist('ids')) or None
+	updated = mark_read(request.user, ids)
+	if updated:
+		messages.success(request, f'{updated} notification{"s" if updated != 1 else ""} marked as read.')
+	return redirect('notification_list')
+
+
+@login_required
+def notification_api(request):
+	"""
+	JSON inbox: ``{"results": [...], "next": url or null, "unread_count": n}``.
+	Follow ``next`` for older notifications; ``?unread=1`` lists unread only.
+	"""
+	if request.user.role == 'admin':
+		return JsonResponse({'error': 'Admins have no notification inbox'}, status=403)
+
+	page = _inbox_page(request)
+	return JsonResponse({
+		'results': [
+			{
+				'id': notification.id,
+				'title': notification.title,
+				'message': notification.message,
+				'is_read': notification.is_read,
+				'created_at': notification.created_at.isoformat(),
+			}
+			for notification in page.items
+		],
+		'next': f'{request.path}?{page.next_querystring}' if page.has_next else None,
+		'unread_count': unread_count(request.user),
+	})
+
+
+@login_required
+@require_http_methods(["POST"])
+def notification_api_mark_read(request):
+	"""Body ``{"ids": [1, 2]}`` marks those read; ``{"all": true}`` marks everything read."""
+	try:
+		payload = json.loads(request.body or b'{}')
+	except json.JSONDecodeError:
+		return JsonResponse({'error': 'Invalid JSON'}, status=400)
+
+	if payload.get('all'):
+		ids = None
+	else:
+		ids = _parse_ids(payload.get('ids') or [])
+		if not ids:
+			return JsonResponse({'error': 'ids or all required'}, status=400)
+
+	updated = mark_read(request.user, ids)
+	return JsonResponse({'updated': updated, 'unread_count': unread_count(request.user)})
+
+
+@login_required
+async def notification_stream(request):
+	"""Server-Sent Events stream of the user's new notifications (see realtime.py)."""
+	user = await request.auser()
+	if user.role == 'admin':
+		return JsonResponse({'error': 'Admins have no notification inbox'}, status=403)
+
+	last_event_id = request.headers.get('Last-Event-ID')
+	if isinstance(request, ASGIRequest):
+		stream = event_stream(user, last_event_id)
+	else:
+		# WSGI buffers async iterators to the end, so poll synchronously instead
+		stream = polling_event_stream(user, last_event_id)
+	response = StreamingHttpResponse(stream, content_type='text/event-stream')
+	response['Cache-Control'] = 'no-cache'
+	# Stop nginx from buffering the stream
+	response['X-Accel-Buffering'] = 'no'
+	return response
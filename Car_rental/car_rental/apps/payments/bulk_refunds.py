@@ -0,0 +1,152 @@
+"""
+Bulk refunds for admins.
+
+``queue_bulk_refund`` selects payments by id list or by filter (car city,
+rental dates) and, in one transaction, queues a refund for each through the
+payment-command outbox.  Each payment gets a RefundBatchItem.  Payments that
+cannot be refunded are recorded as 'skipped' with the reason.
+
+The ``dispatch_payment_commands`` worker sends the refunds with bounded
+parallelism (PAYMENT_COMMAND_WORKERS) and updates each item as Razorpay
+accepts or rejects it.  Once no item is queued, ``finalize_refund_batches``
+marks the batch completed and notifies every customer with a single
+bulk_create instead of one notification per refund.
+"""
+import logging
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from apps.notifications.models import Notification
+from apps.notifications.services import insert_notifications
+from .models import Payment, RefundBatch, RefundBatchItem
+
+logger = logging.getLogger(__name__)
+
+
+def select_payments(payment_ids=None, city=None, start_date=None, end_date=None):
+    """
+    Payments a bulk refund would cover.  An explicit id list is used as-is
+    (unrefundable ids become skipped items); filters only match completed,
+    not yet refunded payments whose rental overlaps start_date–end_date.
+    """
+    if payment_ids:
+        return Payment.objects.filter(id__in=payment_ids)
+
+    payments = Payment.objects.filter(status='completed').exclude(refunds__status__in=('pending', 'processed'))
+    if city:
+        payments = payments.filter(booking__car__location__iexact=city)
+    if start_date:
+        payments = payments.filter(booking__end_date__gte=start_date)
+    if end_date:
+        payments = payments.filter(booking__start_date__lte=end_date)
+    return payments
+
+
+@transaction.atomic
+def queue_bulk_refund(admin, reason='', payment_ids=None, city=None, start_date=None, end_date=None):
+    """Create a RefundBatch and queue a refund for every selected payment.  Returns the batch."""
+    if not (payment_ids or city or start_date or end_date):
+        raise ValueError('Select payments by id or by at least one filter')
+
+    payment_ids = sorted(set(payment_ids or []))
+    selected = list(
+        select_payments(payment_ids, city, start_date, end_date).order_by('id').values_list('id', flat=True)
+    )
+    limit = getattr(settings, 'BULK_REFUND_MAX_PAYMENTS', 1000)
+    if len(selected) > limit:
+        raise ValueError(f'{len(selected)} payments selected; a bulk refund is limited to {limit}')
+    if not selected:
+        raise ValueError('No refundable payments match the selection')
+
+    from .services import RazorpayPaymentService
+    service = RazorpayPaymentService()
+
+    batch = RefundBatch.objects.create(
+        created_by=admin,
+        reason=reason,
+        criteria={
+            'payment_ids': payment_ids,
+            'city': city or '',
+            'start_date': str(start_date or ''),
+            'end_date': str(end_date or ''),
+        },
+    )
+
+    items = []
+    for payment_id in selected:
+        try:
+            # Nested atomic — a rejected payment rolls back only its own savepoint
+            result = service.create_refund(payment_id, reason=reason, initiated_by=admin)
+        except ValueError as e:
+            items.append(RefundBatchItem(batch=batch, payment_id=payment_id, status='skipped', detail=str(e)))
+        else:
+            items.append(RefundBatchItem(batch=batch, payment_id=payment_id, refund_id=result['refund_id']))
+
+    # Ids that do not exist at all are reported too
+    missing = set(payment_ids) - set(selected)
+    RefundBatchItem.objects.bulk_create(items)
+    logger.info(
+        f'Refund batch {batch.id}: {sum(item.status == "queued" for item in items)} queued, '
+        f'{sum(item.status == "skipped" for item in items)} skipped, {len(missing)} unknown ids'
+    )
+    if missing:
+        batch.criteria['unknown_payment_ids'] = sorted(missing)
+        batch.save(update_fields=['criteria'])
+
+    if not RefundBatchItem.objects.filter(batch=batch, status='queued').exists():
+        _complete(batch)
+    return batch
+
+
+def batch_summary(batch):
+    """Item counts per status, e.g. {'queued': 3, 'processed': 10, ...}."""
+    counts = dict(batch.items.values_list('status').annotate(n=Count('id')))
+    return {status: counts.get(status, 0) for status, _ in RefundBatchItem.STATUS_CHOICES}
+
+
+def _complete(batch):
+    processed = list(
+        batch.items.filter(status='processed').select_related('payment__booking__car', 'refund')
+    )
+    notifications = [
+        Notification(
+            user_id=item.payment.user_id,
+            title='💰 Refund Processed',
+            message=f'Your refund of ₹{item.refund.amount} for {item.payment.booking.car.name} has been processed.',
+        )
+        for item in processed
+    ]
+    if batch.created_by_id:
+        summary = batch_summary(batch)
+        notifications.append(Notification(
+            user_id=batch.created_by_id,
+            title='↩️ Bulk Refund Complete',
+            message=(
+                f'Refund batch #{batch.id}: {summary["processed"]} processed, '
+                f'{summary["failed"]} failed, {summary["skipped"]} skipped.'
+            ),
+        ))
+    insert_notifications(notifications)
+
+    batch.status = 'completed'
+    batch.completed_at = timezone.now()
+    batch.save(update_fields=['status', 'completed_at'])
+    logger.info(f'Refund batch {batch.id} completed; {len(processed)} customers notified')
+
+
+def finalize_refund_batches():
+    """Complete every processing batch with no queued items left.  Returns how many were completed."""
+    done = RefundBatch.objects.filter(status='processing').exclude(items__status='queued')
+    completed = 0
+    for batch_id in done.values_list('id', flat=True):
+        with transaction.atomic():
+            # Lock so two dispatchers never notify the same batch twice
+            batch = RefundBatch.objects.select_for_update().filter(id=batch_id, status='processing').first()
+            if batch is None or batch.items.filter(status='queued').exists():
+                continue
+            _complete(batch)
+            completed += 1
+    return completed
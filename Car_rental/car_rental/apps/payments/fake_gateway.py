@@ -0,0 +1,318 @@
+"""
+In-memory stand-in for the Razorpay REST API, for local and load testing.
+
+Implements the endpoints this project calls — order.create, order.payments,
+payment.fetch, payment.refund and payment.fetch_multiple_refund — plus a ``/fake/`` endpoint
+that plays the part of Razorpay Checkout: it "pays" an order, returns the
+signed handler response the browser would post to ``payment_success`` and
+sends the matching webhook signed with RAZORPAY_WEBHOOK_SECRET.
+
+Point the app at it with ``RAZORPAY_API_BASE_URL=http://127.0.0.1:9000`` and
+run ``python manage.py fake_razorpay``.  Never use it with live keys.
+"""
+import hashlib
+import hmac
+import json
+import logging
+import queue
+import random
+import re
+import threading
+import time
+import urllib.request
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+
+def _new_id(prefix):
+    return f'{prefix}_{uuid.uuid4().hex[:14]}'
+
+
+class FakeGatewayError(Exception):
+    """Raised by FakeRazorpay for requests the real API would reject."""
+
+    def __init__(self, status, code, description):
+        super().__init__(description)
+        self.status = status
+        self.code = code
+        self.description = description
+
+    def as_json(self):
+        return {'error': {'code': self.code, 'description': self.description}}
+
+
+class FakeRazorpay:
+    """
+    Gateway state and behaviour, independent of the HTTP layer.
+
+    ``deliver`` is called with (body, headers) for every webhook; by default
+    webhooks are POSTed to ``webhook_url`` (or dropped when it is unset).
+    ``latency`` (seconds) and ``error_rate`` (0–1, answered with a 5xx)
+    simulate a degraded gateway.
+    """
+
+    def __init__(self, key_secret, webhook_secret=None, webhook_url=None,
+                 deliver=None, latency=0.0, error_rate=0.0):
+        self.key_secret = key_secret
+        self.webhook_secret = webhook_secret
+        self.webhook_url = webhook_url
+        self.latency = latency
+        self.error_rate = error_rate
+        self._deliver = deliver or self._post_webhook
+
+        self._lock = threading.Lock()
+        self.orders = {}
+        self.payments = {}
+        self.refunds = {}
+
+        self._webhooks = queue.Queue()
+        threading.Thread(target=self._webhook_loop, name='fake-razorpay-webhooks', daemon=True).start()
+
+    # ── API ──────────────────────────────────────
+
+    def create_order(self, data):
+        amount = int(data.get('amount') or 0)
+        if amount < 100:
+            raise FakeGatewayError(400, 'BAD_REQUEST_ERROR', 'The amount must be atleast INR 1.00')
+        order = {
+            'id': _new_id('order'),
+            'entity': 'order',
+            'amount': amount,
+            'amount_paid': 0,
+            'amount_due': amount,
+            'currency': data.get('currency', 'INR'),
+            'receipt': data.get('receipt'),
+            'status': 'created',
+            'attempts': 0,
+            'notes': data.get('notes') or {},
+            'created_at': int(time.time()),
+        }
+        with self._lock:
+            self.orders[order['id']] = order
+        return order
+
+    def fetch_order(self, order_id):
+        with self._lock:
+            order = self.orders.get(order_id)
+        if order is None:
+            raise FakeGatewayError(400, 'BAD_REQUEST_ERROR', 'The id provided does not exist')
+        return order
+
+    def order_payments(self, order_id):
+        self.fetch_order(order_id)
+        with self._lock:
+            items = [payment for payment in self.payments.values() if payment['order_id'] == order_id]
+        return {'entity': 'collection', 'count': len(items), 'items': items}
+
+    def fetch_payment(self, payment_id):
+        with self._lock:
+            payment = self.payments.get(payment_id)
+        if payment is None:
+            raise FakeGatewayError(400, 'BAD_REQUEST_ERROR', 'The id provided does not exist')
+        return payment
+
+    def refund_payment(self, payment_id, data):
+        with self._lock:
+            payment = self.payments.get(payment_id)
+            if payment is None or payment['status'] != 'captured':
+                raise FakeGatewayError(400, 'BAD_REQUEST_ERROR', 'The payment has not been captured')
+            amount = int(data.get('amount') or payment['amount'] - payment['amount_refunded'])
+            if amount > payment['amount'] - payment['amount_refunded']:
+                raise FakeGatewayError(
+                    400, 'BAD_REQUEST_ERROR',
+                    'The total refund amount is greater than the refund payment amount',
+                )
+            refund = {
+                'id': _new_id('rfnd'),
+                'entity': 'refund',
+                'amount': amount,
+                'currency': payment['currency'],
+                'payment_id': payment_id,
+                'notes': data.get('notes') or {},
+                'status': 'processed',
+                'created_at': int(time.time()),
+            }
+            self.refunds[refund['id']] = refund
+            payment['amount_refunded'] += amount
+            payment['refund_status'] = 'full' if payment['amount_refunded'] == payment['amount'] else 'partial'
+            if payment['refund_status'] == 'full':
+                payment['status'] = 'refunded'
+        self._queue_webhook('refund.processed', {'refund': refund, 'payment': payment})
+        return refund
+
+    def payment_refunds(self, payment_id):
+        with self._lock:
+            items = [refund for refund in self.refunds.values() if refund['payment_id'] == payment_id]
+        return {'entity': 'collection', 'count': len(items), 'items': items}
+
+    # ── Checkout simulation ──────────────────────
+
+    def checkout(self, order_id, succeed=True):
+        """
+        Pay an order the way Razorpay Checkout would.  Returns the dict the
+        browser posts to payment_success, or the error dict passed to
+        payment_failure when ``succeed`` is False.
+        """
+        with self._lock:
+            order = self.orders.get(order_id)
+            if order is None:
+                raise FakeGatewayError(400, 'BAD_REQUEST_ERROR', 'The id provided does not exist')
+            payment = {
+                'id': _new_id('pay'),
+                'entity': 'payment',
+                'amount': order['amount'],
+                'currency': order['currency'],
+                'status': 'captured' if succeed else 'failed',
+                'order_id': order_id,
+                'method': 'card',
+                'captured': succeed,
+                'amount_refunded': 0,
+                'refund_status': None,
+                'created_at': int(time.time()),
+            }
+            self.payments[payment['id']] = payment
+            order['attempts'] += 1
+            if succeed:
+                order['status'] = 'paid'
+                order['amount_paid'] = order['amount']
+                order['amount_due'] = 0
+            else:
+                order['status'] = 'attempted'
+
+        if not succeed:
+            self._queue_webhook('payment.failed', {'payment': payment})
+            return {
+                'razorpay_order_id': order_id,
+                'error_code': 'BAD_REQUEST_ERROR',
+                'error_description': 'Payment failed',
+            }
+
+        self._queue_webhook('payment.captured', {'payment': payment})
+        signature = hmac.new(
+            self.key_secret.encode(), f'{order_id}|{payment["id"]}'.encode(), hashlib.sha256,
+        ).hexdigest()
+        return {
+            'razorpay_order_id': order_id,
+            'razorpay_payment_id': payment['id'],
+            'razorpay_signature': signature,
+        }
+
+    # ── Webhooks ─────────────────────────────────
+
+    def _queue_webhook(self, event_type, entities):
+        if not self.webhook_secret:
+            return
+        event = {
+            'entity': 'event',
+            'event': event_type,
+            'contains': list(entities),
+            'payload': {name: {'entity': dict(entity)} for name, entity in entities.items()},
+            'created_at': int(time.time()),
+        }
+        body = json.dumps(event)
+        headers = {
+            'Content-Type': 'application/json',
+            'X-Razorpay-Event-Id': _new_id('evt'),
+            'X-Razorpay-Signature': hmac.new(
+                self.webhook_secret.encode(), body.encode(), hashlib.sha256,
+            ).hexdigest(),
+        }
+        self._webhooks.put((body, headers))
+
+    def _webhook_loop(self):
+        while True:
+            body, headers = self._webhooks.get()
+            try:
+                self._deliver(body, headers)
+            except Exception as e:
+                logger.warning(f'Fake gateway webhook delivery failed: {e}')
+            finally:
+                self._webhooks.task_done()
+
+    def _post_webhook(self, body, headers):
+        if not self.webhook_url:
+            return
+        request = urllib.request.Request(self.webhook_url, data=body.encode(), headers=headers, method='POST')
+        urllib.request.urlopen(request, timeout=10).close()
+
+    def wait_for_webhooks(self):
+        """Block until every queued webhook has been delivered."""
+        self._webhooks.join()
+
+    # ── Fault injection ──────────────────────────
+
+    def degrade(self):
+        """Apply configured latency and random 5xx errors to an API call."""
+        if self.latency:
+            time.sleep(self.latency)
+        if self.error_rate and random.random() < self.error_rate:
+            raise FakeGatewayError(500, 'SERVER_ERROR', 'Simulated gateway error')
+
+
+ROUTES = (
+    # (method, path pattern, handler(fake, match, body))
+    ('POST', r'/v1/orders',                      lambda fake, m, body: fake.create_order(body)),
+    ('GET',  r'/v1/orders/([^/]+)',              lambda fake, m, body: fake.fetch_order(m[1])),
+    ('GET',  r'/v1/orders/([^/]+)/payments',     lambda fake, m, body: fake.order_payments(m[1])),
+    ('GET',  r'/v1/payments/([^/]+)',            lambda fake, m, body: fake.fetch_payment(m[1])),
+    ('POST', r'/v1/payments/([^/]+)/refund',     lambda fake, m, body: fake.refund_payment(m[1], body)),
+    ('GET',  r'/v1/payments/([^/]+)/refunds',    lambda fake, m, body: fake.payment_refunds(m[1])),
+    ('POST', r'/fake/orders/([^/]+)/pay',        lambda fake, m, body: fake.checkout(m[1], body.get('succeed', True))),
+)
+
+
+class FakeRazorpayHandler(BaseHTTPRequestHandler):
+    fake = None  # set by make_server
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+    def _respond(self, status, data):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _dispatch(self, method):
+        path = self.path.split('?', 1)[0]
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            body = json.loads(self.rfile.read(length) or b'{}') if length else {}
+        except ValueError:
+            return self._respond(400, FakeGatewayError(400, 'BAD_REQUEST_ERROR', 'Invalid JSON').as_json())
+
+        for route_method, pattern, handler in ROUTES:
+            match = re.fullmatch(pattern, path)
+            if route_method == method and match:
+                try:
+                    if not path.startswith('/fake/'):
+                        self.fake.degrade()
+                    return self._respond(200, handler(self.fake, match, body))
+                except FakeGatewayError as e:
+                    return self._respond(e.status, e.as_json())
+        self._respond(404, FakeGatewayError(404, 'BAD_REQUEST_ERROR', 'The requested URL was not found').as_json())
+
+    def do_GET(self):
+        self._dispatch('GET')
+
+    def do_POST(self):
+        self._dispatch('POST')
+
+
+def make_server(fake, host='127.0.0.1', port=9000):
+    """Return a ThreadingHTTPServer serving fake; call serve_forever() on it."""
+    handler = type('BoundFakeRazorpayHandler', (FakeRazorpayHandler,), {'fake': fake})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def start_in_thread(fake, host='127.0.0.1', port=9000):
+    """Serve fake from a daemon thread and return the server (call shutdown() when done)."""
+    server = make_server(fake, host, port)
+    threading.Thread(target=server.serve_forever, name='fake-razorpay', daemon=True).start()
+    return server
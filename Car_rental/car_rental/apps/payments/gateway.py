@@ -0,0 +1,254 @@
+"""
+Process-wide Razorpay HTTP client.
+
+Every RazorpayPaymentService in a process shares one ``razorpay.Client`` whose
+``requests`` session:
+
+- keeps up to RAZORPAY_POOL_SIZE keep-alive connections per host;
+- applies RAZORPAY_TIMEOUT to every call that does not pass its own;
+- goes through a circuit breaker.  After RAZORPAY_BREAKER_FAILURES
+  consecutive connection errors, timeouts or 5xx responses, calls fail
+  immediately with CircuitOpenError for RAZORPAY_BREAKER_RESET_SECONDS.
+  After that one trial call decides whether the breaker closes again;
+- records latency and outcome for ``gateway_metrics()``.
+
+CircuitOpenError subclasses requests' ConnectionError, so existing
+transient-error handling (e.g. the payment-command outbox) retries it later.
+"""
+import os
+import threading
+import time
+from collections import Counter, deque
+
+import razorpay
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+# Latencies kept for percentile calculation
+METRICS_WINDOW = 1000
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """The gateway is failing; the call was not attempted."""
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker: closed → open → half-open → closed."""
+
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state()
+
+    def _state(self):
+        if self._opened_at is None:
+            return 'closed'
+        if time.monotonic() - self._opened_at >= self.reset_timeout:
+            return 'half_open'
+        return 'open'
+
+    def before_call(self):
+        """Raise CircuitOpenError unless a call may go through now."""
+        with self._lock:
+            state = self._state()
+            if state == 'closed':
+                return
+            if state == 'half_open' and not self._trial_in_flight:
+                # Let exactly one trial call through to probe the gateway
+                self._trial_in_flight = True
+                return
+        raise CircuitOpenError('Razorpay circuit breaker is open — gateway recently failing')
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial_in_flight or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+    def release_trial(self):
+        """End a call that neither succeeded nor failed, so a later one may probe again."""
+        with self._lock:
+            self._trial_in_flight = False
+
+
+class GatewayMetrics:
+    """Thread-safe counters and a sliding window of request latencies."""
+
+    def __init__(self, window=METRICS_WINDOW):
+        self._lock = threading.Lock()
+        self.outcomes = Counter()
+        self.latencies = deque(maxlen=window)
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def start(self):
+        with self._lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+    def finish(self, outcome, seconds):
+        with self._lock:
+            self.in_flight -= 1
+            self.outcomes[outcome] += 1
+            if seconds is not None:
+                self.latencies.append(seconds)
+
+    def rejected(self):
+        with self._lock:
+            self.outcomes['circuit_open'] += 1
+
+    def snapshot(self):
+        with self._lock:
+            latencies = sorted(self.latencies)
+            data = {
+                'requests': dict(self.outcomes),
+                'in_flight': self.in_flight,
+                'max_in_flight': self.max_in_flight,
+            }
+        if latencies:
+            def percentile(p):
+                return round(latencies[max(int(len(latencies) * p / 100 + 0.5) - 1, 0)] * 1000, 1)
+            data['latency_ms'] = {
+                'p50': percentile(50), 'p95': percentile(95), 'p99': percentile(99),
+                'max': round(latencies[-1] * 1000, 1), 'samples': len(latencies),
+            }
+        return data
+
+
+class GatewaySession(requests.Session):
+    """requests.Session with default timeouts, a circuit breaker and metrics."""
+
+    def __init__(self, timeout, pool_size, breaker, metrics):
+        super().__init__()
+        self.default_timeout = timeout
+        self.breaker = breaker
+        self.metrics = metrics
+        # No urllib3-level retries: retrying is the caller's decision
+        self.adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.mount('https://', self.adapter)
+        self.mount('http://', self.adapter)
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', self.default_timeout)
+        try:
+            self.breaker.before_call()
+        except CircuitOpenError:
+            self.metrics.rejected()
+            raise
+
+        self.metrics.start()
+        started = time.perf_counter()
+        try:
+            response = super().request(method, url, **kwargs)
+        except requests.exceptions.Timeout:
+            self.breaker.record_failure()
+            self.metrics.finish('timeout', time.perf_counter() - started)
+            raise
+        except requests.exceptions.RequestException:
+            self.breaker.record_failure()
+            self.metrics.finish('connection_error', time.perf_counter() - started)
+            raise
+        except BaseException:
+            # Not the gateway's fault (a bug, KeyboardInterrupt…), but a
+            # half-open trial must not stay in flight forever
+            self.breaker.release_trial()
+            self.metrics.finish('error', time.perf_counter() - started)
+            raise
+
+        elapsed = time.perf_counter() - started
+        if response.status_code >= 500:
+            self.breaker.record_failure()
+            self.metrics.finish('server_error', elapsed)
+        else:
+            # 4xx means the gateway is healthy and rejected the request itself
+            self.breaker.record_success()
+            self.metrics.finish('ok' if response.status_code < 400 else 'client_error', elapsed)
+        return response
+
+    def pool_stats(self):
+        """Open and idle keep-alive connections per host."""
+        stats = []
+        pools = self.adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            idle = sum(1 for conn in list(pool.pool.queue) if conn is not None) if pool.pool else 0
+            stats.append({
+                'host': f'{pool.scheme}://{pool.host}:{pool.port}',
+                'connections_opened': pool.num_connections,
+                'requests': pool.num_requests,
+                'idle': idle,
+                'max_size': pool.pool.maxsize if pool.pool else 0,
+            })
+        return stats
+
+
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+
+def _build_client():
+    session = GatewaySession(
+        timeout=getattr(settings, 'RAZORPAY_TIMEOUT', (3.05, 10)),
+        pool_size=getattr(settings, 'RAZORPAY_POOL_SIZE', 10),
+        breaker=CircuitBreaker(
+            failure_threshold=getattr(settings, 'RAZORPAY_BREAKER_FAILURES', 5),
+            reset_timeout=getattr(settings, 'RAZORPAY_BREAKER_RESET_SECONDS', 30),
+        ),
+        metrics=GatewayMetrics(),
+    )
+    return razorpay.Client(
+        session=session,
+        auth=(settings.RAZORPAY_KEY_ID, settings.RAZORPAY_KEY_SECRET),
+        base_url=getattr(settings, 'RAZORPAY_API_BASE_URL', 'https://api.razorpay.com'),
+    )
+
+
+def get_razorpay_client():
+    """Return this process's shared razorpay.Client, creating it on first use."""
+    global _client, _client_pid
+    pid = os.getpid()
+    if _client is None or _client_pid != pid:
+        with _client_lock:
+            # Forked workers must not share the parent's sockets
+            if _client is None or _client_pid != pid:
+                _client = _build_client()
+                _client_pid = pid
+    return _client
+
+
+def reset_razorpay_client():
+    """Drop the shared client, e.g. after changing Razorpay settings."""
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.session.close()
+        _client = None
+
+
+def gateway_metrics():
+    """Latency, outcome, breaker and connection-pool figures for this process."""
+    session = get_razorpay_client().session
+    data = session.metrics.snapshot()
+    data['circuit_breaker'] = session.breaker.state
+    data['pool'] = session.pool_stats()
+    data['pid'] = os.getpid()
+    return data
@@ -0,0 +1,152 @@
+"""
+Idempotency keys for payment endpoints.
+
+A view wrapped in ``@idempotent(scope)`` runs at most once per key.  The key
+is derived from the request itself by ``request_key(request)`` (e.g. the hold
+id) so every client is covered; requests without one fall back to the
+client's ``Idempotency-Key`` header.  Repeats of the same key get
+the stored response back without touching the database or the gateway
+again.  A repeat that arrives while the first request is still running waits
+briefly for its result.
+
+Only 2xx responses are stored.  Errors and exceptions are not, so the client
+can retry them: a rejected ``payment_success`` callback must not block a later
+valid one for the same order.
+Entries expire after IDEMPOTENCY_KEY_TTL_HOURS and are removed in bulk by
+``purge_expired_keys`` / ``manage.py purge_idempotency_keys``.
+"""
+import hashlib
+import json
+import time
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse, JsonResponse
+from django.utils import timezone
+
+from .models import IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+
+# How often a repeated request re-checks an in-progress original
+POLL_INTERVAL = 0.1
+
+
+def _digest(*parts):
+    return hashlib.sha256('|'.join(str(part) for part in parts).encode()).hexdigest()
+
+
+def json_body_key(field):
+    """Request key taken from a field of the JSON request body."""
+    def key_from_body(request):
+        try:
+            value = json.loads(request.body).get(field)
+        except (ValueError, AttributeError):
+            return None
+        return f'{field}:{value}' if value else None
+    return key_from_body
+
+
+def _claim(key, scope, user, request_hash):
+    """Insert a 'processing' entry.  Returns (entry, created)."""
+    ttl = timedelta(hours=getattr(settings, 'IDEMPOTENCY_KEY_TTL_HOURS', 24))
+    for _ in range(2):
+        try:
+            with transaction.atomic():
+                return IdempotencyKey.objects.create(
+                    key=key, scope=scope, user=user, request_hash=request_hash,
+                    expires_at=timezone.now() + ttl,
+                ), True
+        except IntegrityError:
+            # Drop an expired entry and try again; otherwise someone else owns the key
+            if not IdempotencyKey.objects.filter(key=key, expires_at__lt=timezone.now()).delete()[0]:
+                return IdempotencyKey.objects.filter(key=key).first(), False
+    return IdempotencyKey.objects.filter(key=key).first(), False
+
+
+def _wait_for(entry):
+    """Poll an in-progress entry until it completes or the wait budget runs out."""
+    deadline = time.monotonic() + getattr(settings, 'IDEMPOTENCY_WAIT_SECONDS', 5)
+    while entry is not None and entry.status == 'processing' and time.monotonic() < deadline:
+        time.sleep(POLL_INTERVAL)
+        entry = IdempotencyKey.objects.filter(pk=entry.pk).first()
+    return entry
+
+
+def _replay(entry):
+    response = HttpResponse(
+        entry.response_body, status=entry.response_status, content_type=entry.response_content_type,
+    )
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def idempotent(scope, request_key=None, still_valid=None):
+    """
+    Make a POST view idempotent per (scope, user, key).
+
+    ``still_valid(status, data)`` may reject a stored response whose
+    resources no longer exist; the request is then processed afresh.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            token = request_key(request) if request_key is not None else None
+            if not token:
+                token = request.headers.get(HEADER, '').strip()[:255]
+            if not token:
+                return view_func(request, *args, **kwargs)
+
+            key = _digest(scope, request.user.pk, token)
+            request_hash = _digest(request.body)
+            entry, created = _claim(key, scope, request.user, request_hash)
+
+            if not created:
+                entry = _wait_for(entry)
+                if entry is not None and entry.request_hash != request_hash:
+                    return JsonResponse(
+                        {'error': 'A different request was already made with this idempotency key'}, status=422,
+                    )
+                if entry is not None and entry.status == 'processing':
+                    response = JsonResponse({'error': 'The original request is still being processed'}, status=409)
+                    response['Retry-After'] = '1'
+                    return response
+                if entry is not None:
+                    try:
+                        data = json.loads(entry.response_body)
+                    except ValueError:
+                        data = None
+                    if still_valid is None or still_valid(entry.response_status, data):
+                        return _replay(entry)
+                    entry.delete()
+                # The stored result is gone or stale — run the request as the new owner
+                entry, created = _claim(key, scope, request.user, request_hash)
+                if not created:
+                    return JsonResponse({'error': 'The original request is still being processed'}, status=409)
+
+            try:
+                response = view_func(request, *args, **kwargs)
+            except Exception:
+                entry.delete()
+                raise
+
+            if not 200 <= response.status_code < 300 or getattr(response, 'streaming', False):
+                entry.delete()
+            else:
+                entry.status = 'completed'
+                entry.response_status = response.status_code
+                entry.response_body = response.content.decode(response.charset)
+                entry.response_content_type = response.get('Content-Type', '')
+                entry.save(update_fields=[
+                    'status', 'response_status', 'response_body', 'response_content_type',
+                ])
+            return response
+        return wrapper
+    return decorator
+
+
+def purge_expired_keys():
+    """Delete every expired entry in one statement.  Returns the number removed."""
+    return IdempotencyKey.objects.filter(expires_at__lt=timezone.now()).delete()[0]
@@ -0,0 +1,246 @@
+"""
+Append-only double-entry ledger for payments, commission and owner payouts.
+
+Every money movement posts one journal — a group of LedgerEntry rows that
+sum to zero (debits positive, credits negative):
+
+    capture   gateway +A       owner_payable −(A − c)   commission −c
+    refund    the capture journal negated
+    payout    owner_payable +P gateway −P
+
+Commission ``c`` is computed once, at capture time, from
+PLATFORM_COMMISSION_RATE and stored in the entry, so a later rate change
+never rewrites history.  Each line carries the owner, so earnings,
+commission and balances are indexed sums over the ledger instead of scans
+over Payment joined to Booking and Car.
+
+Postings are idempotent: a payment is captured and refunded at most once,
+so the callers below may safely repeat, concurrently too.  Posting locks the
+payment rows first, and a unique constraint backs that up.
+"""
+import uuid
+from datetime import timedelta
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from .models import LedgerEntry, Payment, Payout
+
+ZERO = Decimal('0.00')
+CENT = Decimal('0.01')
+
+
+def commission_rate():
+    return Decimal(str(getattr(settings, 'PLATFORM_COMMISSION_RATE', 0.1)))
+
+
+def _split(amount, rate):
+    """(commission, owner share) of amount."""
+    commission = (amount * rate).quantize(CENT, rounding=ROUND_HALF_UP)
+    return commission, amount - commission
+
+
+# ──────────────────────────────────────────────
+# Posting — call inside the transaction that changes the payment
+# ──────────────────────────────────────────────
+
+def _lock_payments(payment_ids):
+    # Concurrent posters for the same payment wait here, then see its entries
+    list(Payment.objects.select_for_update().filter(id__in=payment_ids).order_by('id').values_list('id', flat=True))
+
+
+@transaction.atomic
+def post_captures(payment_ids, backfill=False):
+    """
+    Post a capture journal for each payment not yet captured in the ledger.
+    ``backfill`` dates the entries at the payment's creation instead of now.
+    Returns the number of journals posted.
+    """
+    _lock_payments(payment_ids)
+    rows = (
+        Payment.objects.filter(id__in=payment_ids)
+        .exclude(ledger_entries__kind='capture')
+        .values('id', 'amount', 'created_at', 'booking__car__owner_id')
+    )
+    rate = commission_rate()
+    now = timezone.now()
+    entries = []
+    for row in rows:
+        commission, owner_share = _split(row['amount'], rate)
+        common = {
+            'journal': uuid.uuid4(),
+            'kind': 'capture',
+            'owner_id': row['booking__car__owner_id'],
+            'payment_id': row['id'],
+            'created_at': row['created_at'] if backfill else now,
+        }
+        entries += [
+            LedgerEntry(account='gateway', amount=row['amount'], **common),
+            LedgerEntry(account='owner_payable', amount=-owner_share, **common),
+            LedgerEntry(account='commission', amount=-commission, **common),
+        ]
+    LedgerEntry.objects.bulk_create(entries)
+    return len(entries) // 3
+
+
+@transaction.atomic
+def post_refunds(payment_ids, backfill=False):
+    """
+    Reverse the capture journal of each refunded payment not yet reversed.
+    ``backfill`` dates the entries at the payment's last update instead of now.
+    Returns the number of journals posted.
+    """
+    _lock_payments(payment_ids)
+    captures = (
+        LedgerEntry.objects.filter(payment_id__in=payment_ids, kind='capture')
+        .exclude(payment__ledger_entries__kind='refund')
+        .select_related('payment')
+        .order_by('payment_id', 'id')
+    )
+    now = timezone.now()
+    entries = []
+    journals = {}
+    for capture in captures:
+        journal = journals.setdefault(capture.payment_id, uuid.uuid4())
+        entries.append(LedgerEntry(
+            journal=journal,
+            kind='refund',
+            account=capture.account,
+            amount=-capture.amount,
+            owner_id=capture.owner_id,
+            payment_id=capture.payment_id,
+            created_at=capture.payment.updated_at if backfill else now,
+        ))
+    LedgerEntry.objects.bulk_create(entries)
+    return len(journals)
+
+
+# ──────────────────────────────────────────────
+# Payouts
+# ──────────────────────────────────────────────
+
+def _owner_balance(owner_id, until):
+    """What the platform owes owner_id for activity up to ``until`` (positive = owed)."""
+    # Earlier payouts always count, whatever their date, so a re-run never pays twice
+    total = LedgerEntry.objects.filter(owner_id=owner_id, account='owner_payable').filter(
+        Q(created_at__lte=until) | Q(kind='payout'),
+    ).aggregate(total=Sum('amount'))['total']
+    return -(total or ZERO).quantize(CENT)
+
+
+def create_payouts(until=None, min_amount=ZERO):
+    """
+    Create a Payout, and its ledger journal, for every owner owed more than
+    min_amount for activity up to ``until`` (default now).  Returns the payouts.
+    """
+    until = until or timezone.now()
+    owner_ids = (
+        LedgerEntry.objects.filter(account='owner_payable', owner__isnull=False, created_at__lte=until)
+        # order_by() drops Meta.ordering, which would otherwise join DISTINCT
+        .values_list('owner_id', flat=True).order_by().distinct()
+    )
+    payouts = []
+    for owner_id in owner_ids:
+        with transaction.atomic():
+            # Serialises concurrent payout runs for the same owner
+            get_user_model().objects.select_for_update().filter(id=owner_id).first()
+            amount = _owner_balance(owner_id, until)
+            if amount <= min_amount:
+                continue
+            payout = Payout.objects.create(owner_id=owner_id, amount=amount, period_end=until)
+            common = {'journal': uuid.uuid4(), 'kind': 'payout', 'owner_id': owner_id, 'payout': payout}
+            LedgerEntry.objects.bulk_create([
+                LedgerEntry(account='owner_payable', amount=amount, **common),
+                LedgerEntry(account='gateway', amount=-amount, **common),
+            ])
+            payouts.append(payout)
+    return payouts
+
+
+# ──────────────────────────────────────────────
+# Totals — indexed sums over the ledger
+# ──────────────────────────────────────────────
+
+def _totals(entries):
+    sums = {
+        (row['account'], row['kind']): (row['total'], row['n'])
+        for row in entries.values('account', 'kind').annotate(total=Sum('amount'), n=Count('id')).order_by()
+    }
+
+    def amount(account, kind):
+        return sums.get((account, kind), (ZERO, 0))[0].quantize(CENT)
+
+    gross = amount('gateway', 'capture')
+    refunded = -amount('gateway', 'refund')
+    owner_share = -(amount('owner_payable', 'capture') + amount('owner_payable', 'refund'))
+    paid_out = amount('owner_payable', 'payout')
+    return {
+        'gross': gross,
+        'refunded': refunded,
+        'refund_count': sums.get(('gateway', 'refund'), (ZERO, 0))[1],
+        'net': gross - refunded,
+        'commission': -(amount('commission', 'capture') + amount('commission', 'refund')),
+        'owner_share': owner_share,
+        'paid_out': paid_out,
+        'balance_due': owner_share - paid_out,
+    }
+
+
+def platform_totals(since=None):
+    """Gross captured, refunded, net, commission and payout figures for the whole platform."""
+    entries = LedgerEntry.objects.all()
+    if since is not None:
+        entries = entries.filter(created_at__gte=since)
+    return _totals(entries)
+
+
+def owner_totals(owner, since=None, booking_statuses=None):
+    """
+    The same figures for one owner's cars, optionally only for payments
+    whose booking is in one of ``booking_statuses`` (payouts then drop out).
+    """
+    entries = LedgerEntry.objects.filter(owner=owner)
+    if since is not None:
+        entries = entries.filter(created_at__gte=since)
+    if booking_statuses is not None:
+        entries = entries.filter(payment__booking__status__in=booking_statuses)
+    return _totals(entries)
+
+
+def month_starts(months):
+    """First day of each of the last ``months`` calendar months, oldest first."""
+    first = timezone.localdate().replace(day=1)
+    starts = [first]
+    for _ in range(months - 1):
+        first = (first - timedelta(days=1)).replace(day=1)
+        starts.append(first)
+    return list(reversed(starts))
+
+
+def monthly_totals(months=6, owner=None):
+    """
+    {month start: {'net': …, 'commission': …}} for the last ``months``
+    calendar months, zero-filled.  Net is captured minus refunded.
+    """
+    starts = month_starts(months)
+    entries = LedgerEntry.objects.filter(
+        account__in=('gateway', 'commission'),
+        kind__in=('capture', 'refund'),
+        created_at__date__gte=starts[0],
+    )
+    if owner is not None:
+        entries = entries.filter(owner=owner)
+
+    result = {start: {'net': ZERO, 'commission': ZERO} for start in starts}
+    rows = entries.annotate(month=TruncMonth('created_at')).values('month', 'account').annotate(total=Sum('amount'))
+    for row in rows.order_by():
+        month = row['month'].date() if hasattr(row['month'], 'date') else row['month']
+        if month in result:
+            key = 'net' if row['account'] == 'gateway' else 'commission'
+            result[month][key] += (row['total'] if key == 'net' else -row['total']).quantize(CENT)
+    return result
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from apps.payments.ledger import post_captures, post_refunds
+from apps.payments.models import Payment
+
+
+class Command(BaseCommand):
+    help = 'Post ledger journals for completed and refunded payments that predate the ledger.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Payments posted per batch.')
+
+    def handle(self, *args, **options):
+        ids = list(
+            Payment.objects.filter(status__in=('completed', 'refunded'))
+            .exclude(ledger_entries__kind='capture')
+            .order_by('id').values_list('id', flat=True)
+        )
+        size = options['batch_size']
+        captures = sum(post_captures(ids[i:i + size], backfill=True) for i in range(0, len(ids), size))
+        # After the captures, so every refunded payment has a journal to reverse
+        refunded = list(
+            Payment.objects.filter(status='refunded')
+            .exclude(ledger_entries__kind='refund')
+            .order_by('id').values_list('id', flat=True)
+        )
+        refunds = sum(post_refunds(refunded[i:i + size], backfill=True) for i in range(0, len(refunded), size))
+        self.stdout.write(self.style.SUCCESS(f'Posted {captures} capture and {refunds} refund journals'))
@@ -0,0 +1,273 @@
+import random
+import time
+import uuid
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+from math import ceil
+from urllib.parse import urlparse
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client
+from django.urls import resolve, reverse
+from django.utils import timezone
+
+from apps.bookings.models import Booking
+from apps.cars.models import Car
+from apps.payments.fake_gateway import FakeRazorpay, start_in_thread
+from apps.payments.models import LedgerEntry, Payment, PaymentCommand, Payout, WebhookEvent
+from apps.payments.webhooks import process_event
+
+STEPS = ('hold', 'initiate', 'gateway', 'success', 'accept')
+
+
+def _percentile(values, percent):
+    ordered = sorted(values)
+    return ordered[max(ceil(len(ordered) * percent / 100) - 1, 0)]
+
+
+def _client_host():
+    """A host the test client can use without tripping ALLOWED_HOSTS."""
+    for host in settings.ALLOWED_HOSTS:
+        if host != '*' and not host.startswith('.'):
+            return host
+    return 'localhost'
+
+
+class Command(BaseCommand):
+    help = (
+        'Drive hold → order → payment → owner accept for many concurrent simulated users '
+        'against an in-process fake Razorpay, then report throughput, latency percentiles '
+        'and any double-booked cars. Requires RAZORPAY_API_BASE_URL to point at localhost.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50, help='Simulated customers (one checkout each).')
+        parser.add_argument('--cars', type=int, default=5, help='Cars they compete for.')
+        parser.add_argument('--concurrency', type=int, default=10, help='Checkouts running at once.')
+        parser.add_argument('--window-days', type=int, default=30, help='Spread of rental start dates.')
+        parser.add_argument('--seed', type=int, default=None, help='Random seed for repeatable runs.')
+        parser.add_argument('--latency-ms', type=float, default=0, help='Fake gateway latency per API call.')
+        parser.add_argument('--keep', action='store_true', help='Keep the generated users, cars and bookings.')
+
+    def handle(self, *args, **options):
+        base_url = urlparse(getattr(settings, 'RAZORPAY_API_BASE_URL', ''))
+        if base_url.hostname not in ('127.0.0.1', 'localhost'):
+            raise CommandError(
+                'Refusing to load test the real gateway: set RAZORPAY_API_BASE_URL to a '
+                'free local port, e.g. http://127.0.0.1:9000'
+            )
+        if not (settings.RAZORPAY_KEY_SECRET and settings.RAZORPAY_WEBHOOK_SECRET):
+            raise CommandError('RAZORPAY_KEY_SECRET and RAZORPAY_WEBHOOK_SECRET must be set.')
+
+        self.random = random.Random(options['seed'])
+        self.host = _client_host()
+        self.event_ids = []
+        self.fake = FakeRazorpay(
+            key_secret=settings.RAZORPAY_KEY_SECRET,
+            webhook_secret=settings.RAZORPAY_WEBHOOK_SECRET,
+            deliver=self._deliver_webhook,
+            latency=options['latency_ms'] / 1000,
+        )
+        server = start_in_thread(self.fake, base_url.hostname, base_url.port or 80)
+
+        prefix = f'loadtest_{uuid.uuid4().hex[:6]}_'
+        owner, cars, users = self._create_fixtures(prefix, options['cars'], options['users'])
+        plans = [self._plan(user, cars, options['window_days']) for user in users]
+
+        self.stdout.write(
+            f'Running {len(plans)} checkouts on {len(cars)} cars with concurrency {options["concurrency"]}…'
+        )
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+            results = list(pool.map(lambda plan: self._checkout(owner, *plan), plans))
+        elapsed = time.perf_counter() - started
+
+        self.fake.wait_for_webhooks()
+        webhook_started = time.perf_counter()
+        webhooks = WebhookEvent.objects.filter(event_id__in=self.event_ids, status='pending')
+        processed = sum(process_event(event) for event in webhooks.order_by('event_created_at', 'id'))
+        webhook_elapsed = time.perf_counter() - webhook_started
+
+        try:
+            self._report(results, elapsed, processed, webhook_elapsed, cars)
+        finally:
+            server.shutdown()
+            if not options['keep']:
+                self._cleanup(prefix)
+
+    # ── Fixtures ─────────────────────────────────
+
+    def _create_fixtures(self, prefix, car_count, user_count):
+        User = get_user_model()
+        owner = User.objects.create_user(
+            username=f'{prefix}owner', email=f'{prefix}owner@example.com', password=None, role='owner',
+        )
+        cars = [
+            Car.objects.create(
+                owner=owner, name=f'Load Test Car {i + 1}', brand='Test', location='Test City',
+                price_per_day=Decimal('1500.00'), seats=5, status='approved',
+            )
+            for i in range(car_count)
+        ]
+        users = [
+            User.objects.create_user(
+                username=f'{prefix}user{i}', email=f'{prefix}user{i}@example.com', password=None, role='user',
+            )
+            for i in range(user_count)
+        ]
+        return owner, cars, users
+
+    def _plan(self, user, cars, window_days):
+        start = timezone.now().date() + timedelta(days=7 + self.random.randint(0, window_days))
+        end = start + timedelta(days=self.random.randint(0, 2))
+        return user, self.random.choice(cars), start, end
+
+    def _cleanup(self, prefix):
+        User = get_user_model()
+        PaymentCommand.objects.filter(booking__user__username__startswith=prefix).delete()
+        WebhookEvent.objects.filter(event_id__in=self.event_ids).delete()
+        # A queryset delete bypasses LedgerEntry.delete(), which refuses single entries
+        LedgerEntry.objects.filter(owner__username__startswith=prefix).delete()
+        Payout.objects.filter(owner__username__startswith=prefix).delete()
+        # Cascades to cars, holds, bookings, payments and notifications
+        User.objects.filter(username__startswith=prefix).delete()
+
+    # ── One simulated customer ───────────────────
+
+    def _deliver_webhook(self, body, headers):
+        self.event_ids.append(headers['X-Razorpay-Event-Id'])
+        try:
+            Client(HTTP_HOST=self.host).post(
+                reverse('razorpay_webhook'), body, content_type='application/json',
+                HTTP_X_RAZORPAY_SIGNATURE=headers['X-Razorpay-Signature'],
+                HTTP_X_RAZORPAY_EVENT_ID=headers['X-Razorpay-Event-Id'],
+            )
+        finally:
+            connections.close_all()
+
+    def _timed(self, timings, step, func):
+        started = time.perf_counter()
+        try:
+            return func()
+        finally:
+            timings[step] = time.perf_counter() - started
+
+    def _checkout(self, owner, user, car, start, end):
+        timings = {}
+        try:
+            return self._run_checkout(timings, owner, user, car, start, end), timings
+        except Exception as e:
+            return f'error: {type(e).__name__}: {e}', timings
+        finally:
+            # Each worker thread has its own DB connections
+            connections.close_all()
+
+    def _run_checkout(self, timings, owner, user, car, start, end):
+        client = Client(HTTP_HOST=self.host)
+        client.force_login(user)
+
+        response = self._timed(timings, 'hold', lambda: client.post(
+            reverse('create_booking', args=[car.id]),
+            {'start_date': start.isoformat(), 'end_date': end.isoformat()},
+        ))
+        if response.status_code != 302:
+            return 'dates taken (hold)'
+        hold_id = resolve(urlparse(response['Location']).path).kwargs['hold_id']
+
+        response = self._timed(timings, 'initiate', lambda: client.post(
+            reverse('initiate_payment'), {'hold_id': hold_id}, content_type='application/json',
+        ))
+        if response.status_code in (400, 404, 409):
+            return 'dates taken (initiate)'
+        if response.status_code != 200:
+            return f'error: initiate_payment {response.status_code}'
+        order = response.json()
+
+        checkout = self._timed(timings, 'gateway', lambda: self.fake.checkout(order['order_id']))
+
+        response = self._timed(timings, 'success', lambda: client.post(
+            reverse('razorpay_payment_success'), checkout, content_type='application/json',
+        ))
+        if response.status_code != 200:
+            return f'error: payment_success {response.status_code}'
+
+        owner_client = Client(HTTP_HOST=self.host)
+        owner_client.force_login(owner)
+        self._timed(timings, 'accept', lambda: owner_client.post(
+            reverse('accept_booking', args=[order['booking_id']]),
+        ))
+        if Booking.objects.filter(id=order['booking_id'], status='confirmed').exists():
+            return 'confirmed'
+        return 'error: accept did not confirm'
+
+    # ── Report ───────────────────────────────────
+
+    def _report(self, results, elapsed, webhooks_processed, webhook_elapsed, cars):
+        outcomes = Counter(outcome for outcome, _ in results)
+        confirmed = outcomes.get('confirmed', 0)
+
+        self.stdout.write('')
+        self.stdout.write(f'Wall time          : {elapsed:.2f}s')
+        self.stdout.write(f'Checkouts attempted: {len(results)} ({len(results) / elapsed:.1f}/s)')
+        self.stdout.write(f'Bookings confirmed : {confirmed} ({confirmed / elapsed:.1f}/s)')
+        for outcome, count in outcomes.most_common():
+            if outcome != 'confirmed':
+                self.stdout.write(f'  {outcome}: {count}')
+
+        self.stdout.write('')
+        self.stdout.write(f'{"step":<10}{"n":>6}{"p50 ms":>10}{"p95 ms":>10}{"p99 ms":>10}{"max ms":>10}')
+        for step in STEPS:
+            values = [timings[step] * 1000 for _, timings in results if step in timings]
+            if values:
+                self.stdout.write(
+                    f'{step:<10}{len(values):>6}{_percentile(values, 50):>10.1f}{_percentile(values, 95):>10.1f}'
+                    f'{_percentile(values, 99):>10.1f}{max(values):>10.1f}'
+                )
+        self.stdout.write(
+            f'Webhooks           : {len(self.event_ids)} received, {webhooks_processed} processed '
+            f'in {webhook_elapsed:.2f}s'
+        )
+
+        problems = self._double_bookings(cars) + self._payment_mismatches(cars)
+        self.stdout.write('')
+        if problems:
+            for problem in problems:
+                self.stdout.write(self.style.ERROR(problem))
+        else:
+            self.stdout.write(self.style.SUCCESS('No double bookings or payment mismatches.'))
+
+    def _double_bookings(self, cars):
+        """Blocking bookings whose inclusive date ranges overlap on the same car."""
+        by_car = defaultdict(list)
+        blocking = Booking.objects.filter(car__in=cars).order_by('car_id', 'start_date', 'id')
+        for booking in blocking:
+            if booking.is_blocking:
+                by_car[booking.car_id].append(booking)
+
+        problems = []
+        for car_bookings in by_car.values():
+            latest = None
+            for booking in car_bookings:
+                if latest is not None and booking.start_date <= latest.end_date:
+                    problems.append(
+                        f'Double booking on car {booking.car_id}: #{latest.id} '
+                        f'({latest.start_date}–{latest.end_date}) and #{booking.id} '
+                        f'({booking.start_date}–{booking.end_date})'
+                    )
+                if latest is None or booking.end_date > latest.end_date:
+                    latest = booking
+        return problems
+
+    def _payment_mismatches(self, cars):
+        """Paid bookings without a completed payment, or the other way round."""
+        paid = set(Booking.objects.filter(car__in=cars, payment_status='paid').values_list('id', flat=True))
+        completed = set(
+            Payment.objects.filter(booking__car__in=cars, status='completed').values_list('booking_id', flat=True)
+        )
+        return [f'Booking #{booking_id}: payment_status and Payment.status disagree'
+                for booking_id in sorted(paid ^ completed)]
@@ -0,0 +1,35 @@
+from decimal import Decimal, InvalidOperation
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from apps.payments.ledger import create_payouts
+
+
+class Command(BaseCommand):
+    help = 'Schedule a payout for every owner with a positive ledger balance.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--until', default=None, help='Cover ledger activity up to this ISO datetime (default now).')
+        parser.add_argument('--min-amount', default='0', help='Skip owners owed this much or less (default 0).')
+
+    def handle(self, *args, **options):
+        until = None
+        if options['until']:
+            until = parse_datetime(options['until'])
+            if until is None:
+                raise CommandError(f"Cannot parse --until {options['until']!r}")
+            if timezone.is_naive(until):
+                until = timezone.make_aware(until)
+        try:
+            min_amount = Decimal(options['min_amount'])
+        except InvalidOperation:
+            raise CommandError(f"Invalid --min-amount {options['min_amount']!r}")
+
+        payouts = create_payouts(until=until, min_amount=min_amount)
+        for payout in payouts:
+            self.stdout.write(f'  Payout #{payout.id}: owner {payout.owner_id} ₹{payout.amount}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Scheduled {len(payouts)} payouts totalling ₹{sum(p.amount for p in payouts)}'
+        ))
@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.payments.outbox import dispatch_payment_commands
+
+
+class Command(BaseCommand):
+    help = (
+        'Perform queued Razorpay API calls (refunds) outside of any database transaction. '
+        'Runs forever, polling every --interval seconds, unless --once is given.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Run due commands once and exit.')
+        parser.add_argument('--interval', type=float, default=1.0, help='Seconds between polls (default 1).')
+        parser.add_argument('--batch-size', type=int, default=None, help='Commands claimed per batch.')
+        parser.add_argument('--workers', type=int, default=None, help='Commands run at once (default PAYMENT_COMMAND_WORKERS).')
+
+    def handle(self, *args, **options):
+        while True:
+            succeeded, failed = dispatch_payment_commands(
+                batch_size=options['batch_size'], workers=options['workers'],
+            )
+            if succeeded or failed:
+                self.stdout.write(f'Succeeded {succeeded}, failed {failed}')
+            if options['once']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,44 @@
+from urllib.parse import urlparse
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.payments.fake_gateway import FakeRazorpay, make_server
+
+
+class Command(BaseCommand):
+    help = (
+        'Run a local stand-in for the Razorpay API on the host/port of RAZORPAY_API_BASE_URL. '
+        'Webhooks are signed with RAZORPAY_WEBHOOK_SECRET and POSTed to --webhook-url.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--webhook-url', default='http://127.0.0.1:8000/payments/webhook/',
+                            help='Where to deliver webhooks (empty to disable).')
+        parser.add_argument('--latency-ms', type=float, default=0, help='Delay added to every API call.')
+        parser.add_argument('--error-rate', type=float, default=0, help='Fraction of API calls answered with a 5xx.')
+
+    def handle(self, *args, **options):
+        base_url = urlparse(getattr(settings, 'RAZORPAY_API_BASE_URL', ''))
+        if base_url.hostname not in ('127.0.0.1', 'localhost'):
+            raise CommandError(
+                'RAZORPAY_API_BASE_URL must point at localhost, e.g. http://127.0.0.1:9000'
+            )
+        if not settings.RAZORPAY_KEY_SECRET:
+            raise CommandError('RAZORPAY_KEY_SECRET must be set so payment signatures can be verified.')
+
+        fake = FakeRazorpay(
+            key_secret=settings.RAZORPAY_KEY_SECRET,
+            webhook_secret=settings.RAZORPAY_WEBHOOK_SECRET,
+            webhook_url=options['webhook_url'] or None,
+            latency=options['latency_ms'] / 1000,
+            error_rate=options['error_rate'],
+        )
+        server = make_server(fake, base_url.hostname, base_url.port or 80)
+        self.stdout.write(f'Fake Razorpay listening on {settings.RAZORPAY_API_BASE_URL}')
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
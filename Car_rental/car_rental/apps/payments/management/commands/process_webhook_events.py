@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.payments.webhooks import process_webhook_events
+
+
+class Command(BaseCommand):
+    help = (
+        'Apply stored Razorpay webhook events in event-time order. '
+        'Runs forever, polling every --interval seconds, unless --once is given.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Process pending events once and exit.')
+        parser.add_argument('--interval', type=float, default=1.0, help='Seconds between polls (default 1).')
+        parser.add_argument('--batch-size', type=int, default=None, help='Events claimed per batch.')
+
+    def handle(self, *args, **options):
+        while True:
+            processed, failed = process_webhook_events(batch_size=options['batch_size'])
+            if processed or failed:
+                self.stdout.write(f'Processed {processed}, failed {failed}')
+            if options['once']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from apps.payments.idempotency import purge_expired_keys
+
+
+class Command(BaseCommand):
+    help = 'Delete expired idempotency keys for the payment endpoints.'
+
+    def handle(self, *args, **options):
+        deleted = purge_expired_keys()
+        self.stdout.write(f'Deleted {deleted} expired idempotency keys')
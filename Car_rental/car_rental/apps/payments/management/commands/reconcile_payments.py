@@ -0,0 +1,80 @@
+import csv
+import re
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from apps.payments.reconciliation import reconcile_payments
+
+REPORT_FIELDS = (
+    'payment_id', 'booking_id', 'razorpay_order_id', 'razorpay_payment_id',
+    'local_status', 'gateway_status', 'issue', 'detail', 'action',
+)
+
+UNITS = {'m': 'minutes', 'h': 'hours', 'd': 'days'}
+
+
+def _parse_since(value):
+    """'24h', '90m', '7d', an ISO date or an ISO datetime."""
+    match = re.fullmatch(r'(\d+)([mhd])', value)
+    if match:
+        return timezone.now() - timedelta(**{UNITS[match[2]]: int(match[1])})
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise CommandError(f'Cannot parse --since {value!r}; use e.g. 24h, 7d or 2026-01-31')
+        moment = datetime.combine(day, datetime.min.time())
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare pending, failed and completed payments, and the orders of released bookings, '
+        'with Razorpay, correct the drift Razorpay settles unambiguously (lost captures, '
+        'failures and refunds) and write a CSV discrepancy report.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', default='24h', help='Payments created since: 24h, 7d, or an ISO date (default 24h).')
+        parser.add_argument('--workers', type=int, default=8, help='Concurrent gateway requests (default 8).')
+        parser.add_argument('--rate', type=float, default=25, help='Max gateway requests per second (default 25, 0 = unlimited).')
+        parser.add_argument('--chunk-size', type=int, default=500, help='Payments read and corrected per batch.')
+        parser.add_argument('--dry-run', action='store_true', help='Report discrepancies without correcting them.')
+        parser.add_argument('--report', default=None, help='CSV report path (default reconciliation_<timestamp>.csv).')
+
+    def handle(self, *args, **options):
+        since = _parse_since(options['since'])
+        report_path = options['report'] or f'reconciliation_{timezone.now():%Y%m%d_%H%M%S}.csv'
+
+        started = time.perf_counter()
+        checked, corrected, findings = reconcile_payments(
+            since,
+            workers=options['workers'],
+            rate=options['rate'],
+            chunk_size=options['chunk_size'],
+            dry_run=options['dry_run'],
+        )
+        elapsed = time.perf_counter() - started
+
+        with open(report_path, 'w', newline='') as report:
+            writer = csv.DictWriter(report, fieldnames=REPORT_FIELDS)
+            writer.writeheader()
+            writer.writerows(findings)
+
+        self.stdout.write(
+            f'Checked {checked} payments since {since:%Y-%m-%d %H:%M} in {elapsed:.1f}s '
+            f'({checked / elapsed if elapsed else 0:.1f}/s)'
+        )
+        for issue, count in Counter(finding['issue'] for finding in findings).most_common():
+            self.stdout.write(f'  {issue}: {count}')
+        style = self.style.WARNING if findings else self.style.SUCCESS
+        self.stdout.write(style(
+            f'{len(findings)} discrepancies, {corrected} corrected — report written to {report_path}'
+        ))
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.10 on 2026-10-19 09:33
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0008_ledger'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='ledgerentry',
+            name='ledger_unique_payment_posting',
+        ),
+        migrations.AddConstraint(
+            model_name='ledgerentry',
+            constraint=models.UniqueConstraint(fields=('payment', 'kind', 'account'), name='ledger_unique_payment_posting'),
+        ),
+    ]
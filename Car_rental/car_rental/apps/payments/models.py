@@ -25,6 +25,10 @@ class Payment(models.Model):
     
     transaction_id = models.CharField(max_length=100, unique=True, blank=True, null=True)
     payment_method = models.CharField(max_length=50, default='razorpay')
+
+    # Checkout attempts so far (one Razorpay order each), capped by MAX_PAYMENT_RETRY_ATTEMPTS
+    attempts = models.PositiveIntegerField(default=1)
+    next_retry_at = models.DateTimeField(null=True, blank=True)
     
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
@@ -36,6 +40,22 @@ class Payment(models.Model):
         return f"Payment - {self.booking.id} ({self.status})"
 
 
+class PaymentAttempt(models.Model):
+    """A failed checkout attempt — the Razorpay order it used and why it failed."""
+
+    payment = models.ForeignKey(Payment, on_delete=models.CASCADE, related_name='attempt_history')
+    razorpay_order_id = models.CharField(max_length=100, db_index=True)
+    error_code = models.CharField(max_length=100, blank=True)
+    error_description = models.TextField(blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['created_at']
+
+    def __str__(self):
+        return f"Attempt {self.razorpay_order_id} for payment {self.payment_id}"
+
+
 class Refund(models.Model):
     STATUS_CHOICES = (
         ('pending', 'Pending'),
@@ -60,3 +80,250 @@ class Refund(models.Model):
 
     def __str__(self):
         return f"Refund - {self.payment.booking.id} ({self.status})"
+
+
+class WebhookEvent(models.Model):
+    """Razorpay webhook delivery, stored on receipt and applied by the process_webhook_events worker."""
+
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),         # Waiting to be applied
+        ('processing', 'Processing'),   # Claimed by a worker
+        ('processed', 'Processed'),
+        ('failed', 'Failed'),           # Gave up after WEBHOOK_MAX_ATTEMPTS
+    )
+
+    # Razorpay's X-Razorpay-Event-Id — repeated on every retry of the same event
+    event_id = models.CharField(max_length=100, unique=True)
+    event_type = models.CharField(max_length=50)
+    payload = models.JSONField()
+    # When Razorpay created the event (not when it reached us)
+    event_created_at = models.DateTimeField()
+
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    received_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['event_created_at']
+        indexes = [
+            # The worker polls for due pending events in event-time order
+            models.Index(fields=['status', 'event_created_at'], name='webhook_event_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"Webhook {self.event_type} {self.event_id} ({self.status})"
+
+
+class PaymentCommand(models.Model):
+    """
+    Razorpay API call recorded in the same transaction as the change that
+    needs it, then performed outside the transaction (see outbox.py).
+    """
+
+    COMMAND_CHOICES = (
+        ('create_order', 'Create order'),
+        ('create_refund', 'Create refund'),
+    )
+
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),           # Waiting for its next attempt
+        ('dispatching', 'Dispatching'),   # Gateway call in progress
+        ('succeeded', 'Succeeded'),
+        ('failed', 'Failed'),             # Rejected by the gateway or out of attempts
+    )
+
+    command_type = models.CharField(max_length=20, choices=COMMAND_CHOICES)
+    booking = models.ForeignKey(Booking, on_delete=models.SET_NULL, null=True, blank=True, related_name='payment_commands')
+    payment = models.ForeignKey(Payment, on_delete=models.SET_NULL, null=True, blank=True, related_name='commands')
+    refund = models.ForeignKey(Refund, on_delete=models.SET_NULL, null=True, blank=True, related_name='commands')
+
+    # Request body sent to Razorpay and the response it returned
+    payload = models.JSONField()
+    result = models.JSONField(null=True, blank=True)
+
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            # The dispatcher polls for due pending commands
+            models.Index(fields=['status', 'next_attempt_at'], name='payment_command_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.command_type} #{self.id} ({self.status})"
+
+
+class IdempotencyKey(models.Model):
+    """Stored response for a retried or double-submitted payment request (see idempotency.py)."""
+
+    STATUS_CHOICES = (
+        ('processing', 'Processing'),  # First request still running
+        ('completed', 'Completed'),
+    )
+
+    # sha256 of scope, user and client token
+    key = models.CharField(max_length=64, unique=True)
+    scope = models.CharField(max_length=50)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='idempotency_keys')
+    request_hash = models.CharField(max_length=64)
+
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='processing')
+    response_status = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_body = models.TextField(blank=True)
+    response_content_type = models.CharField(max_length=100, blank=True)
+
+    created_at = models.DateTimeField(default=timezone.now)
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"{self.scope} {self.key[:12]} ({self.status})"
+
+
+class RefundBatch(models.Model):
+    """Refunds an admin queued in one go, e.g. for a city-wide closure (see bulk_refunds.py)."""
+
+    STATUS_CHOICES = (
+        ('processing', 'Processing'),   # Some refunds still queued
+        ('completed', 'Completed'),     # Every item processed, failed or skipped; customers notified
+    )
+
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, related_name='refund_batches')
+    reason = models.TextField(blank=True)
+    # Selection the admin submitted — payment ids or filters
+    criteria = models.JSONField(default=dict)
+
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='processing')
+    created_at = models.DateTimeField(default=timezone.now)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Refund batch #{self.id} ({self.status})"
+
+
+class RefundBatchItem(models.Model):
+    """One payment of a RefundBatch and what happened to its refund."""
+
+    STATUS_CHOICES = (
+        ('queued', 'Queued'),         # Refund waiting for the dispatcher
+        ('processed', 'Processed'),
+        ('failed', 'Failed'),         # Rejected by the gateway or out of attempts
+        ('skipped', 'Skipped'),       # Not refundable — see detail
+    )
+
+    batch = models.ForeignKey(RefundBatch, on_delete=models.CASCADE, related_name='items')
+    payment = models.ForeignKey(Payment, on_delete=models.CASCADE, related_name='refund_batch_items')
+    refund = models.OneToOneField(Refund, on_delete=models.SET_NULL, null=True, blank=True, related_name='batch_item')
+
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    detail = models.TextField(blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['batch', 'status'], name='refund_batch_item_status_idx'),
+        ]
+
+    def __str__(self):
+        return f"Batch #{self.batch_id} payment {self.payment_id} ({self.status})"
+
+
+class Payout(models.Model):
+    """Transfer of an owner's accumulated ledger balance, created by `manage.py create_owner_payouts`."""
+
+    STATUS_CHOICES = (
+        ('scheduled', 'Scheduled'),   # Ledger debited; bank transfer still to be made
+        ('paid', 'Paid'),
+    )
+
+    owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, related_name='payouts')
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='scheduled')
+    # Ledger entries up to this moment are covered by the payout
+    period_end = models.DateTimeField()
+    reference = models.CharField(max_length=100, blank=True)
+
+    created_at = models.DateTimeField(default=timezone.now)
+    paid_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Payout #{self.id} to {self.owner_id} ₹{self.amount} ({self.status})"
+
+
+class LedgerEntry(models.Model):
+    """
+    One line of the append-only double-entry ledger (see ledger.py).
+    Debits are positive and credits negative; the entries of a journal sum to zero.
+    """
+
+    ACCOUNT_CHOICES = (
+        ('gateway', 'Gateway cash'),           # Money held at Razorpay / in the platform account
+        ('owner_payable', 'Owed to owner'),    # Owner's share not yet paid out
+        ('commission', 'Platform commission'),
+    )
+
+    KIND_CHOICES = (
+        ('capture', 'Payment captured'),
+        ('refund', 'Payment refunded'),
+        ('payout', 'Owner payout'),
+    )
+
+    journal = models.UUIDField(db_index=True)
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    account = models.CharField(max_length=20, choices=ACCOUNT_CHOICES)
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+
+    # Owner whose car the money is for — set on every line so balances never need a join
+    owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, related_name='ledger_entries')
+    payment = models.ForeignKey(Payment, on_delete=models.SET_NULL, null=True, blank=True, related_name='ledger_entries')
+    payout = models.ForeignKey(Payout, on_delete=models.SET_NULL, null=True, blank=True, related_name='ledger_entries')
+
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['created_at', 'id']
+        indexes = [
+            # Platform totals and monthly charts: SUM(amount) per account / kind over a date range
+            models.Index(fields=['account', 'kind', 'created_at'], name='ledger_account_kind_idx'),
+            # Owner balances, earnings and payouts
+            models.Index(fields=['owner', 'account', 'created_at'], name='ledger_owner_account_idx'),
+        ]
+        constraints = [
+            # A payment is captured and refunded at most once.  Unconditional so
+            # that MySQL, which has no partial indexes, enforces it too; payout
+            # lines have no payment, and NULLs never collide
+            models.UniqueConstraint(
+                fields=['payment', 'kind', 'account'],
+                name='ledger_unique_payment_posting',
+            ),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self.pk is not None:
+            raise ValueError('Ledger entries are append-only; post a reversing journal instead')
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise ValueError('Ledger entries are append-only; post a reversing journal instead')
+
+    def __str__(self):
+        return f"{self.kind} {self.account} {self.amount}"
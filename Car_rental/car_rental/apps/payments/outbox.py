@@ -0,0 +1,338 @@
+"""
+Payment-command outbox.
+
+Razorpay calls are never made while a database transaction is open.  Each
+call goes through three steps:
+
+1. The caller's transaction records a PaymentCommand (and, for refunds, a
+   pending Refund) and commits quickly.
+2. ``run_command`` performs the HTTP call with the client timeout and no
+   transaction open.
+3. A second short transaction applies the gateway's response.
+
+Orders are run inline by ``initiate_payment`` because checkout needs the
+order id.  Refunds are left to the ``dispatch_payment_commands`` worker,
+which runs up to PAYMENT_COMMAND_WORKERS commands at once and retries
+transient gateway errors with exponential backoff.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+
+import requests
+from django.conf import settings
+from django.db import OperationalError, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+from razorpay.errors import GatewayError, ServerError
+
+from apps.notifications.services import create_notification
+from .bulk_refunds import finalize_refund_batches
+from .ledger import post_refunds
+from .models import Payment, PaymentCommand, Refund, RefundBatchItem
+
+logger = logging.getLogger(__name__)
+
+# Commands stuck in 'dispatching' longer than this are assumed to belong to a dead worker
+STALE_CLAIM_MINUTES = 10
+
+RETRY_BASE_SECONDS = 30
+
+# Errors worth retrying — anything else (e.g. BadRequestError) fails the command for good
+TRANSIENT_ERRORS = (
+    requests.exceptions.ConnectionError,
+    requests.exceptions.Timeout,
+    ServerError,
+    GatewayError,
+)
+
+# Errors applying a response that a later attempt can redo — refunds find their
+# earlier gateway refund by command_id instead of issuing a second one
+TRANSIENT_APPLY_ERRORS = (OperationalError,)
+
+
+# ──────────────────────────────────────────────
+# Recording intent — call inside the caller's transaction
+# ──────────────────────────────────────────────
+
+def queue_order(booking, amount, payment=None):
+    """
+    Record a create_order command for booking, already claimed for an inline run.
+    Passing ``payment`` retries it: the new order replaces its current one.
+    """
+    return PaymentCommand.objects.create(
+        command_type='create_order',
+        booking=booking,
+        payment=payment,
+        payload={
+            'amount': int(amount * 100),  # Amount in paise
+            'currency': 'INR',
+            'receipt': f'booking_{booking.id}',
+            'payment_capture': 1,  # Auto capture
+            'notes': {
+                'booking_id': booking.id,
+                'user_email': booking.user.email,
+                'car_name': booking.car.name,
+            },
+        },
+        status='dispatching',
+        attempts=1,
+        claimed_at=timezone.now(),
+    )
+
+
+def queue_refund(payment, reason=None, initiated_by=None):
+    """Record a pending Refund and the create_refund command that will issue it."""
+    refund = Refund.objects.create(
+        payment=payment,
+        amount=payment.amount,
+        status='pending',
+        reason=reason or '',
+        initiated_by=initiated_by,
+    )
+    command = PaymentCommand.objects.create(
+        command_type='create_refund',
+        booking=payment.booking,
+        payment=payment,
+        refund=refund,
+        payload={
+            'amount': int(payment.amount * 100),  # Amount in paise
+            'notes': {
+                'reason': reason or 'No reason provided',
+                'booking_id': payment.booking_id,
+            },
+        },
+    )
+    return refund, command
+
+
+# ──────────────────────────────────────────────
+# Gateway calls — no transaction may be open here
+# ──────────────────────────────────────────────
+
+def _call_create_order(command, service):
+    return service.client.order.create(data=command.payload, timeout=service.timeout)
+
+
+def _call_create_refund(command, service):
+    razorpay_payment_id = command.payment.razorpay_payment_id
+    notes = dict(command.payload['notes'], command_id=str(command.id))
+
+    # An earlier attempt may have reached Razorpay before timing out — reuse its refund
+    if command.attempts > 1:
+        existing = service.client.payment.fetch_multiple_refund(
+            razorpay_payment_id, timeout=service.timeout,
+        )
+        for refund in existing.get('items', []):
+            if (refund.get('notes') or {}).get('command_id') == str(command.id):
+                return refund
+
+    return service.client.payment.refund(
+        razorpay_payment_id, dict(command.payload, notes=notes), timeout=service.timeout,
+    )
+
+
+# ──────────────────────────────────────────────
+# Applying results — each runs in its own short transaction
+# ──────────────────────────────────────────────
+
+def _apply_create_order(command, order):
+    booking = command.booking
+    if booking is None:
+        raise ValueError(f'Booking for command {command.id} no longer exists')
+
+    amount = Decimal(command.payload['amount']) / 100
+    booking.razorpay_order_id = order['id']
+    booking.payment_status = 'pending'
+    booking.save(update_fields=['razorpay_order_id', 'payment_status', 'updated_at'])
+
+    if command.payment_id is not None:
+        # Retry — same Payment, fresh order; earlier orders live on in attempt_history
+        Payment.objects.filter(id=command.payment_id).update(
+            razorpay_order_id=order['id'], status='pending', updated_at=timezone.now(),
+        )
+        logger.info(f"Retry order created: {order['id']} for booking {booking.id}")
+        return
+
+    Payment.objects.create(
+        booking=booking,
+        user_id=booking.user_id,
+        amount=amount,
+        status='pending',
+        razorpay_order_id=order['id'],
+        payment_method='razorpay',
+    )
+    logger.info(f"Order created: {order['id']} for booking {booking.id}")
+
+
+def _apply_create_refund(command, refund_data):
+    payment = Payment.objects.select_for_update().get(id=command.payment_id)
+
+    refund = command.refund
+    refund.razorpay_refund_id = refund_data['id']
+    refund.status = 'processed'
+    refund.save(update_fields=['razorpay_refund_id', 'status', 'updated_at'])
+
+    # Update payment status
+    payment.status = 'refunded'
+    payment.save()
+
+    # Update booking status and payment_status to 'refunded' so the car is
+    # released back into the available pool.
+    booking = payment.booking
+    booking.status = 'refunded'
+    booking.payment_status = 'refunded'
+    booking.save()
+
+    post_refunds([payment.id])
+
+    # Bulk refunds notify all their customers at once when the batch completes
+    if not RefundBatchItem.objects.filter(refund_id=refund.id).update(status='processed', updated_at=timezone.now()):
+        create_notification(
+            booking.user,
+            '💰 Refund Processed',
+            f'Your refund of ₹{refund.amount} has been processed.'
+        )
+    logger.info(f"Refund processed: {refund_data['id']} for payment {payment.id}")
+
+
+def _fail_create_refund(command):
+    Refund.objects.filter(id=command.refund_id).update(status='failed', updated_at=timezone.now())
+    RefundBatchItem.objects.filter(refund_id=command.refund_id).update(
+        status='failed', detail=command.last_error, updated_at=timezone.now(),
+    )
+    logger.error(f'Refund {command.refund_id} for payment {command.payment_id} failed: {command.last_error}')
+
+
+COMMAND_HANDLERS = {
+    # command_type: (gateway call, apply result, on permanent failure)
+    'create_order':  (_call_create_order, _apply_create_order, None),
+    'create_refund': (_call_create_refund, _apply_create_refund, _fail_create_refund),
+}
+
+
+# ──────────────────────────────────────────────
+# Running commands
+# ──────────────────────────────────────────────
+
+def retry_delay(attempts):
+    """Exponential backoff: base, 2×base, 4×base … capped at one hour."""
+    return timedelta(seconds=min(RETRY_BASE_SECONDS * 2 ** (attempts - 1), 3600))
+
+
+def _record_failure(command, error, retry):
+    max_attempts = getattr(settings, 'PAYMENT_COMMAND_MAX_ATTEMPTS', 5)
+    command.last_error = str(error)[:1000]
+    command.claimed_at = None
+    if retry and isinstance(error, TRANSIENT_ERRORS + TRANSIENT_APPLY_ERRORS) and command.attempts < max_attempts:
+        command.status = 'pending'
+        command.next_attempt_at = timezone.now() + retry_delay(command.attempts)
+        logger.warning(f'Payment command {command.id} failed, will retry: {error}')
+    else:
+        command.status = 'failed'
+        on_failure = COMMAND_HANDLERS[command.command_type][2]
+        if on_failure is not None:
+            on_failure(command)
+    command.save(update_fields=['last_error', 'claimed_at', 'status', 'next_attempt_at'])
+
+
+def run_command(command, service=None, retry=True):
+    """
+    Perform a claimed command's gateway call, then apply the response.
+
+    Failures are recorded on the command (and retried later when ``retry``
+    is set and the error is transient) before being re-raised.
+    """
+    if service is None:
+        from .services import RazorpayPaymentService
+        service = RazorpayPaymentService()
+    call, apply, _ = COMMAND_HANDLERS[command.command_type]
+
+    try:
+        response = call(command, service)
+    except Exception as e:
+        _record_failure(command, e, retry)
+        raise
+
+    try:
+        with transaction.atomic():
+            apply(command, response)
+            command.status = 'succeeded'
+            command.result = response
+            command.claimed_at = None
+            command.completed_at = timezone.now()
+            command.save(update_fields=['status', 'result', 'claimed_at', 'completed_at'])
+    except Exception as e:
+        # The gateway accepted the call but our update failed — keep the response for reconciliation
+        command.result = response
+        command.save(update_fields=['result'])
+        _record_failure(command, e, retry=retry and command.command_type == 'create_refund')
+        raise
+    return command
+
+
+def release_stale_claims():
+    """Put commands claimed by a crashed worker back in the queue."""
+    cutoff = timezone.now() - timedelta(minutes=STALE_CLAIM_MINUTES)
+    return PaymentCommand.objects.filter(
+        status='dispatching', claimed_at__lt=cutoff,
+    ).exclude(command_type='create_order').update(status='pending', claimed_at=None)
+
+
+def claim_batch(batch_size):
+    """Atomically mark up to batch_size due commands as 'dispatching' and count the attempt."""
+    now = timezone.now()
+    with transaction.atomic():
+        due = list(
+            PaymentCommand.objects.select_for_update(skip_locked=True)
+            .filter(status='pending', next_attempt_at__lte=now)
+            .order_by('next_attempt_at', 'id')[:batch_size]
+        )
+        if due:
+            # Persisted before the call so a crash mid-call still counts as an attempt
+            PaymentCommand.objects.filter(id__in=[command.id for command in due]).update(
+                status='dispatching', claimed_at=now, attempts=F('attempts') + 1,
+            )
+    for command in due:
+        command.status = 'dispatching'
+        command.claimed_at = now
+        command.attempts += 1
+    return due
+
+
+def _run_in_thread(command, service):
+    try:
+        run_command(command, service)
+        return True
+    except Exception:
+        return False
+    finally:
+        # Worker threads open their own connections; do not leak them
+        connection.close()
+
+
+def dispatch_payment_commands(batch_size=None, service=None, workers=None):
+    """
+    Run every currently due command, up to ``workers`` at a time.
+    Returns (succeeded, failed).
+    """
+    batch_size = batch_size or getattr(settings, 'PAYMENT_COMMAND_BATCH_SIZE', 20)
+    workers = workers or getattr(settings, 'PAYMENT_COMMAND_WORKERS', 4)
+    if service is None:
+        from .services import RazorpayPaymentService
+        service = RazorpayPaymentService()
+    release_stale_claims()
+    succeeded = failed = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while True:
+            batch = claim_batch(batch_size)
+            if not batch:
+                break
+            for ok in pool.map(lambda command: _run_in_thread(command, service), batch):
+                if ok:
+                    succeeded += 1
+                else:
+                    failed += 1
+    finalize_refund_batches()
+    return succeeded, failed
@@ -0,0 +1,264 @@
+"""
+Batch reconciliation between local Payment rows and Razorpay.
+
+``reconcile_payments(since)`` streams pending, failed and completed payments
+with ``iterator()``, followed by the orders of bookings that were released
+since, and fetches each one's gateway state from a thread pool.
+Calls are spaced out by a shared rate limiter.  Worker threads only make
+HTTP calls; all database reads and writes stay on the calling thread.
+
+Discrepancies that Razorpay settles unambiguously are corrected in bulk, one
+short transaction per chunk:
+
+- ``missing_capture``: pending or failed locally but paid at the gateway
+  (e.g. the payment.captured webhook was lost, or the customer retried on
+  the same order) — marked completed, its booking back awaiting approval.
+- ``missing_failure``: pending locally but every attempt on the order failed
+  — marked failed so the retry / stale-booking rules apply.
+- ``missing_refund``: completed locally but fully refunded at the gateway —
+  marked refunded.
+
+Anything else (amount mismatches, payments Razorpay does not know, captures
+that never happened, and ``captured_after_release``: money taken for a
+booking already released after its last failed attempt) is only reported.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from itertools import chain
+
+from django.db import transaction
+from django.utils import timezone
+
+from apps.bookings.models import Booking
+from .ledger import post_captures, post_refunds
+from .models import Payment, PaymentCommand
+
+logger = logging.getLogger(__name__)
+
+# Issues corrected automatically; every other issue is report-only
+CORRECTABLE = ('missing_capture', 'missing_failure', 'missing_refund')
+
+
+class RateLimiter:
+    """Spaces calls from any number of threads at least 1/rate seconds apart."""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0
+        self._lock = threading.Lock()
+        self._next_slot = time.monotonic()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(self._next_slot, now)
+            self._next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def _paise(amount):
+    return int(Decimal(amount) * 100)
+
+
+def _finding(row, issue, gateway_status='', detail='', razorpay_payment_id=None):
+    return {
+        'payment_id': row['id'],
+        'booking_id': row['booking_id'],
+        'razorpay_order_id': row['razorpay_order_id'] or '',
+        'razorpay_payment_id': razorpay_payment_id or row['razorpay_payment_id'] or '',
+        'local_status': row['status'],
+        'gateway_status': gateway_status,
+        'issue': issue,
+        'detail': detail,
+        'action': '',
+    }
+
+
+def _check_pending(row, client, limiter, timeout):
+    if not row['razorpay_order_id']:
+        return _finding(row, 'no_order', detail='Pending payment has no Razorpay order')
+    limiter.wait()
+    attempts = client.order.payments(row['razorpay_order_id'], timeout=timeout).get('items', [])
+    captured = [item for item in attempts if item.get('status') in ('captured', 'refunded')]
+    if captured:
+        item = captured[0]
+        if item.get('amount') != _paise(row['amount']):
+            return _finding(
+                row, 'amount_mismatch', item['status'],
+                f"Gateway captured {item.get('amount')} paise, expected {_paise(row['amount'])}",
+                razorpay_payment_id=item['id'],
+            )
+        return _finding(row, 'missing_capture', item['status'], razorpay_payment_id=item['id'])
+    if row['status'] == 'pending' and attempts and all(item.get('status') == 'failed' for item in attempts):
+        return _finding(row, 'missing_failure', 'failed', f'{len(attempts)} failed attempt(s)')
+    return None
+
+
+def _check_released(row, client, limiter, timeout):
+    limiter.wait()
+    attempts = client.order.payments(row['razorpay_order_id'], timeout=timeout).get('items', [])
+    captured = [item for item in attempts if item.get('status') in ('captured', 'refunded')]
+    if captured:
+        item = captured[0]
+        return _finding(
+            row, 'captured_after_release', item['status'],
+            f"Booking {row['booking_id']} was released but the gateway captured {item.get('amount')} paise",
+            razorpay_payment_id=item['id'],
+        )
+    return None
+
+
+def _check_completed(row, client, limiter, timeout):
+    if not row['razorpay_payment_id']:
+        return _finding(row, 'no_gateway_payment', detail='Completed payment has no Razorpay payment id')
+    limiter.wait()
+    item = client.payment.fetch(row['razorpay_payment_id'], timeout=timeout)
+    status = item.get('status', '')
+    if item.get('amount') != _paise(row['amount']):
+        return _finding(
+            row, 'amount_mismatch', status,
+            f"Gateway amount {item.get('amount')} paise, expected {_paise(row['amount'])}",
+        )
+    if status == 'refunded' or (item.get('amount_refunded') or 0) >= item.get('amount', 0) > 0:
+        return _finding(row, 'missing_refund', 'refunded')
+    if item.get('amount_refunded'):
+        return _finding(row, 'partial_refund', status, f"{item['amount_refunded']} paise refunded")
+    if status != 'captured':
+        return _finding(row, 'not_captured', status)
+    return None
+
+
+def _check(row, service, limiter):
+    """Compare one payment with the gateway.  Returns a finding dict or None."""
+    check = {'completed': _check_completed, 'released': _check_released}.get(row['status'], _check_pending)
+    try:
+        return check(row, service.client, limiter, service.timeout)
+    except Exception as e:
+        return _finding(row, 'gateway_error', detail=f'{type(e).__name__}: {e}')
+
+
+def _apply_corrections(findings):
+    """Apply the correctable findings of one chunk.  Returns how many rows changed."""
+    by_issue = {issue: [f for f in findings if f['issue'] == issue] for issue in CORRECTABLE}
+    now = timezone.now()
+    corrected = set()
+
+    with transaction.atomic():
+        captures = {f['payment_id']: f for f in by_issue['missing_capture']}
+        # Re-check status under lock: payment_success or a webhook may have got there first
+        payments = list(Payment.objects.select_for_update().filter(id__in=captures, status__in=('pending', 'failed')))
+        for payment in payments:
+            payment.status = 'completed'
+            payment.razorpay_payment_id = captures[payment.id]['razorpay_payment_id']
+            payment.transaction_id = payment.razorpay_payment_id
+            payment.updated_at = now
+        Payment.objects.bulk_update(payments, ['status', 'razorpay_payment_id', 'transaction_id', 'updated_at'])
+        paid = {payment.booking_id: payment.razorpay_payment_id for payment in payments}
+        bookings = list(Booking.objects.filter(id__in=paid))
+        for booking in bookings:
+            # As handle_payment_captured: paid, and awaiting the owner's approval
+            booking.status = 'pending'
+            booking.payment_status = 'paid'
+            booking.razorpay_payment_id = paid[booking.id]
+            booking.updated_at = now
+        Booking.objects.bulk_update(bookings, ['status', 'payment_status', 'razorpay_payment_id', 'updated_at'])
+        post_captures([p.id for p in payments])
+        corrected.update(p.id for p in payments)
+
+        failed_ids = list(Payment.objects.select_for_update().filter(
+            id__in=[f['payment_id'] for f in by_issue['missing_failure']], status='pending',
+        ).values_list('id', flat=True))
+        Payment.objects.filter(id__in=failed_ids).update(status='failed', next_retry_at=now, updated_at=now)
+        Booking.objects.filter(payment__id__in=failed_ids).update(payment_status='failed', updated_at=now)
+        corrected.update(failed_ids)
+
+        refunded_ids = list(Payment.objects.select_for_update().filter(
+            id__in=[f['payment_id'] for f in by_issue['missing_refund']], status='completed',
+        ).values_list('id', flat=True))
+        Payment.objects.filter(id__in=refunded_ids).update(status='refunded', updated_at=now)
+        Booking.objects.filter(payment__id__in=refunded_ids).update(
+            status='refunded', payment_status='refunded', updated_at=now,
+        )
+        post_refunds(refunded_ids)
+        corrected.update(refunded_ids)
+
+    for finding in findings:
+        if finding['issue'] in CORRECTABLE:
+            finding['action'] = 'corrected' if finding['payment_id'] in corrected else 'skipped (changed meanwhile)'
+        else:
+            finding['action'] = 'report only'
+    return len(corrected)
+
+
+def reconcile_payments(since, workers=8, rate=25, chunk_size=500, dry_run=False, service=None):
+    """
+    Reconcile pending, failed and completed payments created at or after
+    ``since``, and the orders of bookings released since then.
+    Returns (checked, corrected, findings).
+    """
+    if service is None:
+        from .services import RazorpayPaymentService
+        service = RazorpayPaymentService()
+    limiter = RateLimiter(rate)
+
+    rows = chain(
+        Payment.objects.filter(status__in=('pending', 'failed', 'completed'), created_at__gte=since)
+        .order_by('id')
+        .values('id', 'booking_id', 'status', 'amount', 'razorpay_order_id', 'razorpay_payment_id')
+        .iterator(chunk_size=chunk_size),
+        _released_orders(since, chunk_size),
+    )
+
+    checked = corrected = 0
+    findings = []
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                corrected += _reconcile_chunk(chunk, pool, service, limiter, dry_run, findings)
+                checked += len(chunk)
+                chunk = []
+        if chunk:
+            corrected += _reconcile_chunk(chunk, pool, service, limiter, dry_run, findings)
+            checked += len(chunk)
+    return checked, corrected, findings
+
+
+def _released_orders(since, chunk_size):
+    """Rows for the orders of bookings deleted since ``since``, e.g. released after the last failed attempt."""
+    commands = (
+        PaymentCommand.objects.filter(
+            command_type='create_order', status='succeeded', booking__isnull=True, created_at__gte=since,
+        )
+        .order_by('id')
+        .values('payload', 'result')
+        .iterator(chunk_size=chunk_size)
+    )
+    for command in commands:
+        yield {
+            'id': None,
+            'booking_id': command['payload']['notes']['booking_id'],
+            'status': 'released',
+            'amount': Decimal(command['payload']['amount']) / 100,
+            'razorpay_order_id': command['result']['id'],
+            'razorpay_payment_id': None,
+        }
+
+
+def _reconcile_chunk(chunk, pool, service, limiter, dry_run, findings):
+    chunk_findings = [f for f in pool.map(lambda row: _check(row, service, limiter), chunk) if f]
+    if dry_run:
+        for finding in chunk_findings:
+            finding['action'] = 'dry run' if finding['issue'] in CORRECTABLE else 'report only'
+        corrected = 0
+    else:
+        corrected = _apply_corrections(chunk_findings)
+    findings.extend(chunk_findings)
+    logger.info(f'Reconciled {len(chunk)} payments: {len(chunk_findings)} discrepancies, {corrected} corrected')
+    return corrected
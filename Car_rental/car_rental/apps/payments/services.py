@@ -5,83 +5,200 @@ Handles order creation, payment verification, and refunds
 import logging
 import hmac
 import hashlib
-import razorpay
+from datetime import timedelta
 from decimal import Decimal
+from math import ceil
 from django.conf import settings
 from django.db import transaction
-from .models import Payment, Refund
-from apps.bookings.models import Booking
+from django.db.models import F
+from django.utils import timezone
+from .gateway import get_razorpay_client
+from .ledger import post_captures
+from .models import Payment, PaymentAttempt
+from .outbox import queue_order, queue_refund, run_command
+from apps.bookings.models import Booking, BookingHold
 
 logger = logging.getLogger(__name__)
 
 
+class PaymentRetryTooSoon(ValueError):
+    """A retry was requested before the backoff after the last failed attempt elapsed."""
+
+    def __init__(self, retry_after):
+        super().__init__(f'Please wait {retry_after}s before retrying the payment')
+        self.retry_after = retry_after
+
+
+def retry_backoff(attempts):
+    """Wait after the given number of failed attempts: base, 2×base, 4×base … seconds."""
+    base = getattr(settings, 'PAYMENT_RETRY_BACKOFF_SECONDS', 5)
+    return timedelta(seconds=base * 2 ** (attempts - 1))
+
+
+def _seconds_until(moment):
+    if moment is None:
+        return 0
+    return max(ceil((moment - timezone.now()).total_seconds()), 0)
+
+
+def _release_booking(payment):
+    """Delete a locked payment, its booking and hold so the dates are free again."""
+    booking = payment.booking
+    BookingHold.objects.filter(
+        user_id=booking.user_id,
+        car_id=booking.car_id,
+        start_date=booking.start_date,
+        end_date=booking.end_date,
+    ).delete()
+    payment.delete()  # must delete Payment first (FK to Booking via OneToOne)
+    booking.delete()
+
+
+def record_failed_attempt(payment, razorpay_order_id, error_code='', error_description=''):
+    """
+    Record a failed checkout attempt on a locked Payment.
+
+    While attempts remain the booking and its hold are kept and the payment
+    waits out the backoff before ``retry_order`` may create a new order.
+    After the last attempt the payment, booking and hold are deleted so the
+    dates are released.  Returns {'retry_allowed', 'attempts_left', 'retry_after'}.
+    """
+    max_attempts = getattr(settings, 'MAX_PAYMENT_RETRY_ATTEMPTS', 3)
+    booking = payment.booking
+
+    # payment_failure and the payment.failed webhook both report the same attempt
+    if not payment.attempt_history.filter(razorpay_order_id=razorpay_order_id).exists():
+        PaymentAttempt.objects.create(
+            payment=payment,
+            razorpay_order_id=razorpay_order_id,
+            error_code=error_code or '',
+            error_description=error_description or '',
+        )
+
+    if payment.attempts >= max_attempts:
+        _release_booking(payment)
+        logger.warning(f'Payment failed {payment.attempts} times, booking released: {razorpay_order_id}')
+        return {'retry_allowed': False, 'attempts_left': 0, 'retry_after': 0}
+
+    if payment.status != 'failed':
+        payment.status = 'failed'
+        payment.next_retry_at = timezone.now() + retry_backoff(payment.attempts)
+        payment.save(update_fields=['status', 'next_retry_at', 'updated_at'])
+        booking.payment_status = 'failed'
+        booking.save(update_fields=['payment_status', 'updated_at'])
+        logger.warning(f'Payment attempt {payment.attempts} failed: {razorpay_order_id}')
+
+    return {
+        'retry_allowed': True,
+        'attempts_left': max_attempts - payment.attempts,
+        'retry_after': _seconds_until(payment.next_retry_at),
+    }
+
+
 class RazorpayPaymentService:
     """Handle all Razorpay payment operations"""
 
     def __init__(self):
-        """Initialize Razorpay client"""
-        self.client = razorpay.Client(
-            auth=(settings.RAZORPAY_KEY_ID, settings.RAZORPAY_KEY_SECRET)
-        )
+        """Read Razorpay credentials; the HTTP client itself is shared per process"""
+        # (connect, read) seconds — passed to every API call
+        self.timeout = getattr(settings, 'RAZORPAY_TIMEOUT', (3.05, 10))
         self.key_id = settings.RAZORPAY_KEY_ID
         self.key_secret = settings.RAZORPAY_KEY_SECRET
         self.webhook_secret = settings.RAZORPAY_WEBHOOK_SECRET
 
-    @transaction.atomic
+    @property
+    def client(self):
+        """Process-wide pooled razorpay.Client — resolved per call so forked workers get their own."""
+        return get_razorpay_client()
+
     def create_order(self, booking_id, amount):
-        """Create a Razorpay order for booking_id and return order details."""
+        """
+        Create a Razorpay order for booking_id and return order details.
+        The API call runs outside any transaction — see outbox.py.
+        """
         try:
-            booking = Booking.objects.get(id=booking_id)
-            
-            # Amount in paise (multiply by 100)
-            amount_paise = int(amount * 100)
-            
-            # Create order in Razorpay
-            order_data = {
-                'amount': amount_paise,
-                'currency': 'INR',
-                'receipt': f'booking_{booking.id}',
-                'payment_capture': 1,  # Auto capture
-                'notes': {
-                    'booking_id': booking.id,
-                    'user_email': booking.user.email,
-                    'car_name': booking.car.name,
-                }
-            }
-            
-            order = self.client.order.create(data=order_data)
-            
-            # Store order ID in booking
-            booking.razorpay_order_id = order['id']
-            booking.save(update_fields=['razorpay_order_id'])
-            
-            # Create Payment record
-            Payment.objects.create(
-                booking=booking,
-                user=booking.user,
-                amount=amount,
-                status='pending',
-                razorpay_order_id=order['id'],
-                payment_method='razorpay'
-            )
-            
-            logger.info(f"Order created: {order['id']} for booking {booking.id}")
-            
-            return {
-                'order_id': order['id'],
-                'amount': amount,
-                'currency': 'INR',
-                'key_id': self.key_id,
-                'booking_id': booking.id,
-            }
-            
+            booking = Booking.objects.select_related('user', 'car').get(id=booking_id)
         except Booking.DoesNotExist:
             logger.error(f"Booking {booking_id} not found")
             raise ValueError(f"Booking {booking_id} not found")
+
+        command = queue_order(booking, amount)
+        try:
+            # Checkout cannot continue without the order id, so no background retry
+            run_command(command, service=self, retry=False)
         except Exception as e:
             logger.error(f"Order creation failed: {str(e)}")
             raise
 
+        return {
+            'order_id': command.result['id'],
+            'amount': amount,
+            'currency': 'INR',
+            'key_id': self.key_id,
+            'booking_id': booking.id,
+        }
+
+    def retry_order(self, payment_id):
+        """
+        Create a fresh Razorpay order for a failed payment, keeping its booking
+        and Payment row.  Raises PaymentRetryTooSoon during the backoff and
+        ValueError once MAX_PAYMENT_RETRY_ATTEMPTS orders have been made, after
+        releasing the booking.  An order the gateway did not create does not
+        count as an attempt.
+        """
+        max_attempts = getattr(settings, 'MAX_PAYMENT_RETRY_ATTEMPTS', 3)
+        command = None
+        with transaction.atomic():
+            try:
+                payment = (
+                    Payment.objects.select_for_update()
+                    .select_related('booking__user', 'booking__car')
+                    .get(id=payment_id)
+                )
+            except Payment.DoesNotExist:
+                raise ValueError(f"Payment {payment_id} not found")
+
+            if payment.status != 'failed':
+                raise ValueError(f"Cannot retry payment with status: {payment.status}")
+            if payment.attempts >= max_attempts:
+                # No order is outstanding (a created one sets status 'pending'),
+                # so nothing can pay for this booking any more
+                _release_booking(payment)
+                logger.warning(f'No payment attempts left, booking {payment.booking_id} released')
+            else:
+                retry_after = _seconds_until(payment.next_retry_at)
+                if retry_after:
+                    raise PaymentRetryTooSoon(retry_after)
+
+                # The attempt counts from here; pushing next_retry_at also stops a concurrent retry
+                previous_retry_at = payment.next_retry_at
+                payment.attempts += 1
+                payment.next_retry_at = timezone.now() + retry_backoff(payment.attempts)
+                payment.save(update_fields=['attempts', 'next_retry_at', 'updated_at'])
+                command = queue_order(payment.booking, payment.amount, payment=payment)
+
+        if command is None:
+            raise ValueError("No payment attempts left for this booking; it has been released")
+
+        try:
+            run_command(command, service=self, retry=False)
+        except Exception as e:
+            logger.error(f"Retry order creation failed: {str(e)}")
+            # No order was created (gateway error, open circuit…), so give the attempt back
+            Payment.objects.filter(id=payment.id, status='failed', attempts=payment.attempts).update(
+                attempts=F('attempts') - 1, next_retry_at=previous_retry_at, updated_at=timezone.now(),
+            )
+            raise
+
+        return {
+            'order_id': command.result['id'],
+            'amount': payment.amount,
+            'currency': 'INR',
+            'key_id': self.key_id,
+            'booking_id': payment.booking_id,
+            'attempt': payment.attempts,
+        }
+
     def verify_payment_signature(self, razorpay_order_id, razorpay_payment_id, razorpay_signature):
         """Return True if the Razorpay HMAC-SHA256 signature is valid."""
         try:
@@ -114,8 +231,8 @@ class RazorpayPaymentService:
             raise ValueError("Payment signature verification failed")
         
         try:
-            # Get payment record
-            payment = Payment.objects.get(razorpay_order_id=razorpay_order_id)
+            # Lock the payment row — the webhook worker may be capturing it concurrently
+            payment = Payment.objects.select_for_update().get(razorpay_order_id=razorpay_order_id)
             
             # Update payment record
             payment.razorpay_payment_id = razorpay_payment_id
@@ -134,6 +251,8 @@ class RazorpayPaymentService:
             booking.razorpay_payment_id = razorpay_payment_id
             booking.razorpay_signature = razorpay_signature
             booking.save()
+
+            post_captures([payment.id])
             
             logger.info(f"Payment successful: {razorpay_payment_id} for booking {booking.id}")
             
@@ -153,91 +272,56 @@ class RazorpayPaymentService:
 
     @transaction.atomic
     def handle_payment_failure(self, razorpay_order_id, error_code=None, error_description=None):
-        """Mark payment as failed and delete the associated booking."""
+        """
+        Record a failed attempt — see record_failed_attempt.  Returns its
+        retry details, or None when the order is unknown or already paid.
+        """
         try:
-            payment = Payment.objects.get(razorpay_order_id=razorpay_order_id)
-
-            # Update payment status
-            payment.status = 'failed'
-            payment.save()
-
-            # Delete the booking — payment was never captured, so the
-            # booking should not persist.  The user's Hold is still
-            # active and will expire naturally if they abandon.
-            booking = payment.booking
-            payment.delete()  # must delete Payment first (FK to Booking via OneToOne)
-            booking.delete()
-
-            logger.warning(f'Payment failed and booking cleaned up: {razorpay_order_id}')
-
+            payment = (
+                Payment.objects.select_for_update()
+                .select_related('booking')
+                .get(razorpay_order_id=razorpay_order_id)
+            )
         except Payment.DoesNotExist:
             logger.error(f'Payment not found for order {razorpay_order_id}')
-        except Exception as e:
-            logger.error(f'Payment failure handling error: {str(e)}')
+            return None
+
+        if payment.status not in ('pending', 'failed'):
+            return None
+        return record_failed_attempt(payment, razorpay_order_id, error_code, error_description)
 
     @transaction.atomic
     def create_refund(self, payment_id, reason=None, initiated_by=None):
-        """Issue a Razorpay refund for payment_id and return refund details."""
+        """
+        Queue a Razorpay refund for payment_id and return refund details.
+        The dispatch_payment_commands worker calls the API and marks the
+        payment and booking refunded once Razorpay accepts it.
+        """
         try:
-            payment = Payment.objects.get(id=payment_id)
-            
-            # Check if payment can be refunded
-            if payment.status not in ['completed']:
-                raise ValueError(f"Cannot refund payment with status: {payment.status}")
-            
-            if not payment.razorpay_payment_id:
-                raise ValueError("Razorpay payment ID not found")
-            
-            # Create refund via Razorpay API
-            refund_data = {
-                'amount': int(payment.amount * 100),  # Amount in paise
-                'notes': {
-                    'reason': reason or 'No reason provided',
-                    'booking_id': payment.booking.id
-                }
-            }
-            
-            refund = self.client.payment.refund(
-                payment.razorpay_payment_id,
-                refund_data
-            )
-            
-            # Create refund record
-            refund_obj = Refund.objects.create(
-                payment=payment,
-                razorpay_refund_id=refund['id'],
-                amount=payment.amount,
-                status='processed',
-                reason=reason,
-                initiated_by=initiated_by
-            )
-            
-            # Update payment status
-            payment.status = 'refunded'
-            payment.save()
-
-            # Update booking status and payment_status to 'refunded' so the car is
-            # released back into the available pool.
-            booking = payment.booking
-            booking.status = 'refunded'
-            booking.payment_status = 'refunded'
-            booking.save()
-
-            logger.info(f"Refund processed: {refund['id']} for payment {payment.id}")
-            
-            return {
-                'success': True,
-                'refund_id': refund['id'],
-                'amount': payment.amount,
-                'message': 'Refund processed successfully'
-            }
-            
+            payment = Payment.objects.select_for_update().get(id=payment_id)
         except Payment.DoesNotExist:
             logger.error(f"Payment {payment_id} not found")
             raise ValueError(f"Payment {payment_id} not found")
-        except Exception as e:
-            logger.error(f"Refund creation failed: {str(e)}")
-            raise
+
+        # Check if payment can be refunded
+        if payment.status not in ['completed']:
+            raise ValueError(f"Cannot refund payment with status: {payment.status}")
+
+        if not payment.razorpay_payment_id:
+            raise ValueError("Razorpay payment ID not found")
+
+        if payment.refunds.exclude(status='failed').exists():
+            raise ValueError("A refund is already in progress for this payment")
+
+        refund, command = queue_refund(payment, reason=reason, initiated_by=initiated_by)
+        logger.info(f"Refund queued: command {command.id} for payment {payment.id}")
+
+        return {
+            'success': True,
+            'refund_id': refund.id,
+            'amount': payment.amount,
+            'message': 'Refund initiated'
+        }
 
     def verify_webhook_signature(self, webhook_body, webhook_signature):
         """Return True if the webhook HMAC-SHA256 signature matches."""
@@ -16,6 +16,9 @@ urlpatterns = [
     # Admin Dashboard
     path('admin/dashboard/', views_razorpay.admin_payments_dashboard, name='admin_payments_dashboard'),
     path('admin/refund/<int:payment_id>/', views_razorpay.admin_refund_payment, name='admin_refund_payment'),
+    path('admin/refund/bulk/', views_razorpay.admin_bulk_refund, name='admin_bulk_refund'),
+    path('admin/refund/batch/<int:batch_id>/', views_razorpay.admin_refund_batch, name='admin_refund_batch'),
+    path('admin/gateway-metrics/', views_razorpay.admin_gateway_metrics, name='admin_gateway_metrics'),
 
     # User Transactions History
     path('my-transactions/', views_razorpay.user_transactions, name='user_transactions'),
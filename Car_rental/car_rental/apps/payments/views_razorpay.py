@@ -4,6 +4,7 @@ Master payment flow: booking → order creation → checkout → verification 
 """
 import json
 import logging
+import re
 from decimal import Decimal
 
 from django.conf import settings
@@ -14,17 +15,21 @@ from django.http import JsonResponse, HttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse
 from django.utils import timezone
+from django.utils.dateparse import parse_date
 from django.views.decorators.http import require_http_methods
 from django.views.decorators.csrf import csrf_exempt
-from django.db import transaction as db_transaction
 
 from apps.bookings.models import Booking, BookingHold
 from apps.bookings.services import has_conflicts
 from apps.accounts.decorators import role_required
-from apps.notifications.services import create_notification
-from .models import Payment, Refund
-from .services import RazorpayPaymentService
+from apps.notifications.services import NEW_BOOKING_REQUEST, create_notification, create_notifications_bulk
+from .models import Payment, Refund, RefundBatch
+from .bulk_refunds import batch_summary, queue_bulk_refund
+from .gateway import gateway_metrics
+from .idempotency import idempotent, json_body_key
+from .services import PaymentRetryTooSoon, RazorpayPaymentService
 from .utils import generate_invoice_pdf
+from .webhooks import record_webhook_event
 
 logger = logging.getLogger(__name__)
 payment_service = RazorpayPaymentService()
@@ -101,8 +106,19 @@ def razorpay_checkout(request, booking_id):
 
 # ==================== BOOKING & PAYMENT INITIALIZATION ====================
 
+def _order_still_payable(status, data):
+    """A stored order is only worth replaying while it is still the one awaiting payment."""
+    if status == 429:
+        # Retry backoff — the next request after it has elapsed must run
+        return False
+    if status != 200 or not data:
+        return True
+    return Payment.objects.filter(razorpay_order_id=data.get('order_id'), status='pending').exists()
+
+
 @login_required
 @require_http_methods(["POST"])
+@idempotent('initiate_payment', request_key=json_body_key('hold_id'), still_valid=_order_still_payable)
 def initiate_payment(request):
     """
     Called when the user clicks "Pay" on the checkout page.
@@ -110,7 +126,8 @@ def initiate_payment(request):
     Accepts a hold_id (no Booking exists yet).  Creates the Booking record
     atomically with the Razorpay order so that:
       - If the user never reached this point, no Booking is in the DB.
-      - If payment ultimately fails, payment_failure deletes the Booking.
+      - After a failed payment the same Booking and Payment get a fresh
+        order, up to MAX_PAYMENT_RETRY_ATTEMPTS; then the Booking is deleted.
       - The Hold keeps protecting the dates until payment_success.
     """
     if request.user.role == 'admin':
@@ -139,6 +156,16 @@ def initiate_payment(request):
         hold.delete()
         return JsonResponse({'error': 'These dates are no longer available. Please choose different dates.'}, status=409)
 
+    failed_payment = Payment.objects.filter(
+        user=request.user,
+        status='failed',
+        booking__car=hold.car,
+        booking__start_date=hold.start_date,
+        booking__end_date=hold.end_date,
+    ).first()
+    if failed_payment is not None:
+        return _retry_payment(failed_payment)
+
     try:
         # Create Booking now (payment_status='pending' until Razorpay confirms)
         from decimal import Decimal as D
@@ -176,8 +203,33 @@ def initiate_payment(request):
         return JsonResponse({'error': f'Failed to create order: {str(e)}'}, status=500)
 
 
+def _retry_payment(payment):
+    """Fresh Razorpay order for a failed payment, reusing its Booking."""
+    try:
+        order_details = payment_service.retry_order(payment.id)
+    except PaymentRetryTooSoon as e:
+        response = JsonResponse({'error': str(e), 'retry_after': e.retry_after}, status=429)
+        response['Retry-After'] = str(e.retry_after)
+        return response
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    except Exception as e:
+        logger.error(f'Retry order creation failed: {str(e)}')
+        return JsonResponse({'error': f'Failed to create order: {str(e)}'}, status=500)
+
+    return JsonResponse({
+        'success': True,
+        'order_id': order_details['order_id'],
+        'amount': float(order_details['amount']),
+        'key_id': order_details['key_id'],
+        'booking_id': order_details['booking_id'],
+        'attempt': order_details['attempt'],
+    })
+
+
 @login_required
 @require_http_methods(["POST"])
+@idempotent('payment_success', request_key=json_body_key('razorpay_order_id'))
 def payment_success(request):
     """
     Verify payment signature and confirm booking
@@ -220,10 +272,12 @@ def payment_success(request):
             '✓ Payment Confirmed',
             f'Payment received for {booking.car.name}. Awaiting owner approval.'
         )
-        create_notification(
-            booking.car.owner,
-            '📋 New Booking Request',
-            f'New booking request for {booking.car.name} from {booking.user.first_name or booking.user.username}. Please confirm or reject.'
+        # Bursts of requests for an owner's cars fold into one digest notification
+        create_notifications_bulk(
+            [booking.car.owner_id],
+            NEW_BOOKING_REQUEST,
+            {'car': booking.car.name, 'customer': booking.user.first_name or booking.user.username},
+            digest=True,
         )
 
         # Use Django reverse() for proper URL generation
@@ -248,7 +302,8 @@ def payment_success(request):
 @require_http_methods(["POST"])
 def payment_failure(request):
     """
-    Handle payment failure — clean up booking and redirect user to retry.
+    Handle payment failure — record the attempt and tell the checkout page
+    whether it may retry on the same booking or must start over.
     Called after a failed Razorpay payment.
     """
     if request.user.role == 'admin':
@@ -260,10 +315,12 @@ def payment_failure(request):
         error_code = data.get('error_code')
         error_description = data.get('error_description')
 
-        # Fetch car_id and user BEFORE the service deletes the records,
-        # so we can notify the user and build the retry redirect URL.
+        # Fetch car and user BEFORE the service may delete the records,
+        # so we can notify the user and build the start-over URL.
         try:
-            payment = Payment.objects.get(razorpay_order_id=razorpay_order_id)
+            payment = Payment.objects.select_related('booking__car', 'booking__user').get(
+                razorpay_order_id=razorpay_order_id,
+            )
             car_id = payment.booking.car.id
             booking_user = payment.booking.user
             car_name = payment.booking.car.name
@@ -271,20 +328,35 @@ def payment_failure(request):
             # Already cleaned up by a previous call or webhook
             return JsonResponse({'success': True, 'message': 'Already cleaned up'})
 
-        # Notify user before deletion
+        result = payment_service.handle_payment_failure(razorpay_order_id, error_code, error_description)
+        if result is None:
+            return JsonResponse({'success': True, 'message': 'Nothing to record'})
+
+        if result['retry_allowed']:
+            create_notification(
+                booking_user,
+                '✗ Payment Failed',
+                f'Payment failed for {car_name}. Your dates are still held — '
+                f'you can retry ({result["attempts_left"]} attempt(s) left).',
+            )
+            return JsonResponse({
+                'success': True,
+                'message': 'Failure recorded',
+                'retry_allowed': True,
+                'attempts_left': result['attempts_left'],
+                'retry_after': result['retry_after'],
+            })
+
         create_notification(
             booking_user,
             '✗ Payment Failed',
-            f'Payment failed for {car_name}. Please try again.',
+            f'Payment failed for {car_name}. Please select your dates again.',
         )
-
-        # Delegate cleanup to the service (deletes Payment + Booking atomically)
-        payment_service.handle_payment_failure(razorpay_order_id, error_code, error_description)
-
         retry_url = reverse('car_detail', kwargs={'pk': car_id})
         return JsonResponse({
             'success': True,
             'message': 'Failure recorded',
+            'retry_allowed': False,
             'redirect_url': retry_url,
         })
 
@@ -418,6 +490,7 @@ def admin_payments_dashboard(request):
         'date_from': date_from,
         'date_to': date_to,
         'method_filter': method_filter,
+        'latest_refund_batch': RefundBatch.objects.first(),
     }
 
     return render(request, 'payments/admin_payments_dashboard.html', context)
@@ -439,13 +512,13 @@ def admin_refund_payment(request, payment_id):
             initiated_by=request.user
         )
 
-        messages.success(request, f"Refund processed: {refund_result['refund_id']}")
+        messages.success(request, f"Refund of ₹{refund_result['amount']} initiated.")
         
-        # Notify user
+        # Notify user — a second notification follows once Razorpay processes it
         create_notification(
             payment.booking.user,
-            '💰 Refund Processed',
-            f'Your refund of ₹{payment.amount} has been processed.'
+            '💰 Refund Initiated',
+            f'Your refund of ₹{payment.amount} has been initiated.'
         )
 
         return redirect('admin_payments_dashboard')
@@ -459,6 +532,60 @@ def admin_refund_payment(request, payment_id):
         return redirect('admin_payments_dashboard')
 
 
+@login_required
+@role_required('admin')
+@require_http_methods(["POST"])
+def admin_bulk_refund(request):
+    """Admin queues refunds for a list of payment ids or every payment matching a filter"""
+    # Accepts "12, 15 INV-000031" — the dashboard shows invoice numbers
+    raw_ids = request.POST.get('payment_ids', '')
+    payment_ids = [int(token) for token in re.findall(r'\d+', raw_ids)]
+    start_date = parse_date(request.POST.get('start_date') or '')
+    end_date = parse_date(request.POST.get('end_date') or '')
+
+    try:
+        batch = queue_bulk_refund(
+            request.user,
+            reason=request.POST.get('reason', ''),
+            payment_ids=payment_ids,
+            city=request.POST.get('city', '').strip(),
+            start_date=start_date,
+            end_date=end_date,
+        )
+    except ValueError as e:
+        messages.error(request, str(e))
+        return redirect('admin_payments_dashboard')
+
+    summary = batch_summary(batch)
+    messages.success(
+        request,
+        f"Refund batch #{batch.id}: {summary['queued']} refunds queued, {summary['skipped']} skipped.",
+    )
+    return redirect('admin_refund_batch', batch_id=batch.id)
+
+
+@login_required
+@role_required('admin')
+def admin_refund_batch(request, batch_id):
+    """Per-payment status of a bulk refund"""
+    batch = get_object_or_404(RefundBatch, id=batch_id)
+    items = batch.items.select_related('payment__booking__car', 'payment__user', 'refund')
+    context = {
+        'batch': batch,
+        'items': items,
+        'summary': batch_summary(batch),
+        'batches': RefundBatch.objects.all()[:20],
+    }
+    return render(request, 'payments/admin_refund_batch.html', context)
+
+
+@login_required
+@role_required('admin')
+def admin_gateway_metrics(request):
+    """Razorpay client latency, circuit-breaker state and connection-pool usage for this worker process"""
+    return JsonResponse(gateway_metrics())
+
+
 # ==================== WEBHOOKS ====================
 
 @csrf_exempt
@@ -466,7 +593,9 @@ def admin_refund_payment(request, payment_id):
 def razorpay_webhook(request):
     """
     Razorpay webhook endpoint
-    Handle payment.captured, payment.failed, refund.processed events
+    Verifies the signature, stores the event and acknowledges immediately.
+    payment.captured, payment.failed and refund.processed are applied by the
+    process_webhook_events worker (see webhooks.py).
     """
     try:
         # Get webhook signature
@@ -478,88 +607,13 @@ def razorpay_webhook(request):
             logger.warning("Invalid webhook signature")
             return JsonResponse({'error': 'Invalid signature'}, status=403)
 
-        # Parse event
-        event = json.loads(webhook_body)
-        event_type = event.get('event')
-
-        logger.info(f"Webhook received: {event_type}")
-
-        if event_type == 'payment.captured':
-            handle_payment_captured(event)
-        elif event_type == 'payment.failed':
-            handle_payment_failed(event)
-        elif event_type == 'refund.processed':
-            handle_refund_processed(event)
-
+        record_webhook_event(webhook_body, request.headers.get('X-Razorpay-Event-Id'))
         return JsonResponse({'status': 'ok'})
 
+    except ValueError:
+        # Signed but not JSON — retrying will not help, so do not ask for a redelivery
+        logger.error("Webhook body is not valid JSON")
+        return JsonResponse({'error': 'Invalid JSON'}, status=400)
     except Exception as e:
         logger.error(f"Webhook error: {str(e)}")
         return JsonResponse({'error': str(e)}, status=500)
-
-
-@db_transaction.atomic
-def handle_payment_captured(event):
-    """Handle payment.captured webhook event"""
-    try:
-        payment_data = event.get('payload', {}).get('payment', {}).get('entity', {})
-        razorpay_payment_id = payment_data.get('id')
-        razorpay_order_id = payment_data.get('order_id')
-
-        payment = Payment.objects.get(razorpay_order_id=razorpay_order_id)
-        
-        if payment.status == 'pending':
-            payment.razorpay_payment_id = razorpay_payment_id
-            payment.status = 'completed'
-            payment.transaction_id = razorpay_payment_id
-            payment.save()
-
-            # Update booking — status stays 'pending' (awaiting owner approval)
-            booking = payment.booking
-            booking.payment_status = 'paid'
-            booking.status = 'pending'
-            booking.razorpay_payment_id = razorpay_payment_id
-            booking.save()
-
-            logger.info(f'Webhook: Payment captured {razorpay_payment_id}')
-
-    except Exception as e:
-        logger.error(f"Error handling payment.captured: {str(e)}")
-
-
-@db_transaction.atomic
-def handle_payment_failed(event):
-    """Handle payment.failed webhook event"""
-    try:
-        payment_data = event.get('payload', {}).get('payment', {}).get('entity', {})
-        razorpay_order_id = payment_data.get('order_id')
-
-        payment = Payment.objects.get(razorpay_order_id=razorpay_order_id)
-        payment.status = 'failed'
-        payment.save()
-
-        booking = payment.booking
-        booking.payment_status = 'failed'
-        booking.save()
-
-        logger.warning(f"Webhook: Payment failed for order {razorpay_order_id}")
-
-    except Exception as e:
-        logger.error(f"Error handling payment.failed: {str(e)}")
-
-
-@db_transaction.atomic
-def handle_refund_processed(event):
-    """Handle refund.processed webhook event"""
-    try:
-        refund_data = event.get('payload', {}).get('refund', {}).get('entity', {})
-        razorpay_refund_id = refund_data.get('id')
-
-        refund = Refund.objects.get(razorpay_refund_id=razorpay_refund_id)
-        refund.status = 'processed'
-        refund.save()
-
-        logger.info(f"Webhook: Refund processed {razorpay_refund_id}")
-
-    except Exception as e:
-        logger.error(f"Error handling refund.processed: {str(e)}")
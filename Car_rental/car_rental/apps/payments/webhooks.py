@@ -0,0 +1,247 @@
+"""
+Razorpay webhook ingestion and processing.
+
+The webhook view only verifies the signature and INSERTs a WebhookEvent —
+duplicate deliveries of the same event id are dropped by the unique
+constraint.  The ``process_webhook_events`` worker then applies pending
+events in event-time order, locking the affected Payment row so it cannot
+race with ``payment_success`` or another worker.
+"""
+import hashlib
+import json
+import logging
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .ledger import post_captures
+from .models import Payment, PaymentAttempt, Refund, WebhookEvent
+from .services import record_failed_attempt
+
+logger = logging.getLogger(__name__)
+
+# Events stuck in 'processing' longer than this are assumed to belong to a dead worker
+STALE_CLAIM_MINUTES = 10
+
+RETRY_BASE_SECONDS = 30
+
+
+# ──────────────────────────────────────────────
+# Ingestion
+# ──────────────────────────────────────────────
+
+def record_webhook_event(webhook_body, event_id=None):
+    """
+    Store a verified webhook body for background processing.
+
+    ``event_id`` is Razorpay's X-Razorpay-Event-Id header; when it is
+    missing a hash of the body is used so identical redeliveries still
+    collapse into one row.  Raises ValueError for a body that is not JSON.
+    """
+    event = json.loads(webhook_body)
+    created_at = event.get('created_at')
+    if created_at:
+        event_created_at = datetime.fromtimestamp(int(created_at), tz=dt_timezone.utc)
+    else:
+        event_created_at = timezone.now()
+
+    # A single INSERT; a repeated event id is silently ignored
+    WebhookEvent.objects.bulk_create([
+        WebhookEvent(
+            event_id=event_id or hashlib.sha256(webhook_body.encode()).hexdigest(),
+            event_type=str(event.get('event', ''))[:50],
+            payload=event,
+            event_created_at=event_created_at,
+        )
+    ], ignore_conflicts=True)
+
+
+# ──────────────────────────────────────────────
+# Event handlers — called inside a transaction by process_event
+# ──────────────────────────────────────────────
+
+def _payment_entity(event):
+    return event.get('payload', {}).get('payment', {}).get('entity', {})
+
+
+def _lock_payment_for_order(razorpay_order_id):
+    """Lock the Payment that owns razorpay_order_id, including orders replaced by a retry."""
+    try:
+        return Payment.objects.select_for_update().get(razorpay_order_id=razorpay_order_id)
+    except Payment.DoesNotExist:
+        payment_id = (
+            PaymentAttempt.objects.filter(razorpay_order_id=razorpay_order_id)
+            .values_list('payment_id', flat=True).first()
+        )
+        if payment_id is None:
+            raise
+        return Payment.objects.select_for_update().get(id=payment_id)
+
+
+def handle_payment_captured(event):
+    """Handle payment.captured webhook event"""
+    payment_data = _payment_entity(event)
+    razorpay_payment_id = payment_data.get('id')
+    razorpay_order_id = payment_data.get('order_id')
+
+    try:
+        # A late capture of an order a retry replaced still pays for the same booking
+        payment = _lock_payment_for_order(razorpay_order_id)
+    except Payment.DoesNotExist:
+        logger.error(f'Webhook: payment.captured for unknown order {razorpay_order_id}')
+        return
+
+    # payment_success may already have completed it — nothing left to do.
+    # A 'failed' payment is still captured: the customer retried on the same order.
+    if payment.status not in ('pending', 'failed'):
+        return
+
+    payment.razorpay_payment_id = razorpay_payment_id
+    payment.status = 'completed'
+    payment.transaction_id = razorpay_payment_id
+    payment.save()
+
+    # Update booking — status stays 'pending' (awaiting owner approval)
+    booking = payment.booking
+    booking.payment_status = 'paid'
+    booking.status = 'pending'
+    booking.razorpay_payment_id = razorpay_payment_id
+    booking.save()
+
+    post_captures([payment.id])
+    logger.info(f'Webhook: Payment captured {razorpay_payment_id}')
+
+
+def handle_payment_failed(event):
+    """Handle payment.failed webhook event"""
+    payment_data = _payment_entity(event)
+    razorpay_order_id = payment_data.get('order_id')
+
+    try:
+        payment = Payment.objects.select_for_update().get(razorpay_order_id=razorpay_order_id)
+    except Payment.DoesNotExist:
+        # Released after the last attempt, or the order was already replaced by a retry
+        return
+
+    # A failed attempt on an order that was later paid must not undo the payment
+    if payment.status not in ('pending', 'failed'):
+        return
+
+    record_failed_attempt(
+        payment, razorpay_order_id,
+        payment_data.get('error_code') or '', payment_data.get('error_description') or '',
+    )
+    logger.warning(f"Webhook: Payment failed for order {razorpay_order_id}")
+
+
+def handle_refund_processed(event):
+    """Handle refund.processed webhook event"""
+    refund_data = event.get('payload', {}).get('refund', {}).get('entity', {})
+    razorpay_refund_id = refund_data.get('id')
+    command_id = str((refund_data.get('notes') or {}).get('command_id') or '')
+
+    # The event can beat _apply_create_refund, which records razorpay_refund_id;
+    # the refund's notes carry the command that issued it
+    refund = (
+        Refund.objects.filter(razorpay_refund_id=razorpay_refund_id).first()
+        or (Refund.objects.filter(commands__id=command_id).first() if command_id.isdigit() else None)
+    )
+    if refund is None:
+        if command_id:
+            # Ours, but not recorded yet — retried with backoff
+            raise ValueError(f'Refund {razorpay_refund_id} for command {command_id} is not recorded yet')
+        logger.error(f'Webhook: refund.processed for unknown refund {razorpay_refund_id}')
+        return
+
+    # Serialise with other updates to the same payment before touching the refund
+    Payment.objects.select_for_update().get(id=refund.payment_id)
+    Refund.objects.filter(id=refund.id).exclude(status='processed').update(
+        status='processed', updated_at=timezone.now(),
+    )
+
+    logger.info(f"Webhook: Refund processed {razorpay_refund_id}")
+
+
+EVENT_HANDLERS = {
+    'payment.captured': handle_payment_captured,
+    'payment.failed':   handle_payment_failed,
+    'refund.processed': handle_refund_processed,
+}
+
+
+# ──────────────────────────────────────────────
+# Worker
+# ──────────────────────────────────────────────
+
+def retry_delay(attempts):
+    """Exponential backoff: base, 2×base, 4×base … capped at one hour."""
+    return timedelta(seconds=min(RETRY_BASE_SECONDS * 2 ** (attempts - 1), 3600))
+
+
+def release_stale_claims():
+    """Put events claimed by a crashed worker back in the queue."""
+    cutoff = timezone.now() - timedelta(minutes=STALE_CLAIM_MINUTES)
+    return WebhookEvent.objects.filter(status='processing', claimed_at__lt=cutoff).update(
+        status='pending', claimed_at=None,
+    )
+
+
+def claim_batch(batch_size):
+    """Atomically mark up to batch_size due events as 'processing', oldest event first."""
+    now = timezone.now()
+    with transaction.atomic():
+        due = list(
+            WebhookEvent.objects.select_for_update(skip_locked=True)
+            .filter(status='pending', next_attempt_at__lte=now)
+            .order_by('event_created_at', 'id')[:batch_size]
+        )
+        if due:
+            WebhookEvent.objects.filter(id__in=[event.id for event in due]).update(
+                status='processing', claimed_at=now,
+            )
+    return due
+
+
+def process_event(webhook_event):
+    """Apply one event.  Returns True on success; failures are scheduled for retry."""
+    handler = EVENT_HANDLERS.get(webhook_event.event_type)
+    webhook_event.attempts += 1
+    webhook_event.claimed_at = None
+    try:
+        with transaction.atomic():
+            if handler is not None:
+                handler(webhook_event.payload)
+            webhook_event.status = 'processed'
+            webhook_event.processed_at = timezone.now()
+            webhook_event.save(update_fields=['attempts', 'claimed_at', 'status', 'processed_at'])
+        return True
+    except Exception as e:
+        max_attempts = getattr(settings, 'WEBHOOK_MAX_ATTEMPTS', 5)
+        webhook_event.last_error = str(e)[:1000]
+        if webhook_event.attempts >= max_attempts:
+            webhook_event.status = 'failed'
+            logger.error(f'Giving up on webhook {webhook_event.event_id}: {e}')
+        else:
+            webhook_event.status = 'pending'
+            webhook_event.next_attempt_at = timezone.now() + retry_delay(webhook_event.attempts)
+            logger.warning(f'Webhook {webhook_event.event_id} failed, will retry: {e}')
+        webhook_event.save(update_fields=['attempts', 'claimed_at', 'status', 'last_error', 'next_attempt_at'])
+        return False
+
+
+def process_webhook_events(batch_size=None):
+    """Apply every currently due webhook event.  Returns (processed, failed)."""
+    batch_size = batch_size or getattr(settings, 'WEBHOOK_BATCH_SIZE', 100)
+    release_stale_claims()
+    processed = failed = 0
+    while True:
+        batch = claim_batch(batch_size)
+        if not batch:
+            return processed, failed
+        for webhook_event in batch:
+            if process_event(webhook_event):
+                processed += 1
+            else:
+                failed += 1
@@ -1,44 +1,25 @@
 from django.db.models import Sum
-from django.utils import timezone
-from datetime import timedelta
 from apps.bookings.models import Booking
+from apps.payments.ledger import monthly_totals, owner_totals
 from apps.payments.models import Payment
 from apps.cars.models import Car
-from django.conf import settings
 
 
-def get_total_earnings(owner):
-    """Total confirmed/ongoing/completed earnings for owner."""
-    from apps.payments.models import Payment
+# Paid bookings still awaiting the owner's approval are pending_earnings, not earnings
+EARNING_BOOKING_STATUSES = ('confirmed', 'ongoing', 'completed')
 
-    owner_cars = Car.objects.filter(owner=owner)
-    confirmed_payments = Payment.objects.filter(
-        booking__car__in=owner_cars,
-        booking__status__in=['confirmed', 'ongoing', 'completed'],
-        status='completed',
-    )
-    total = confirmed_payments.aggregate(Sum('amount'))['amount__sum'] or 0
-    return total
+
+def get_total_earnings(owner):
+    """Money collected for owner's confirmed/ongoing/completed bookings, net of refunds, from the payment ledger."""
+    return owner_totals(owner, booking_statuses=EARNING_BOOKING_STATUSES)['net']
 
 
 def get_monthly_earnings(owner, months=12):
-    """Return a dict of month-label → earnings for the last N months."""
-    owner_cars = Car.objects.filter(owner=owner)
-    earnings_by_month = {}
-    for i in range(months):
-        month_start = timezone.now().date().replace(day=1)
-        month_start = month_start - timedelta(days=30 * i)
-        month_end = month_start + timedelta(days=32)
-        month_end = month_end.replace(day=1) - timedelta(days=1)
-        month_key = month_start.strftime('%B %Y')
-        earnings = Payment.objects.filter(
-            booking__car__in=owner_cars,
-            booking__start_date__gte=month_start,
-            booking__start_date__lte=month_end,
-            status='completed'
-        ).aggregate(Sum('amount'))['amount__sum'] or 0
-        earnings_by_month[month_key] = float(earnings)
-    return dict(reversed(list(earnings_by_month.items())))
+    """Return a dict of month-label → earnings (net of refunds) for the last N months."""
+    return {
+        month.strftime('%B %Y'): float(totals['net'])
+        for month, totals in monthly_totals(months, owner=owner).items()
+    }
 
 
 def get_completed_bookings_count(owner):
@@ -61,25 +42,21 @@ def get_confirmed_bookings_count(owner):
 
 def get_revenue_summary(owner):
     """Return complete revenue summary dict for owner."""
-    from decimal import Decimal
     owner_cars = Car.objects.filter(owner=owner)
     all_bookings = Booking.objects.filter(car__in=owner_cars)
-    completed_earnings = Payment.objects.filter(
-        booking__car__in=owner_cars,
-        status='completed'
-    ).aggregate(Sum('amount'))['amount__sum'] or 0
+    # Commission was fixed when each payment was captured — see payments/ledger.py
+    totals = owner_totals(owner)
     pending_payments = Payment.objects.filter(
         booking__car__in=owner_cars,
         status='pending'
     ).aggregate(Sum('amount'))['amount__sum'] or 0
-    commission_rate = getattr(settings, 'PLATFORM_COMMISSION_RATE', 0.1)
-    commission_total = completed_earnings * Decimal(str(commission_rate))
-    net_earnings = completed_earnings - commission_total
     return {
-        'total_earnings': float(completed_earnings),
+        'total_earnings': float(totals['net']),
         'pending_earnings': float(pending_payments),
-        'commission_total': float(commission_total),
-        'net_earnings': float(net_earnings),
+        'commission_total': float(totals['commission']),
+        'net_earnings': float(totals['owner_share']),
+        'paid_out': float(totals['paid_out']),
+        'balance_due': float(totals['balance_due']),
         'total_bookings': all_bookings.count(),
         'completed_bookings': all_bookings.filter(status='completed').count(),
         'pending_bookings': all_bookings.filter(status='pending').count(),
@@ -1,7 +1,9 @@
 from django.shortcuts import redirect
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.contrib import messages
+from django.utils.decorators import method_decorator
 from django.views.generic import TemplateView, ListView
+from apps.core.replica import use_replica
 from .services import (
     get_revenue_summary, get_monthly_earnings, get_top_earning_cars,
     get_total_earnings, get_completed_bookings_count,
@@ -29,6 +31,7 @@ class OwnerReportMixin(UserPassesTestMixin, LoginRequiredMixin):
         return redirect('car_list')
 
 
+@method_decorator(use_replica(max_staleness=300), name='get')
 class OwnerEarningsView(OwnerReportMixin, TemplateView):
     """Show owner earnings dashboard"""
     template_name = 'reports/owner_earnings.html'
@@ -50,6 +53,7 @@ class OwnerEarningsView(OwnerReportMixin, TemplateView):
         return context
 
 
+@method_decorator(use_replica(max_staleness=300), name='get')
 class OwnerRevenueReportView(OwnerReportMixin, TemplateView):
     """Detailed revenue report view"""
     template_name = 'reports/owner_revenue_report.html'
@@ -74,6 +78,7 @@ class OwnerRevenueReportView(OwnerReportMixin, TemplateView):
         return context
 
 
+@method_decorator(use_replica(max_staleness=300), name='get')
 class OwnerReportListView(OwnerReportMixin, ListView):
     """List owner reports"""
     model = OwnerReport
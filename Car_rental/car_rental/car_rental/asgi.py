@@ -13,4 +13,9 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'car_rental.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported once Django is set up; serves /notifications/stream/ without a thread per connection
+from apps.notifications.asgi import with_notification_stream  # noqa: E402
+
+application = with_notification_stream(django_application)
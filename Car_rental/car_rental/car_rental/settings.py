@@ -58,6 +58,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'apps.core.replica.ReadYourWritesMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -76,6 +77,7 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
                 'django.template.context_processors.csrf',
+                'apps.notifications.context_processors.unread_notifications',
             ],
         },
     },
@@ -91,6 +93,22 @@ EMAIL_USE_TLS = True
 EMAIL_HOST_USER = os.getenv('EMAIL_HOST_USER')
 EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD')
 
+# Email outbox — requests queue emails, `manage.py send_queued_emails` delivers them
+EMAIL_OUTBOX_BATCH_SIZE = 50
+EMAIL_OUTBOX_MAX_ATTEMPTS = 5
+EMAIL_OUTBOX_RETRY_BASE_SECONDS = 30
+# OTP codes wait here, not in the outbox table, until their email is sent
+EMAIL_OUTBOX_SECRET_CACHE_ALIAS = 'otp'
+
+# Car thumbnails — saving a new image queues it, `manage.py process_thumbnails` renders it
+THUMBNAIL_BATCH_SIZE = 20
+THUMBNAIL_WORKERS = 4
+# Responsive variants rendered alongside each thumbnail (see the car_picture template tag)
+CAR_IMAGE_WIDTHS = (320, 640, 960, 1280, 1920)
+CAR_IMAGE_FORMATS = ('webp', 'jpeg')
+# Uploads above this are marked failed instead of decoded
+CAR_IMAGE_MAX_PIXELS = 60_000_000
+
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
@@ -105,6 +123,79 @@ DATABASES = {
     }
 }
 
+# Optional read replica for reports, dashboards and exports (see apps/core/replica.py).
+# For a local stand-in set DATABASE_REPLICA_ENGINE=django.db.backends.sqlite3
+# and DATABASE_REPLICA_NAME to a second SQLite file.
+if os.getenv('DATABASE_REPLICA_HOST') or os.getenv('DATABASE_REPLICA_NAME'):
+    DATABASES['replica'] = {
+        'ENGINE': os.getenv('DATABASE_REPLICA_ENGINE', 'django.db.backends.mysql'),
+        'NAME': os.getenv('DATABASE_REPLICA_NAME', os.getenv('DATABASE_NAME')),
+        'USER': os.getenv('DATABASE_REPLICA_USER', os.getenv('DATABASE_USER')),
+        'PASSWORD': os.getenv('DATABASE_REPLICA_PASSWORD', os.getenv('DATABASE_PASSWORD')),
+        'HOST': os.getenv('DATABASE_REPLICA_HOST', os.getenv('DATABASE_HOST')),
+        'PORT': os.getenv('DATABASE_REPLICA_PORT', os.getenv('DATABASE_PORT')),
+        # Tests read the replica through the default test database
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['apps.core.replica.PrimaryReplicaRouter']
+
+# Shared cache for counters such as the unread-notification badge. Set CACHE_REDIS_URL
+# (needs the redis package) so every worker process sees the same values; without it
+# each process keeps its own in-memory cache.
+if os.getenv('CACHE_REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('CACHE_REDIS_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Session storage, picked with SESSION_STORE:
+#   db              every request reads django_session (the default)
+#   cached_db       reads come from the 'sessions' cache, writes go to both
+#   signed_cookies  nothing stored server-side; the data is signed, not encrypted
+SESSION_STORE = os.getenv('SESSION_STORE', 'db')
+SESSION_ENGINE = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    # Takes over existing database sessions on their next request
+    'signed_cookies': 'apps.core.sessions',
+}[SESSION_STORE]
+SESSION_CACHE_ALIAS = 'sessions'
+if os.getenv('CACHE_REDIS_URL'):
+    CACHES['sessions'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.getenv('CACHE_REDIS_URL'),
+    }
+elif os.getenv('SESSION_CACHE') == 'locmem':
+    # Single process only: other processes would keep serving their stale copy
+    CACHES['sessions'] = {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'sessions',
+    }
+else:
+    # Shared by every process on this host
+    CACHES['sessions'] = {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache' / 'sessions',
+    }
+
+# One-time codes must be readable by whichever process verifies them
+if os.getenv('CACHE_REDIS_URL'):
+    CACHES['otp'] = CACHES['default']
+else:
+    CACHES['otp'] = {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache' / 'otp',
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -158,10 +249,82 @@ PLATFORM_COMMISSION_RATE = 0.1
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Uploads are stored once per distinct content, named by their SHA-256 (apps/core/storage.py)
+STORAGES = {
+    'default': {'BACKEND': 'apps.core.storage.HashedFileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+
+# Parquet snapshots written by `manage.py snapshot_analytics`
+ANALYTICS_SNAPSHOT_DIR = BASE_DIR / 'analytics_snapshots'
+
 # Razorpay Configuration
 RAZORPAY_KEY_ID = os.getenv('RAZORPAY_KEY_ID')
 RAZORPAY_KEY_SECRET = os.getenv('RAZORPAY_KEY_SECRET')
 RAZORPAY_WEBHOOK_SECRET = os.getenv('RAZORPAY_WEBHOOK_SECRET')
+# Point at a local fake gateway for testing
+RAZORPAY_API_BASE_URL = os.getenv('RAZORPAY_API_BASE_URL', 'https://api.razorpay.com')
+RAZORPAY_TIMEOUT = (3.05, 10)  # (connect, read) seconds
+RAZORPAY_POOL_SIZE = 10                # keep-alive connections per worker process
+RAZORPAY_BREAKER_FAILURES = 5          # consecutive failures before failing fast
+RAZORPAY_BREAKER_RESET_SECONDS = 30    # how long to fail fast before probing again
+
+# Refunds are queued and sent by `manage.py dispatch_payment_commands`
+PAYMENT_COMMAND_BATCH_SIZE = 20
+PAYMENT_COMMAND_MAX_ATTEMPTS = 5
+# Refund API calls the dispatcher makes in parallel (bulk refunds)
+PAYMENT_COMMAND_WORKERS = 4
+BULK_REFUND_MAX_PAYMENTS = 1000
+
+# Repeated initiate_payment / payment_success requests replay the stored response
+IDEMPOTENCY_KEY_TTL_HOURS = 24
+IDEMPOTENCY_WAIT_SECONDS = 5    # how long a duplicate waits for the original to finish
+
+# Webhook events are stored on receipt and applied by `manage.py process_webhook_events`
+WEBHOOK_BATCH_SIZE = 100
+WEBHOOK_MAX_ATTEMPTS = 5
 
 # Payment settings
+# Checkout attempts (Razorpay orders) per booking before it is released
 MAX_PAYMENT_RETRY_ATTEMPTS = 3
+# Wait before a retry after a failed attempt: base, 2×base, 4×base … seconds
+PAYMENT_RETRY_BACKOFF_SECONDS = 5
+
+# One-time login/registration codes (apps/accounts/otp.py), kept in the cache
+OTP_BACKEND = 'apps.accounts.otp.CacheBackend'   # or apps.accounts.otp.RedisBackend
+OTP_CACHE_ALIAS = 'otp'
+OTP_REDIS_URL = os.getenv('OTP_REDIS_URL')
+OTP_EXPIRY_MINUTES = 10
+OTP_MAX_ATTEMPTS = 5                   # wrong guesses before a code is discarded
+# Codes sent: (limit, window seconds)
+OTP_EMAIL_RATE = (5, 15 * 60)
+OTP_IP_RATE = (20, 60 * 60)
+
+# Retention for `manage.py purge_expired` (apps/core/retention.py)
+NOTIFICATION_READ_RETENTION_DAYS = 90
+NOTIFICATION_RETENTION_DAYS = 365     # unread ones too
+EMAIL_OUTBOX_RETENTION_DAYS = 30
+RETENTION_CHUNK_SIZE = 1000           # rows per DELETE
+RETENTION_PAUSE_SECONDS = 0.1         # minimum pause between chunks
+
+# Notification inbox
+NOTIFICATION_PAGE_SIZE = 20
+# Cached unread counters are recounted at least this often. Background workers and
+# other web processes only update a shared cache, so without Redis the badge is
+# counted on every request instead (0 disables the counter cache)
+NOTIFICATION_UNREAD_CACHE_SECONDS = 24 * 60 * 60 if os.getenv('CACHE_REDIS_URL') else 0
+# create_notifications_bulk: rows per INSERT, and the window digests fold bursts within
+NOTIFICATION_BULK_BATCH_SIZE = 1000
+NOTIFICATION_DIGEST_MINUTES = 10
+
+# Live notifications over Server-Sent Events (/notifications/stream/). Serve
+# car_rental.asgi with an ASGI server so idle streams do not each hold a thread.
+# Backends (apps/notifications/realtime.py): LocalBackend (this process only),
+# DatabaseBackend (polls the table; reaches streams in every process) or RedisBackend.
+NOTIFICATION_BACKEND = os.getenv('NOTIFICATION_BACKEND', 'apps.notifications.realtime.LocalBackend')
+NOTIFICATION_REDIS_URL = os.getenv('NOTIFICATION_REDIS_URL', os.getenv('CACHE_REDIS_URL'))
+NOTIFICATION_POLL_SECONDS = 2                 # DatabaseBackend
+NOTIFICATION_STREAM_HEARTBEAT_SECONDS = 20
+NOTIFICATION_STREAM_MAX_SECONDS = 300         # the browser reconnects with Last-Event-ID
+# Under WSGI (runserver, gunicorn) streams poll the database and hold a thread each
+NOTIFICATION_WSGI_STREAM_SECONDS = 60